@@ -0,0 +1,176 @@
+"""
+Synthetic fleet that publishes every /boat/{vessel_id}/{stream} topic.
+
+Each vessel publishes every selected stream ``--rate`` times per second, with
+payloads that satisfy the ingestion models and a timestamp taken at publish
+time, so consumers can measure end-to-end latency. Prints a JSON summary.
+
+    python -m benchmarks.boat_simulator --host localhost --port 1883 --vessels 10 --rate 20 --duration 60
+"""
+import json
+import math
+import time
+import uuid
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Sequence
+from gmqtt import Client as MQTTClient
+
+MISSIONS = ("survey", "patrol", "return to base", "station keeping")
+MODES = ("AUTO", "MANUAL", "OFF")
+
+
+def _battery(t: float, i: int) -> dict:
+    return {
+        "left_battery_voltage": 24 + math.sin(t / 60 + i),
+        "right_battery_voltage": 24 + math.cos(t / 60 + i),
+        "central_battery_voltage": 12 + 0.5 * math.sin(t / 30 + i),
+    }
+
+
+def _mission(t: float, i: int) -> dict:
+    return {"description": MISSIONS[int(t / 300 + i) % len(MISSIONS)]}
+
+
+def _mode(t: float, i: int) -> dict:
+    return {"mode": MODES[int(t / 120 + i) % len(MODES)]}
+
+
+def _obstacle(t: float, i: int) -> dict:
+    return {
+        "latitude": 50.03 + 0.01 * math.sin(t / 100 + i),
+        "longitude": 19.99 + 0.01 * math.cos(t / 100 + i),
+        "distance": 5 + 4 * abs(math.sin(t / 10 + i)),
+    }
+
+
+def _position(t: float, i: int) -> dict:
+    return {
+        "latitude": 50.03 + 0.01 * math.sin(t / 600 + i),
+        "longitude": 19.99 + 0.01 * math.cos(t / 600 + i),
+        "velocity": abs(2 * math.sin(t / 200 + i)),
+        "heading": (t * 6 + i * 40) % 360,
+    }
+
+
+def _thrusters_input(t: float, i: int) -> dict:
+    return {"left_thruster": 80 * math.sin(t / 20 + i), "right_thruster": 80 * math.cos(t / 20 + i)}
+
+
+def _acceleration(t: float, i: int) -> dict:
+    return {"acceleration": 0.5 * math.sin(t / 5 + i)}
+
+
+GENERATORS: Dict[str, Callable[[float, int], dict]] = {
+    "battery": _battery,
+    "mission": _mission,
+    "mode": _mode,
+    "obstacle": _obstacle,
+    "position": _position,
+    "thrusters_input": _thrusters_input,
+    "acceleration": _acceleration,
+}
+
+
+def make_payload(stream: str, timestamp: datetime, vessel_index: int) -> dict:
+    return {"timestamp": timestamp.isoformat(), **GENERATORS[stream](timestamp.timestamp(), vessel_index)}
+
+
+def vessel_ids(prefix: str, count: int) -> List[str]:
+    return [f"{prefix}-{i}" for i in range(count)]
+
+
+async def connect(host: str, port: int, tls: bool = False, username: str = "", password: str = "") -> MQTTClient:
+    client = MQTTClient(f"boat-simulator-{uuid.uuid4().hex[:8]}")
+    if username:
+        client.set_auth_credentials(username, password or None)
+    await client.connect(host, port, ssl=tls)
+    return client
+
+
+async def simulate(
+    client: MQTTClient,
+    vessels: Sequence[str],
+    streams: Sequence[str],
+    rate: float,
+    duration: float,
+    qos: int = 0,
+) -> dict:
+    """
+    Publish ``rate`` messages per second per stream and vessel for ``duration`` seconds.
+    Ticks are scheduled against absolute deadlines, so a slow tick does not lower the
+    target rate; ``lagging_ticks`` counts the ticks that started late.
+    """
+    loop = asyncio.get_running_loop()
+    period = 1 / rate
+    started = loop.time()
+    published = lagging = 0
+    tick = 0
+
+    while True:
+        deadline = started + tick * period
+        if deadline - started >= duration:
+            break
+        delay = deadline - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif delay < -period:
+            lagging += 1
+
+        now = datetime.now(timezone.utc)
+        for index, vessel_id in enumerate(vessels):
+            for stream in streams:
+                payload = json.dumps(make_payload(stream, now, index))
+                client.publish(f"/boat/{vessel_id}/{stream}", payload, qos=qos)
+                published += 1
+        tick += 1
+
+    elapsed = loop.time() - started
+    return {
+        "published": published,
+        "elapsed_s": round(elapsed, 3),
+        "target_rate": rate * len(vessels) * len(streams),
+        "achieved_rate": round(published / elapsed, 1) if elapsed else 0,
+        "lagging_ticks": lagging,
+    }
+
+
+def add_simulator_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--host", default="localhost", help="MQTT broker host")
+    parser.add_argument("--port", type=int, default=1883, help="MQTT broker port")
+    parser.add_argument("--tls", action="store_true")
+    parser.add_argument("--username", default="")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--vessels", type=int, default=1)
+    parser.add_argument("--vessel-prefix", default="sim")
+    parser.add_argument("--streams", default=",".join(GENERATORS), help="comma separated streams")
+    parser.add_argument("--rate", type=float, default=10, help="messages per second per stream and vessel")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--qos", type=int, default=0, choices=(0, 1, 2))
+
+
+def selected_streams(value: str) -> List[str]:
+    streams = [stream for stream in value.split(",") if stream]
+    unknown = set(streams) - set(GENERATORS)
+    if unknown:
+        raise SystemExit(f"Unknown streams: {sorted(unknown)}")
+    return streams
+
+
+async def main(args):
+    client = await connect(args.host, args.port, args.tls, args.username, args.password)
+    try:
+        result = await simulate(
+            client, vessel_ids(args.vessel_prefix, args.vessels), selected_streams(args.streams),
+            args.rate, args.duration, args.qos,
+        )
+    finally:
+        await client.disconnect()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_simulator_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,36 @@
+import math
+import subprocess
+from typing import List
+
+
+def percentiles(samples_ms: List[float]) -> dict:
+    """
+    Summarize latency samples in milliseconds.
+    """
+    if not samples_ms:
+        return {"count": 0}
+    samples = sorted(samples_ms)
+
+    def at(fraction: float) -> float:
+        return round(samples[min(len(samples) - 1, math.ceil(len(samples) * fraction) - 1)], 3)
+
+    return {
+        "count": len(samples),
+        "min_ms": round(samples[0], 3),
+        "p50_ms": at(0.50),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def code_version() -> str:
+    """
+    The git revision under test, so reports from different versions can be compared.
+    """
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
@@ -0,0 +1,136 @@
+"""
+Compare historic query latency on compressed and uncompressed hypertables.
+
+Seeds two copies of the position schema with the same synthetic rows,
+compresses every chunk of one of them and times the query shapes the
+historic routes issue against both. Prints a JSON report.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.compression_benchmark --rows 5000000
+"""
+import os
+import json
+import math
+import time
+import asyncio
+import argparse
+import statistics
+from datetime import datetime, timedelta, timezone
+import asyncpg
+
+TABLES = ("bench_position_uncompressed", "bench_position_compressed")
+
+QUERIES = {
+    "raw_1h": """
+        SELECT * FROM {table}
+        WHERE timestamp >= $1 AND timestamp <= $1 + INTERVAL '1 hour'
+        ORDER BY timestamp ASC LIMIT 10000
+    """,
+    "aggregate_1d_5m": """
+        SELECT time_bucket(INTERVAL '5 minutes', timestamp) AS timestamp,
+            AVG(latitude), AVG(longitude), AVG(velocity), AVG(heading)
+        FROM {table}
+        WHERE timestamp >= $1 AND timestamp <= $1 + INTERVAL '1 day'
+        GROUP BY 1 ORDER BY 1
+    """,
+    "aggregate_full_15m": """
+        SELECT time_bucket(INTERVAL '15 minutes', timestamp) AS timestamp, AVG(velocity)
+        FROM {table}
+        WHERE timestamp >= $1
+        GROUP BY 1 ORDER BY 1
+    """,
+}
+
+
+async def create_table(conn, table: str, compressed: bool):
+    await conn.execute(f"DROP TABLE IF EXISTS {table}")
+    await conn.execute(f"""
+        CREATE TABLE {table} (
+            id SERIAL,
+            timestamp TIMESTAMPTZ NOT NULL,
+            latitude FLOAT NOT NULL,
+            longitude FLOAT NOT NULL,
+            velocity FLOAT NOT NULL,
+            heading FLOAT NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, timestamp)
+        )
+    """)
+    await conn.execute(f"SELECT create_hypertable('{table}', 'timestamp', chunk_time_interval => INTERVAL '1 day')")
+    if compressed:
+        await conn.execute(f"ALTER TABLE {table} SET (timescaledb.compress, timescaledb.compress_orderby = 'timestamp DESC')")
+
+
+def synthetic_rows(start: datetime, count: int, step: timedelta):
+    for i in range(count):
+        phase = i / 600
+        yield (
+            start + i * step,
+            50.03 + 0.01 * math.sin(phase),
+            19.99 + 0.01 * math.cos(phase),
+            abs(2 * math.sin(phase / 3)),
+            (i / 10) % 360,
+        )
+
+
+async def seed(conn, table: str, start: datetime, rows: int, step: timedelta, batch: int = 100_000):
+    records = synthetic_rows(start, rows, step)
+    while True:
+        chunk = [record for _, record in zip(range(batch), records)]
+        if not chunk:
+            break
+        await conn.copy_records_to_table(
+            table, records=chunk, columns=["timestamp", "latitude", "longitude", "velocity", "heading"]
+        )
+
+
+async def time_query(conn, query: str, start: datetime, repeats: int) -> dict:
+    await conn.fetch(query, start)
+    samples = []
+    for _ in range(repeats):
+        began = time.perf_counter()
+        await conn.fetch(query, start)
+        samples.append((time.perf_counter() - began) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "min_ms": round(samples[0], 3),
+    }
+
+
+async def main(args):
+    conn = await asyncpg.connect(args.dsn)
+    step = timedelta(milliseconds=args.step_ms)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    report = {"rows": args.rows, "step_ms": args.step_ms, "repeats": args.repeats, "tables": {}}
+
+    try:
+        for table in TABLES:
+            compressed = table == "bench_position_compressed"
+            await create_table(conn, table, compressed)
+            await seed(conn, table, start, args.rows, step)
+            if compressed:
+                await conn.execute(f"SELECT compress_chunk(c) FROM show_chunks('{table}') c")
+            await conn.execute(f"ANALYZE {table}")
+
+            result = {"bytes": await conn.fetchval(f"SELECT hypertable_size('{table}')"), "queries": {}}
+            for name, query in QUERIES.items():
+                result["queries"][name] = await time_query(conn, query.format(table=table), start, args.repeats)
+            report["tables"][table] = result
+    finally:
+        if not args.keep:
+            for table in TABLES:
+                await conn.execute(f"DROP TABLE IF EXISTS {table}")
+        await conn.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--step-ms", type=int, default=100, help="spacing between synthetic samples")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark tables afterwards")
+    asyncio.run(main(parser.parse_args()))
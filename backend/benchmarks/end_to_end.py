@@ -0,0 +1,259 @@
+"""
+End-to-end benchmark against a running stack (backend, Postgres, Mosquitto).
+
+1. Optionally seeds ``--seed-rows`` historic rows per seeded stream for a
+   dedicated vessel, then times the /api/* query shapes the dashboard issues,
+   both past the query cache (cold) and answered from it (warm).
+2. Runs the boat simulator while a /ws/telemetry client measures the
+   MQTT -> WebSocket latency from each payload's timestamp.
+3. Reads back what was ingested to report throughput and the insert lag
+   (created_at - timestamp) of every row.
+
+The report is printed as JSON and written to ``--output`` when given, tagged
+with the git revision, so runs of different versions can be diffed.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.end_to_end \\
+        --api http://localhost:8000 --host localhost --vessels 5 --rate 20 --seed-rows 2000000
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Sequence
+from urllib.parse import urlencode
+import asyncpg
+import websockets
+from benchmarks.boat_simulator import (
+    GENERATORS, add_simulator_arguments, connect, selected_streams, simulate, vessel_ids
+)
+from benchmarks.common import code_version, percentiles
+from mqtt.message_handlers import payload_models
+
+SEED_VESSEL_ID = "bench-seed"
+SEED_BATCH_SIZE = 100_000
+
+
+# region seeding
+def seed_records(stream: str, start: datetime, count: int, step: timedelta):
+    fields = list(payload_models[stream].model_fields)[1:]
+    for i in range(count):
+        timestamp = start + i * step
+        values = GENERATORS[stream](timestamp.timestamp(), 0)
+        yield (timestamp, *(values[field] for field in fields), SEED_VESSEL_ID)
+
+
+async def seed(conn, streams: Sequence[str], rows: int, step: timedelta) -> dict:
+    """
+    Replace the seed vessel's rows with ``rows`` samples per stream ending now.
+    """
+    end = datetime.now(timezone.utc).replace(microsecond=0)
+    start = end - rows * step
+    report = {"rows_per_stream": rows, "start": start.isoformat(), "end": end.isoformat(), "seconds": {}}
+
+    for stream in streams:
+        columns = [*payload_models[stream].model_fields, "vessel_id"]
+        began = time.perf_counter()
+        await conn.execute(f"DELETE FROM {stream} WHERE vessel_id = $1", SEED_VESSEL_ID)
+        records = seed_records(stream, start, rows, step)
+        while True:
+            chunk = [record for _, record in zip(range(SEED_BATCH_SIZE), records)]
+            if not chunk:
+                break
+            await conn.copy_records_to_table(stream, records=chunk, columns=columns)
+
+        views = await conn.fetch(
+            "SELECT view_name FROM timescaledb_information.continuous_aggregates WHERE hypertable_name = $1", stream
+        )
+        for view in views:
+            await conn.execute(f"CALL refresh_continuous_aggregate('{view['view_name']}', NULL, NULL)")
+        await conn.execute(f"ANALYZE {stream}")
+        report["seconds"][stream] = round(time.perf_counter() - began, 1)
+
+    report["start_ts"], report["end_ts"] = start, end
+    return report
+
+
+# endregion
+
+# region queries
+def query_cases(start: datetime, end: datetime) -> Dict[str, tuple]:
+    hour = end - timedelta(hours=1)
+    day = max(start, end - timedelta(days=1))
+    common = {"vessel_id": SEED_VESSEL_ID}
+    return {
+        "position_raw_1h": ("/api/position", {**common, "start_ts": hour, "end_ts": end, "limit": 10000}),
+        "position_raw_1h_columnar": ("/api/position", {**common, "start_ts": hour, "end_ts": end, "format": "columnar"}),
+        "position_raw_1h_binary": ("/api/position", {**common, "start_ts": hour, "end_ts": end, "format": "binary"}),
+        "position_full_max_points_2000": ("/api/position", {**common, "start_ts": start, "end_ts": end, "max_points": 2000}),
+        "position_aggregated_1d_5m": (
+            "/api/position/aggregated", {**common, "start_ts": day, "end_ts": end, "interval": "5 minutes"}
+        ),
+        "position_aggregated_full_15m": (
+            "/api/position/aggregated", {**common, "start_ts": start, "end_ts": end, "interval": "15 minutes"}
+        ),
+        "battery_aggregated_1d_1m": (
+            "/api/battery/aggregated", {**common, "start_ts": day, "end_ts": end, "interval": "1 minute"}
+        ),
+        "position_battery_resampled_1d_1m": (
+            "/api/resampled",
+            {**common, "streams": "position,battery", "start_ts": day, "end_ts": end, "interval": "1 minute"},
+        ),
+        "data_time_range": ("/api/data-time-range", common),
+    }
+
+
+def timed_get(url: str) -> tuple:
+    began = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=120) as response:
+        body = response.read()
+    return (time.perf_counter() - began) * 1000, len(body)
+
+
+def query_url(api: str, path: str, params: dict) -> str:
+    query = urlencode({key: value.isoformat() if isinstance(value, datetime) else value for key, value in params.items()})
+    return f"{api}{path}?{query}"
+
+
+async def time_queries(api: str, start: datetime, end: datetime, repeats: int) -> dict:
+    """
+    Time every query shape cold and warm. Cold repeats shift the range back by
+    one more second each, so that none is answered from the query cache; warm
+    repeats ask for the first range again, which the cache now holds.
+    """
+    shifted = [query_cases(start - timedelta(seconds=i), end - timedelta(seconds=i)) for i in range(repeats)]
+    results = {}
+    for name in shifted[0]:
+        try:
+            cold = []
+            for cases in shifted:
+                elapsed, size = await asyncio.to_thread(timed_get, query_url(api, *cases[name]))
+                cold.append(elapsed)
+            url = query_url(api, *shifted[0][name])
+            warm = [(await asyncio.to_thread(timed_get, url))[0] for _ in range(repeats)]
+            results[name] = {"cold": percentiles(cold), "warm": percentiles(warm), "bytes": size}
+        except Exception as e:
+            results[name] = {"error": str(e)}
+    return results
+
+
+# endregion
+
+# region live
+async def collect_latencies(ws_url: str, streams: Sequence[str], vessels: Sequence[str], samples: List[float], ready: asyncio.Event):
+    query = urlencode({"streams": ",".join(streams), "vessels": ",".join(vessels)})
+    async with websockets.connect(f"{ws_url}/ws/telemetry?{query}", max_size=None) as websocket:
+        async for frame in websocket:
+            message = json.loads(frame)
+            if message.get("event") == "subscribed":
+                ready.set()
+            data = message.get("data") or {}
+            if "stream" in message and "timestamp" in data:
+                sent = datetime.fromisoformat(data["timestamp"].replace("Z", "+00:00"))
+                samples.append((datetime.now(timezone.utc) - sent).total_seconds() * 1000)
+
+
+async def insert_lag(conn, streams: Sequence[str], vessels: Sequence[str], since: datetime) -> dict:
+    report = {}
+    for stream in streams:
+        row = await conn.fetchrow(f"""
+            SELECT count(*) AS rows,
+                percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY lag) AS lag,
+                max(lag) AS max_lag
+            FROM (
+                SELECT extract(epoch FROM created_at - timestamp) * 1000 AS lag
+                FROM {stream}
+                WHERE vessel_id = ANY($1::text[]) AND timestamp >= $2
+            ) rows
+        """, list(vessels), since)
+        lag = row["lag"] or [None, None, None]
+        report[stream] = {
+            "rows": row["rows"],
+            "p50_ms": lag[0], "p95_ms": lag[1], "p99_ms": lag[2],
+            "max_ms": row["max_lag"],
+        }
+    return report
+
+
+async def live_run(args, conn, streams: List[str]) -> dict:
+    vessels = vessel_ids(args.vessel_prefix, args.vessels)
+    samples: List[float] = []
+    ready = asyncio.Event()
+    collector = asyncio.create_task(collect_latencies(args.ws, streams, vessels, samples, ready))
+    await asyncio.wait_for(ready.wait(), timeout=10)
+
+    started = datetime.now(timezone.utc)
+    client = await connect(args.host, args.port, args.tls, args.username, args.password)
+    try:
+        published = await simulate(client, vessels, streams, args.rate, args.duration, args.qos)
+    finally:
+        await client.disconnect()
+    # Let the batch writers and sockets drain
+    await asyncio.sleep(args.drain)
+    collector.cancel()
+    await asyncio.gather(collector, return_exceptions=True)
+
+    lag = await insert_lag(conn, streams, vessels, started)
+    inserted = sum(stream["rows"] for stream in lag.values())
+    report = {
+        "publisher": published,
+        "ingestion": {
+            "rows": inserted,
+            "rows_per_second": round(inserted / published["elapsed_s"], 1),
+            "delivered_ratio": round(inserted / published["published"], 4) if published["published"] else None,
+        },
+        "mqtt_to_websocket": {**percentiles(samples), "received": len(samples)},
+        "insert_lag": lag,
+    }
+    if not args.keep:
+        for stream in streams:
+            await conn.execute(f"DELETE FROM {stream} WHERE vessel_id = ANY($1::text[])", vessels)
+    return report
+
+
+# endregion
+
+
+async def main(args):
+    streams = selected_streams(args.streams)
+    conn = await asyncpg.connect(args.dsn)
+    report = {
+        "version": code_version(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("dsn", "password")},
+    }
+    try:
+        if args.seed_rows:
+            seeded = await seed(conn, selected_streams(args.seed_streams), args.seed_rows, timedelta(milliseconds=args.seed_step_ms))
+            start, end = seeded.pop("start_ts"), seeded.pop("end_ts")
+            report["seed"] = seeded
+            report["queries"] = await time_queries(args.api, start, end, args.query_repeats)
+        if args.duration > 0:
+            report["live"] = await live_run(args, conn, streams)
+    finally:
+        await conn.close()
+
+    output = json.dumps(report, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_simulator_arguments(parser)
+    parser.set_defaults(vessel_prefix="bench-live")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--api", default="http://localhost:8000", help="backend base URL")
+    parser.add_argument("--ws", default="ws://localhost:8000", help="backend WebSocket base URL")
+    parser.add_argument("--drain", type=float, default=3, help="seconds to wait for ingestion after publishing")
+    parser.add_argument("--seed-rows", type=int, default=0, help="historic rows per seeded stream, 0 to skip")
+    parser.add_argument("--seed-streams", default="position,battery")
+    parser.add_argument("--seed-step-ms", type=int, default=100, help="spacing between seeded samples")
+    parser.add_argument("--query-repeats", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="keep the live run's rows afterwards")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,355 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from datetime import datetime
+from enum import Enum
+from operator import attrgetter
+from typing import Deque, Dict, List, Optional, Tuple
+import asyncpg
+from pydantic import BaseModel
+from pydantic_core import to_json
+from database.postgres import acquire, get_postgres
+from database.dead_letter import dead_letters
+from database.live_bus import live_bus
+from database.query_cache import query_cache
+from database.stream_metadata import stream_metadata
+from database.spool import SegmentSpool
+from database.streams import STREAMS, Stream
+from utils.logger import get_logger
+from utils.metrics import Counter, Gauge, Histogram
+from utils.retry import backoff_delay
+from utils.timestamps import as_utc
+
+logger = get_logger()
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "500"))
+BATCH_FLUSH_INTERVAL = float(os.getenv("BATCH_FLUSH_INTERVAL_MS", "50")) / 1000
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+INGEST_SPILL_DIR = os.getenv("INGEST_SPILL_DIR", "spill")
+# Smaller batches go through the prepared INSERT, which needs fewer round trips than COPY
+BATCH_COPY_MIN_ROWS = int(os.getenv("BATCH_COPY_MIN_ROWS", "32"))
+SPOOL_REPLAY_BATCH_SIZE = int(os.getenv("SPOOL_REPLAY_BATCH_SIZE", "5000"))
+SPOOL_RETRY_INITIAL_DELAY = 1
+SPOOL_RETRY_MAX_DELAY = 30
+
+# Errors caused by the rows themselves, which no retry can fix
+REJECTED_ROW_ERRORS = (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError)
+
+
+class OverflowPolicy(str, Enum):
+    """
+    What to do with a new payload when a writer's queue is full.
+    """
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    SPILL = "spill"
+
+
+INGEST_OVERFLOW_POLICY = OverflowPolicy(os.getenv("INGEST_OVERFLOW_POLICY", OverflowPolicy.SPILL.value))
+
+INSERT_DURATION = Histogram("db_insert_duration_seconds", "Duration of one batch COPY", ["table"])
+INSERTED_ROWS = Counter("db_inserted_rows_total", "Rows written by the batch writers", ["table"])
+
+
+class BatchWriter:
+    """
+    Buffers validated payloads of one stream and writes each batch to its table
+    with one COPY, or with the connection's prepared INSERT when the batch is
+    smaller than ``BATCH_COPY_MIN_ROWS``.
+
+    A batch is flushed as soon as it reaches ``max_batch_size`` rows or when
+    ``flush_interval`` seconds have passed since the previous flush, whichever
+    comes first. The buffer holds at most ``max_queue_size`` rows; once it is
+    full, ``overflow_policy`` decides whether producers wait, the oldest row is
+    dropped, or the row is spilled to the on-disk spool.
+
+    Batches the database fails to take are spooled as well, and for a backoff
+    period after such a failure every batch goes straight to the spool. Whenever
+    the buffer is empty the spool is replayed in chunks of
+    ``SPOOL_REPLAY_BATCH_SIZE`` rows.
+    """
+
+    def __init__(
+        self,
+        stream: Stream,
+        max_batch_size: int = BATCH_MAX_SIZE,
+        flush_interval: float = BATCH_FLUSH_INTERVAL,
+        max_queue_size: int = INGEST_QUEUE_SIZE,
+        overflow_policy: OverflowPolicy = INGEST_OVERFLOW_POLICY,
+        spill_dir: str = INGEST_SPILL_DIR,
+    ):
+        self.stream = stream
+        self.table = stream.name
+        self.model = stream.model
+        self.columns = stream.columns
+        self._values = attrgetter(*stream.fields)
+        self._enum_positions = stream.enum_positions
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.spool = SegmentSpool(os.path.join(spill_dir, self.table))
+        self.dropped = 0
+        self.spilled = 0
+        self._failures = 0
+        self._retry_at = 0.0
+        self._buffer: Deque[Tuple] = deque()
+        self._space_available = asyncio.Event()
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def to_record(self, payload: BaseModel, vessel_id: str) -> Tuple:
+        values = list(self._values(payload)) if len(self.stream.fields) > 1 else [self._values(payload)]
+        # Payloads may carry naive or offset timestamps depending on the sender
+        values[0] = as_utc(values[0])
+        for i in self._enum_positions:
+            values[i] = values[i].value
+        return (*values, vessel_id)
+
+    @property
+    def depth(self) -> int:
+        return len(self._buffer)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "capacity": self.max_queue_size,
+            "overflow_policy": self.overflow_policy.value,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "database_available": time.monotonic() >= self._retry_at,
+            "spool": self.spool.stats(),
+        }
+
+    async def submit(self, payload: BaseModel, vessel_id: str) -> None:
+        """
+        Queue a payload for the next batch, applying the overflow policy if the queue is full.
+        """
+        record = self.to_record(payload, vessel_id)
+
+        if len(self._buffer) >= self.max_queue_size:
+            if self.overflow_policy == OverflowPolicy.BLOCK:
+                while len(self._buffer) >= self.max_queue_size:
+                    self._space_available.clear()
+                    await self._space_available.wait()
+            elif self.overflow_policy == OverflowPolicy.DROP_OLDEST:
+                self._buffer.popleft()
+                self.dropped += 1
+            else:
+                self._spill([record])
+                return
+
+        self._buffer.append(record)
+        if len(self._buffer) >= self.max_batch_size:
+            self._flush_requested.set()
+
+    def _spill(self, records: List[Tuple]) -> None:
+        if not records:
+            return
+        try:
+            self.spool.append([to_json(record) for record in records])
+            self.spilled += len(records)
+        except Exception as e:
+            self.dropped += len(records)
+            logger.error(f"[{self.table}] Failed to spool {len(records)} rows, dropping them: {e}")
+
+    async def _copy(self, records: List[Tuple]) -> None:
+        pool = await get_postgres()
+        async with acquire(pool) as conn:
+            started = time.perf_counter()
+            if len(records) < BATCH_COPY_MIN_ROWS:
+                statement = await conn.insert_statement(self.stream)
+                await statement.executemany(records)
+            else:
+                await conn.copy_records_to_table(self.table, records=records, columns=self.columns)
+            INSERT_DURATION.observe(time.perf_counter() - started, self.table)
+
+    async def _written(self, records: List[Tuple]) -> None:
+        """
+        Bookkeeping for rows already committed. Never raises: a failure here must
+        not make the caller spool, and later replay, rows that are in the table.
+        """
+        INSERTED_ROWS.inc(self.table, amount=len(records))
+        try:
+            await stream_metadata.record(self.table, records)
+            # Other workers cache query results too
+            since = min(record[0] for record in records)
+            await live_bus.publish("invalidate", {"table": self.table, "since": since.isoformat()})
+        except Exception as e:
+            logger.error(f"[{self.table}] Failed to publish {len(records)} written rows: {e}")
+
+    async def _write(self, records: List[Tuple]) -> List[Tuple]:
+        """
+        Write records, isolating rows the database rejects into the dead-letter table.
+        Returns the records left unwritten because the database failed, which also
+        starts a backoff period.
+        """
+        remaining = []
+        try:
+            await self._copy(records)
+            written = records
+        except REJECTED_ROW_ERRORS:
+            written = []
+            for i, record in enumerate(records):
+                try:
+                    await self._copy([record])
+                    written.append(record)
+                except REJECTED_ROW_ERRORS as e:
+                    dead_letters.submit(self.table, to_json(record), str(e))
+                except Exception as e:
+                    # The rows before this one are committed, so only the rest may be retried
+                    self._database_failed(e)
+                    remaining = records[i:]
+                    break
+        except Exception as e:
+            self._database_failed(e)
+            return records
+        if not remaining:
+            self._failures = 0
+        if written:
+            await self._written(written)
+        return remaining
+
+    def _database_failed(self, error: Exception) -> None:
+        delay = backoff_delay(self._failures, SPOOL_RETRY_INITIAL_DELAY, SPOOL_RETRY_MAX_DELAY)
+        self._failures += 1
+        self._retry_at = time.monotonic() + delay
+        logger.warning(f"[{self.table}] Database write failed, spooling for {delay:.1f}s: {error}")
+
+    async def flush(self) -> None:
+        """
+        Write everything buffered so far in a single COPY, or to the spool while
+        the database is failing.
+        """
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+
+            records = list(self._buffer)
+            self._buffer.clear()
+            self._space_available.set()
+            if time.monotonic() < self._retry_at:
+                # Do not make every batch wait for the database to fail again
+                self._spill(records)
+                return
+            try:
+                remaining = await self._write(records)
+            except asyncio.CancelledError:
+                # Whether the batch went in is unknown; replaying it beats losing it
+                self._spill(records)
+                raise
+            if remaining:
+                self._spill(remaining)
+
+    async def replay_spool(self) -> None:
+        """
+        Write the next chunk of spooled rows to the database, oldest segment first.
+        """
+        if time.monotonic() < self._retry_at:
+            return
+        async with self._flush_lock:
+            try:
+                lines = await self.spool.next_chunk(SPOOL_REPLAY_BATCH_SIZE)
+                if not lines:
+                    return
+                records = []
+                for line in lines:
+                    try:
+                        records.append(self._from_spool(json.loads(line)))
+                    except Exception as e:
+                        dead_letters.submit(self.spool.directory, line, str(e))
+                remaining = await self._write(records) if records else []
+                if remaining is records:
+                    return
+                # Rows written before the database failed must not be replayed again
+                self._spill(remaining)
+                self.spool.ack(len(lines), len(records) - len(remaining))
+            except Exception as e:
+                logger.error(f"[{self.table}] Spool replay failed: {e}")
+
+    def _from_spool(self, entry: list) -> Tuple:
+        """
+        Validate a spooled record, which holds the stream's fields and then the vessel_id.
+        """
+        payload = self.model.model_validate(dict(zip(self.stream.fields, entry[:-1])))
+        return self.to_record(payload, entry[-1])
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+            if not self._buffer and not self._stopping:
+                await self.replay_spool()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run(), name=f"batch-writer-{self.table}")
+
+    async def stop(self) -> None:
+        """
+        Stop the background flush loop and write out whatever is still buffered,
+        to the database or else to the spool. A write in progress is let finish
+        rather than cancelled, since its batch is no longer in the buffer.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._flush_requested.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        self.spool.close()
+
+
+batch_writers: Dict[str, BatchWriter] = {name: BatchWriter(stream) for name, stream in STREAMS.items()}
+
+
+INGEST_QUEUE_DEPTH = Gauge(
+    "ingest_queue_depth", "Rows buffered for the next COPY", ["table"],
+    collect=lambda: {(name,): writer.depth for name, writer in batch_writers.items()},
+)
+INGEST_DROPPED = Counter(
+    "ingest_dropped_total", "Rows dropped by the overflow policy or a failed spool write", ["table"],
+    collect=lambda: {(name,): writer.dropped for name, writer in batch_writers.items()},
+)
+INGEST_SPILLED = Counter(
+    "ingest_spilled_total", "Rows spooled to disk because the queue was full or the database failed", ["table"],
+    collect=lambda: {(name,): writer.spilled for name, writer in batch_writers.items()},
+)
+INGEST_SPOOL_BYTES = Gauge(
+    "ingest_spool_bytes", "Size of the on-disk spool segments waiting for replay", ["table"],
+    collect=lambda: {(name,): writer.spool.stats()["bytes"] for name, writer in batch_writers.items()},
+)
+INGEST_SPOOL_REPLAYED = Counter(
+    "ingest_spool_replayed_total", "Spooled rows replayed into the database", ["table"],
+    collect=lambda: {(name,): writer.spool.replayed for name, writer in batch_writers.items()},
+)
+
+
+async def _apply_invalidation(event: dict) -> None:
+    query_cache.invalidate(event["table"], datetime.fromisoformat(event["since"]))
+
+
+live_bus.on("invalidate", _apply_invalidation)
+
+
+def start_batch_writers() -> None:
+    for writer in batch_writers.values():
+        writer.start()
+    logger.info(f"Started batch writers (max {BATCH_MAX_SIZE} rows / {BATCH_FLUSH_INTERVAL * 1000:.0f} ms)")
+
+
+async def stop_batch_writers() -> None:
+    """
+    Flush all pending rows. Must run before the connection pool is closed.
+    """
+    await asyncio.gather(*(writer.stop() for writer in batch_writers.values()))
+    logger.info("Batch writers flushed and stopped.")
@@ -0,0 +1,86 @@
+import os
+import asyncio
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from database.postgres import acquire, get_postgres
+from utils.logger import get_logger
+from utils.metrics import Counter, Gauge
+
+logger = get_logger()
+
+DEAD_LETTER_QUEUE_SIZE = int(os.getenv("DEAD_LETTER_QUEUE_SIZE", "10000"))
+DEAD_LETTER_FLUSH_INTERVAL = float(os.getenv("DEAD_LETTER_FLUSH_INTERVAL_MS", "1000")) / 1000
+DEAD_LETTER_ERROR_MAX_LENGTH = 2000
+
+COLUMNS = ["received_at", "topic", "payload", "error"]
+
+
+class DeadLetterWriter:
+    """
+    Collects rejected messages and writes them to the dead_letter table with one
+    COPY per ``flush_interval``. A flood of bad messages never blocks ingestion:
+    beyond ``max_queue_size`` pending rows new ones are counted and dropped.
+    """
+
+    def __init__(self, max_queue_size: int = DEAD_LETTER_QUEUE_SIZE, flush_interval: float = DEAD_LETTER_FLUSH_INTERVAL):
+        self.max_queue_size = max_queue_size
+        self.flush_interval = flush_interval
+        self.received = 0
+        self.dropped = 0
+        self._buffer: List[Tuple] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def stats(self) -> dict:
+        return {"depth": len(self._buffer), "received": self.received, "dropped": self.dropped}
+
+    def submit(self, topic: str, payload: bytes, error: str) -> None:
+        self.received += 1
+        if len(self._buffer) >= self.max_queue_size:
+            self.dropped += 1
+            return
+        self._buffer.append((datetime.now(timezone.utc), topic, bytes(payload), error[:DEAD_LETTER_ERROR_MAX_LENGTH]))
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        records, self._buffer = self._buffer, []
+        try:
+            pool = await get_postgres()
+            async with acquire(pool) as conn:
+                await conn.copy_records_to_table("dead_letter", records=records, columns=COLUMNS)
+        except Exception as e:
+            self.dropped += len(records)
+            logger.error(f"Failed to write {len(records)} dead letters: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="dead-letter-writer")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+dead_letters = DeadLetterWriter()
+
+DEAD_LETTERS = Counter(
+    "dead_letters_total", "Messages rejected into the dead-letter queue", collect=lambda: {(): dead_letters.received}
+)
+DEAD_LETTERS_DROPPED = Counter(
+    "dead_letters_dropped_total", "Dead letters lost to a full queue or a failed write",
+    collect=lambda: {(): dead_letters.dropped},
+)
+DEAD_LETTER_QUEUE_DEPTH = Gauge(
+    "dead_letter_queue_depth", "Dead letters waiting to be written", collect=lambda: {(): dead_letters.stats()["depth"]}
+)
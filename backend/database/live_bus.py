@@ -0,0 +1,281 @@
+import os
+import json
+import uuid
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+import asyncpg
+from database.postgres import get_postgres
+from utils.logger import get_logger
+from utils.metrics import Counter, Gauge
+from utils.retry import backoff_delay
+
+logger = get_logger()
+
+# "local" keeps everything in this process; "postgres" shares events between workers
+LIVE_BUS = os.getenv("LIVE_BUS", "local")
+LIVE_BUS_CHANNEL = os.getenv("LIVE_BUS_CHANNEL", "telemetry_live")
+LIVE_BUS_FLUSH_INTERVAL = float(os.getenv("LIVE_BUS_FLUSH_INTERVAL_MS", "5")) / 1000
+LIVE_BUS_RECONNECT_MAX_DELAY = 10
+# Events kept for the next NOTIFY while the bus connection is down; the oldest are dropped beyond this
+LIVE_BUS_MAX_PENDING = int(os.getenv("LIVE_BUS_MAX_PENDING", "10000"))
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_MAX_BYTES = 7900
+# Larger events are sent as consecutive fragments of at most this many bytes of JSON
+FRAGMENT_MAX_BYTES = NOTIFY_MAX_BYTES - 200
+FRAGMENT = "fragment"
+
+WORKER_ID = uuid.uuid4().hex[:12]
+WORKER_APPLICATION_PREFIX = "telemetry-worker-"
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class LiveBus:
+    """
+    Delivers events published by any worker to every worker, in the same order.
+
+    In local mode ``publish`` calls the handlers directly. In postgres mode events
+    are batched for up to ``flush_interval`` seconds into one NOTIFY on a dedicated
+    connection, and every worker, including the publisher, LISTENs on the channel
+    and runs the handlers as the notifications arrive. Postgres hands all listeners
+    the notifications in commit order, so every worker sees one global sequence.
+
+    Events too large for one NOTIFY are split into fragments that the publisher
+    queues back to back; listeners put the event back together when its last
+    fragment arrives, so it takes that place in the sequence on every worker.
+
+    Delivery is best effort: events published while a worker's bus connection is
+    down do not reach it, and at most ``max_pending`` events wait for a NOTIFY,
+    the oldest being dropped first. The bus connection is named after ``worker_id`` so that
+    other workers can tell from ``pg_stat_activity`` whether this one is alive.
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str] = os.getenv("DATABASE_URL"),
+        channel: str = LIVE_BUS_CHANNEL,
+        enabled: bool = LIVE_BUS == "postgres",
+        flush_interval: float = LIVE_BUS_FLUSH_INTERVAL,
+        max_pending: int = LIVE_BUS_MAX_PENDING,
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.worker_id = WORKER_ID
+        self.published = 0
+        self.received = 0
+        self.oversized = 0
+        self.dropped = 0
+        self._handlers: Dict[str, Handler] = {}
+        self._pending: Deque[Tuple[str, int]] = deque()
+        self._pending_available = asyncio.Event()
+        # Fragments received so far of the event each worker is sending
+        self._fragments: Dict[str, List[str]] = {}
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._conn: Optional[asyncpg.Connection] = None
+        self._tasks: List[asyncio.Task] = []
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    def on(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    def stats(self) -> dict:
+        return {
+            "mode": "postgres" if self.enabled else "local",
+            "worker_id": self.worker_id,
+            "connected": self._conn is not None and not self._conn.is_closed(),
+            "pending": len(self._pending),
+            "published": self.published,
+            "received": self.received,
+            "oversized": self.oversized,
+            "dropped": self.dropped,
+        }
+
+    async def _dispatch(self, kind: str, data: dict) -> None:
+        handler = self._handlers.get(kind)
+        if handler is None:
+            logger.warning(f"No live bus handler for {kind}")
+            return
+        try:
+            await handler(data)
+        except Exception as e:
+            logger.error(f"Live bus handler for {kind} failed: {e}")
+
+    async def publish(self, kind: str, data: Any) -> None:
+        """
+        Send an event to every worker. ``data`` must be JSON serializable.
+        """
+        if not self.enabled:
+            await self._dispatch(kind, data)
+            return
+
+        event = json.dumps([kind, data], separators=(",", ":"), default=str)
+        if len(event) + 3 > NOTIFY_MAX_BYTES:
+            self.oversized += 1
+            parts = self._split(event)
+            for index, part in enumerate(parts):
+                fragment = {"worker_id": self.worker_id, "index": index, "count": len(parts), "part": part}
+                self._enqueue(json.dumps([FRAGMENT, fragment], separators=(",", ":")))
+        else:
+            self._enqueue(event)
+        self._pending_available.set()
+
+    def _enqueue(self, event: str) -> None:
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        # json.dumps escapes everything to ASCII, so characters are bytes
+        self._pending.append((event, len(event) + 1))
+
+    @staticmethod
+    def _split(event: str) -> List[str]:
+        """
+        Cut ``event`` into pieces that stay within FRAGMENT_MAX_BYTES once JSON encoded.
+        """
+        parts, start = [], 0
+        while start < len(event):
+            end = start + FRAGMENT_MAX_BYTES
+            while (size := len(json.dumps(event[start:end]))) > FRAGMENT_MAX_BYTES:
+                # Quotes and backslashes grow when escaped again
+                end = start + (end - start) * FRAGMENT_MAX_BYTES // size
+            parts.append(event[start:end])
+            start = end
+        return parts
+
+    def _reassemble(self, fragment: dict) -> Optional[list]:
+        """
+        Add a fragment to the event its worker is sending; returns the event once complete.
+        """
+        worker_id, index = fragment["worker_id"], fragment["index"]
+        parts = self._fragments.pop(worker_id, []) if index else []
+        if index != len(parts):
+            if index + 1 == fragment["count"]:
+                logger.warning(f"Discarding live bus event from worker {worker_id} that lost a fragment")
+            return None
+        parts.append(fragment["part"])
+        if len(parts) < fragment["count"]:
+            self._fragments[worker_id] = parts
+            return None
+        return json.loads("".join(parts))
+
+    def _take_batch(self) -> List[str]:
+        """
+        Pop as many pending events as fit in one NOTIFY payload.
+        """
+        batch, size = [], 2
+        while self._pending and (not batch or size + self._pending[0][1] <= NOTIFY_MAX_BYTES):
+            event, event_size = self._pending.popleft()
+            batch.append(event)
+            size += event_size
+        return batch
+
+    def _on_notification(self, _conn, _pid, _channel, payload: str) -> None:
+        try:
+            events = json.loads(payload)
+        except ValueError:
+            logger.error("Discarding malformed live bus notification")
+            return
+        for event in events:
+            if event[0] == FRAGMENT:
+                event = self._reassemble(event[1])
+                if event is None:
+                    continue
+            self._inbox.put_nowait(event)
+
+    async def _connect(self) -> None:
+        attempt = 0
+        while True:
+            try:
+                conn = await asyncpg.connect(
+                    self.dsn, server_settings={"application_name": WORKER_APPLICATION_PREFIX + self.worker_id}
+                )
+                await conn.add_listener(self.channel, self._on_notification)
+                conn.add_termination_listener(self._on_termination)
+                self._conn = conn
+                logger.info(f"Live bus listening on '{self.channel}' as worker {self.worker_id}")
+                return
+            except Exception as e:
+                delay = backoff_delay(attempt, max_delay=LIVE_BUS_RECONNECT_MAX_DELAY)
+                attempt += 1
+                logger.warning(f"Live bus connection failed, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+
+    def _on_termination(self, _conn) -> None:
+        if self._tasks and (self._reconnect_task is None or self._reconnect_task.done()):
+            logger.warning("Live bus connection lost, reconnecting")
+            self._reconnect_task = asyncio.create_task(self._connect())
+
+    async def _publisher(self) -> None:
+        while True:
+            await self._pending_available.wait()
+            await asyncio.sleep(self.flush_interval)
+            self._pending_available.clear()
+            while self._pending:
+                batch = self._take_batch()
+                try:
+                    if self._reconnect_task is not None and not self._reconnect_task.done():
+                        await asyncio.shield(self._reconnect_task)
+                    await self._conn.execute("SELECT pg_notify($1, $2)", self.channel, "[" + ",".join(batch) + "]")
+                    self.published += len(batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.dropped += len(batch)
+                    logger.error(f"Live bus NOTIFY failed, dropping {len(batch)} events: {e}")
+
+    async def _dispatcher(self) -> None:
+        while True:
+            kind, data = await self._inbox.get()
+            self.received += 1
+            await self._dispatch(kind, data)
+
+    async def start(self) -> None:
+        if not self.enabled or self._tasks:
+            return
+        await self._connect()
+        self._tasks = [
+            asyncio.create_task(self._publisher(), name="live-bus-publisher"),
+            asyncio.create_task(self._dispatcher(), name="live-bus-dispatcher"),
+        ]
+
+    async def stop(self) -> None:
+        tasks, self._tasks = [*self._tasks, self._reconnect_task], []
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(task for task in tasks if task is not None), return_exceptions=True)
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def live_workers(self, worker_ids: Iterable[str]) -> Set[str]:
+        """
+        The subset of ``worker_ids`` whose bus connection is still open.
+        """
+        worker_ids = set(worker_ids)
+        if not self.enabled:
+            return worker_ids
+        pool = await get_postgres()
+        rows = await pool.fetch(
+            "SELECT application_name FROM pg_stat_activity WHERE application_name = ANY($1::text[])",
+            [WORKER_APPLICATION_PREFIX + worker_id for worker_id in worker_ids],
+        )
+        return {row["application_name"][len(WORKER_APPLICATION_PREFIX):] for row in rows}
+
+
+live_bus = LiveBus()
+
+LIVE_BUS_EVENTS = Counter(
+    "live_bus_events_total", "Live bus events by outcome", ["outcome"],
+    collect=lambda: {
+        ("published",): live_bus.published,
+        ("received",): live_bus.received,
+        ("oversized",): live_bus.oversized,
+        ("dropped",): live_bus.dropped,
+    },
+)
+LIVE_BUS_PENDING = Gauge("live_bus_pending", "Events waiting for the next NOTIFY", collect=lambda: {(): live_bus.stats()["pending"]})
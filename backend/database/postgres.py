@@ -1,44 +1,128 @@
 import os
-import asyncpg
+import json
+import time
 import asyncio
-from datetime import datetime
-from typing import Optional
+import asyncpg
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 from utils.logger import get_logger
+from utils.metrics import Gauge, Histogram
+from utils.retry import retry
+from database.streams import STREAMS, Stream
 
 logger = get_logger()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+DEFAULT_VESSEL_ID = os.getenv("DEFAULT_VESSEL_ID", "default")
+CAGG_REFRESH_WINDOW = os.getenv("CAGG_REFRESH_WINDOW", "7 days")
+
+# Storage policies are opt-in; each is an interval such as '7 days'
+COMPRESS_AFTER = os.getenv("TIMESCALE_COMPRESS_AFTER") or None
+RAW_RETENTION = os.getenv("TIMESCALE_RAW_RETENTION") or None
+ROLLUP_RETENTION = os.getenv("TIMESCALE_ROLLUP_RETENTION") or None
+
+HYPERTABLES = tuple(STREAMS)
+
+# Arbitrary keys for the advisory locks held while creating the schema and
+# while materializing the history of new continuous aggregates
+SCHEMA_LOCK_ID = 7301
+BACKFILL_LOCK_ID = 7302
 
 conn_pool: Optional[asyncpg.Pool] = None
 
+POOL_ACQUIRE_SECONDS = Histogram("db_pool_acquire_seconds", "Time spent waiting for a pooled connection")
+POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Connections in the pool by state", ["state"],
+    collect=lambda: {} if conn_pool is None else {
+        ("open",): conn_pool.get_size(),
+        ("idle",): conn_pool.get_idle_size(),
+    },
+)
+
+# Per-bucket aggregate of every column, by table
+AGGREGATE_EXPRESSIONS: Dict[str, Dict[str, str]] = {
+    name: stream.aggregates for name, stream in STREAMS.items() if stream.aggregates
+}
+
+AGGREGATE_COLUMNS: Dict[str, str] = {
+    table_name: ",\n".join(f"{expression} as {column}" for column, expression in expressions.items())
+    for table_name, expressions in AGGREGATE_EXPRESSIONS.items()
+}
+
+
+def envelope_expressions(table_name: str) -> Dict[str, str]:
+    """
+    Per-bucket minimum and maximum of every numeric column, as ``{column}_min`` and ``{column}_max``.
+    """
+    expressions = {}
+    for field in STREAMS[table_name].numeric_fields:
+        expressions[f"{field}_min"] = f"MIN({field})"
+        expressions[f"{field}_max"] = f"MAX({field})"
+    return expressions
+
+
+def continuous_aggregate_expressions(table_name: str) -> Dict[str, str]:
+    """
+    Columns of a table's continuous aggregates besides the bucket and vessel_id:
+    the aggregates followed by the min/max envelope, so that downsampled views of
+    long ranges keep their peaks without reading the raw hypertable.
+    """
+    return {**AGGREGATE_EXPRESSIONS[table_name], **envelope_expressions(table_name)}
+
+# Bucket widths used by the historic dashboard, each backed by a continuous aggregate
+CONTINUOUS_AGGREGATE_INTERVALS: Dict[timedelta, str] = {
+    timedelta(minutes=1): "1m",
+    timedelta(minutes=5): "5m",
+    timedelta(minutes=15): "15m",
+}
+
+# Views that exist and can be queried, filled in by create_continuous_aggregates()
+continuous_aggregates: Set[str] = set()
+# Views this worker created that still need their history materialized
+_backfills: List[Tuple[str, timedelta]] = []
+_backfill_task: Optional[asyncio.Task] = None
+
+class TelemetryConnection(asyncpg.Connection):
+    """
+    Pooled connection that prepares each stream's insert statement on first use
+    and keeps it for the connection's lifetime, so repeated inserts skip parsing
+    and planning. Releasing a connection to the pool does not deallocate them.
+    """
+
+    __slots__ = ("_insert_statements",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._insert_statements: Dict[str, asyncpg.prepared_stmt.PreparedStatement] = {}
+
+    async def insert_statement(self, stream: Stream) -> asyncpg.prepared_stmt.PreparedStatement:
+        statement = self._insert_statements.get(stream.name)
+        if statement is None:
+            statement = self._insert_statements[stream.name] = await self.prepare(stream.insert_sql())
+        return statement
+
+
 async def init_postgres() -> None:
     """
-    Initialize the PostgreSQL connection pool and create tables if they don't exist.
+    Initialize the PostgreSQL connection pool and bring the schema up to date,
+    retrying with exponential backoff until the database is reachable.
     """
-    global conn_pool
-    max_retries = 30
-    retry_delay = 2
-    
-    for attempt in range(max_retries):
+    async def connect():
+        global conn_pool
+        logger.info("Initializing PostgreSQL connection pool...")
+        conn_pool = await asyncpg.create_pool(
+            dsn=DATABASE_URL, min_size=1, max_size=10, connection_class=TelemetryConnection
+        )
         try:
-            logger.info(f"Initializing PostgreSQL connection pool...")
-
-            conn_pool = await asyncpg.create_pool(
-                dsn=DATABASE_URL, min_size=1, max_size=10
-            )
-            
-            await create_all_tables()
-                
-            logger.info("PostgreSQL connection pool and tables created successfully.")
-            return
+            await migrate()
+        except Exception:
+            pool, conn_pool = conn_pool, None
+            await pool.close()
+            raise
 
-        except Exception as e:
-            logger.warning(f"PostgreSQL connection attempt {attempt + 1}/{max_retries} failed: {e}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(retry_delay)
-            else:
-                logger.error("Failed to connect to PostgreSQL after all retries")
-                raise
+    await retry(connect, "PostgreSQL connection")
+    logger.info("PostgreSQL connection pool initialized and schema is current.")
 
 
 async def get_postgres() -> asyncpg.Pool:
@@ -61,11 +145,26 @@ async def get_postgres() -> asyncpg.Pool:
         raise
 
 
+@asynccontextmanager
+async def acquire(pool: asyncpg.Pool) -> AsyncIterator[asyncpg.Connection]:
+    """
+    Acquire a connection from the pool, recording how long the wait took.
+    """
+    started = time.perf_counter()
+    async with pool.acquire() as conn:
+        POOL_ACQUIRE_SECONDS.observe(time.perf_counter() - started)
+        yield conn
+
+
 async def close_postgres() -> None:
     """
     Close the PostgreSQL connection pool.
     """
-    global conn_pool
+    global conn_pool, _backfill_task
+    if _backfill_task is not None:
+        _backfill_task.cancel()
+        await asyncio.gather(_backfill_task, return_exceptions=True)
+        _backfill_task = None
     if conn_pool is not None:
         try:
             logger.info("Closing PostgreSQL connection pool...")
@@ -79,305 +178,475 @@ async def close_postgres() -> None:
 
 
 # region create
-async def create_battery_table():
-        async with conn_pool.acquire() as conn:
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS battery (
-                    id SERIAL,
-                    timestamp TIMESTAMPTZ NOT NULL,
-                    left_battery_voltage FLOAT NOT NULL,
-                    right_battery_voltage FLOAT NOT NULL,
-                    central_battery_voltage FLOAT NOT NULL,
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (id, timestamp)
-                )
-            """)
+async def create_stream_table(conn, stream: Stream):
+    await conn.execute(stream.create_table_sql())
+    try:
+        await conn.execute(f"""
+            SELECT create_hypertable('{stream.name}', 'timestamp',
+                if_not_exists => TRUE,
+                create_default_indexes => TRUE,
+                chunk_time_interval => INTERVAL '{stream.chunk_interval}'
+            )
+        """)
+    except Exception as e:
+        logger.error(f"Error creating hypertable: {e}")
+        raise
 
-            try:
-                await conn.execute("""
-                    SELECT create_hypertable('battery', 'timestamp', 
-                        if_not_exists => TRUE,
-                        create_default_indexes => TRUE,
-                        chunk_time_interval => INTERVAL '1 day'
-                    )
-                """)
-                logger.info("Created or confirmed battery hypertable")
-            except Exception as e:
-                logger.error(f"Error creating hypertable: {e}")
-                raise
+    # Fields added to the model after the table was created; nullable, since older rows lack them
+    existing = {
+        row["column_name"] for row in await conn.fetch(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = $1", stream.name
+        )
+    }
+    for field, definition in zip(stream.fields, stream.field_definitions()):
+        if field not in existing:
+            await conn.execute(f"ALTER TABLE {stream.name} ADD COLUMN {definition}")
+    logger.info(f"Created or confirmed {stream.name} hypertable")
 
 
-async def create_mission_table():
-        async with conn_pool.acquire() as conn:
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS mission (
-                    id SERIAL,
-                    timestamp TIMESTAMPTZ NOT NULL,
-                    description TEXT NOT NULL,
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (id, timestamp)
-                )
-            """)
+async def create_dead_letter_table():
+    """
+    Messages that failed to decode or validate, kept with the raw bytes for inspection.
+    """
+    async with conn_pool.acquire() as conn:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                id BIGSERIAL PRIMARY KEY,
+                received_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                topic TEXT NOT NULL,
+                payload BYTEA NOT NULL,
+                error TEXT NOT NULL
+            )
+        """)
+        await conn.execute("CREATE INDEX IF NOT EXISTS dead_letter_received_at_idx ON dead_letter (received_at DESC)")
+        logger.info("Created or confirmed dead_letter table")
 
-            try:
-                await conn.execute("""
-                    SELECT create_hypertable('mission', 'timestamp', 
-                        if_not_exists => TRUE,
-                        create_default_indexes => TRUE,
-                        chunk_time_interval => INTERVAL '1 day'
-                    )
+
+async def create_stream_metadata_table():
+    """
+    Per stream and vessel summary kept up to date by the ingestion path. When the
+    table is first created it is backfilled from the hypertables, once.
+    """
+    async with conn_pool.acquire() as conn:
+        exists = await conn.fetchval("SELECT to_regclass('stream_metadata') IS NOT NULL")
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS stream_metadata (
+                stream TEXT NOT NULL,
+                vessel_id TEXT NOT NULL,
+                first_ts TIMESTAMPTZ NOT NULL,
+                last_ts TIMESTAMPTZ NOT NULL,
+                row_count BIGINT NOT NULL,
+                last_seen TIMESTAMPTZ NOT NULL,
+                PRIMARY KEY (stream, vessel_id)
+            )
+        """)
+        if not exists:
+            for table_name in HYPERTABLES:
+                await conn.execute(f"""
+                    INSERT INTO stream_metadata (stream, vessel_id, first_ts, last_ts, row_count, last_seen)
+                    SELECT '{table_name}', vessel_id, MIN(timestamp), MAX(timestamp), COUNT(*),
+                        COALESCE(MAX(created_at), MAX(timestamp))
+                    FROM {table_name}
+                    GROUP BY vessel_id
                 """)
-                logger.info("Created or confirmed mission hypertable")
-            except Exception as e:
-                logger.error(f"Error creating hypertable: {e}")
-                raise
+            logger.info("Created and backfilled stream_metadata table")
 
 
-async def create_mode_table():
-        async with conn_pool.acquire() as conn:
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS mode (
-                    id SERIAL,
-                    timestamp TIMESTAMPTZ NOT NULL,
-                    mode TEXT NOT NULL,
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (id, timestamp)
-                )
+async def create_vessel_columns():
+    """
+    Add the vessel key to every hypertable, indexed together with the timestamp.
+    Rows written before fleet support belong to the default vessel.
+    """
+    async with conn_pool.acquire() as conn:
+        for table_name in HYPERTABLES:
+            await conn.execute(f"""
+                ALTER TABLE {table_name}
+                ADD COLUMN IF NOT EXISTS vessel_id TEXT NOT NULL DEFAULT '{DEFAULT_VESSEL_ID}'
             """)
+            await conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS {table_name}_vessel_id_timestamp_idx
+                ON {table_name} (vessel_id, timestamp DESC)
+            """)
+        logger.info("Created or confirmed vessel columns")
 
-            try:
-                await conn.execute("""
-                    SELECT create_hypertable('mode', 'timestamp', 
-                        if_not_exists => TRUE,
-                        create_default_indexes => TRUE,
-                        chunk_time_interval => INTERVAL '1 day'
-                    )
-                """)
-                logger.info("Created or confirmed mode hypertable")
-            except Exception as e:
-                logger.error(f"Error creating hypertable: {e}")
-                raise
 
+async def create_telemetry_tables():
+    """
+    A hypertable for every registered stream.
+    """
+    async with conn_pool.acquire() as conn:
+        for stream in STREAMS.values():
+            await create_stream_table(conn, stream)
 
-async def create_obstacle_table():
-        async with conn_pool.acquire() as conn:
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS obstacle (
-                    id SERIAL,
-                    timestamp TIMESTAMPTZ NOT NULL,
-                    latitude FLOAT NOT NULL,
-                    longitude FLOAT NOT NULL,
-                    distance FLOAT NOT NULL,
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (id, timestamp)
-                )
-            """)
 
-            try:
-                await conn.execute("""
-                    SELECT create_hypertable('obstacle', 'timestamp', 
-                        if_not_exists => TRUE,
-                        create_default_indexes => TRUE,
-                        chunk_time_interval => INTERVAL '1 day'
-                    )
-                """)
-                logger.info("Created or confirmed obstacle hypertable")
-            except Exception as e:
-                logger.error(f"Error creating hypertable: {e}")
-                raise
+# endregion
 
+# region continuous aggregates
+def continuous_aggregate_name(table_name: str, interval: timedelta) -> Optional[str]:
+    """
+    Name of the continuous aggregate for the given table and bucket width, if there is one.
+    """
+    suffix = CONTINUOUS_AGGREGATE_INTERVALS.get(interval)
+    if suffix is None:
+        return None
+    view_name = f"{table_name}_{suffix}"
+    return view_name if view_name in continuous_aggregates else None
 
-async def create_position_table():
-        async with conn_pool.acquire() as conn:
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS position (
-                    id SERIAL,
-                    timestamp TIMESTAMPTZ NOT NULL,
-                    latitude FLOAT NOT NULL,
-                    longitude FLOAT NOT NULL,
-                    velocity FLOAT NOT NULL,
-                    heading FLOAT NOT NULL,
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (id, timestamp)
-                )
-            """)
 
-            try:
-                await conn.execute("""
-                    SELECT create_hypertable('position', 'timestamp', 
-                        if_not_exists => TRUE,
-                        create_default_indexes => TRUE,
-                        chunk_time_interval => INTERVAL '1 day'
-                    )
-                """)
-                logger.info("Created or confirmed position hypertable")
-            except Exception as e:
-                logger.error(f"Error creating hypertable: {e}")
-                raise
+def rollup_for(table_name: str, width: timedelta) -> Optional[str]:
+    """
+    The coarsest existing continuous aggregate of the table whose buckets fit in ``width``.
+    """
+    for interval, suffix in sorted(CONTINUOUS_AGGREGATE_INTERVALS.items(), reverse=True):
+        view_name = f"{table_name}_{suffix}"
+        if interval <= width and view_name in continuous_aggregates:
+            return view_name
+    return None
 
 
-async def create_thrusters_input_table():
-        async with conn_pool.acquire() as conn:
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS thrusters_input (
-                    id SERIAL,
-                    timestamp TIMESTAMPTZ NOT NULL,
-                    left_thruster FLOAT NOT NULL,
-                    right_thruster FLOAT NOT NULL,
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (id, timestamp)
-                )
-            """)
+REFRESH_POLICY_QUERY = """
+    SELECT 1 FROM timescaledb_information.continuous_aggregates AS cagg
+    JOIN timescaledb_information.jobs AS job ON job.hypertable_name = cagg.materialization_hypertable_name
+    WHERE cagg.view_name = $1 AND job.proc_name = 'policy_refresh_continuous_aggregate'
+"""
 
-            try:
-                await conn.execute("""
-                    SELECT create_hypertable('thrusters_input', 'timestamp', 
-                        if_not_exists => TRUE,
-                        create_default_indexes => TRUE,
-                        chunk_time_interval => INTERVAL '1 day'
-                    )
-                """)
-                logger.info("Created or confirmed thrusters_input hypertable")
-            except Exception as e:
-                logger.error(f"Error creating hypertable: {e}")
-                raise
 
+def continuous_aggregate_columns(table_name: str) -> List[str]:
+    return ["timestamp", "vessel_id", *continuous_aggregate_expressions(table_name)]
 
-async def create_acceleration_table():
-    async with conn_pool.acquire() as conn:
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS acceleration (
-                id SERIAL,
-                timestamp TIMESTAMPTZ NOT NULL,
-                acceleration FLOAT NOT NULL,
-                created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (id, timestamp)
+
+async def create_continuous_aggregate(conn, table_name: str, interval: timedelta, view_name: str) -> bool:
+    """
+    Create the view WITH NO DATA if it is missing or was built for other columns.
+    Returns whether it still lacks its refresh policy, which
+    ``backfill_continuous_aggregates`` adds once the history is materialized.
+    Until then the real-time view has no watermark and reads everything raw.
+    """
+    rows = await conn.fetch(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = $1 ORDER BY ordinal_position",
+        view_name,
+    )
+    columns = [row["column_name"] for row in rows]
+    if columns and columns != continuous_aggregate_columns(table_name):
+        if RAW_RETENTION is not None:
+            # Views cannot be altered, and the raw rows to rebuild it from are partly gone
+            raise RuntimeError(
+                f"{view_name} has outdated columns but holds the only rollups of raw data dropped by "
+                f"TIMESCALE_RAW_RETENTION ({RAW_RETENTION}); drop it by hand to rebuild it from the raw data left"
             )
+        logger.info(f"Recreating {view_name} for the current columns of {table_name}")
+        await conn.execute(f"DROP MATERIALIZED VIEW {view_name}")
+        columns = []
+
+    if not columns:
+        bucket = f"{int(interval.total_seconds())} seconds"
+        await conn.execute(f"""
+            CREATE MATERIALIZED VIEW {view_name}
+            WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+            SELECT
+                time_bucket(INTERVAL '{bucket}', timestamp) AS timestamp,
+                vessel_id,
+                {", ".join(f"{expression} AS {column}" for column, expression in continuous_aggregate_expressions(table_name).items())}
+            FROM {table_name}
+            GROUP BY 1, 2
+            WITH NO DATA
         """)
+    return not await conn.fetchval(REFRESH_POLICY_QUERY, view_name)
+
 
+async def add_refresh_policy(conn, view_name: str, interval: timedelta):
+    await conn.execute(f"""
+        SELECT add_continuous_aggregate_policy('{view_name}',
+            start_offset => INTERVAL '{CAGG_REFRESH_WINDOW}',
+            end_offset => INTERVAL '{int(interval.total_seconds())} seconds',
+            schedule_interval => INTERVAL '{int(interval.total_seconds())} seconds',
+            if_not_exists => TRUE
+        )
+    """)
+
+
+async def backfill_continuous_aggregates():
+    """
+    Materialize the history of the views queued by ``create_continuous_aggregate``,
+    then add their refresh policy and start reading from them. Runs after the
+    schema lock is released, so that other workers are not held up, and under a
+    lock of its own so that two workers do not materialize the same view.
+    """
+    async with conn_pool.acquire() as conn:
+        await conn.execute("SELECT pg_advisory_lock($1)", BACKFILL_LOCK_ID)
         try:
-            await conn.execute("""
-                SELECT create_hypertable('acceleration', 'timestamp', 
-                    if_not_exists => TRUE,
-                    create_default_indexes => TRUE,
-                    chunk_time_interval => INTERVAL '1 day'
-                )
-            """)
-            logger.info("Created or confirmed acceleration hypertable")
-        except Exception as e:
-            logger.error(f"Error creating hypertable: {e}")
-            raise
+            while _backfills:
+                view_name, interval = _backfills.pop(0)
+                try:
+                    if not await conn.fetchval(REFRESH_POLICY_QUERY, view_name):
+                        # Only where raw data is left: refreshing past it would erase rollups
+                        start = "NULL" if RAW_RETENTION is None else f"now() - INTERVAL '{RAW_RETENTION}'"
+                        logger.info(f"Materializing the history of {view_name}")
+                        await conn.execute(f"CALL refresh_continuous_aggregate('{view_name}', {start}, NULL)")
+                        await add_refresh_policy(conn, view_name, interval)
+                        await configure_retention(conn, view_name, ROLLUP_RETENTION)
+                    continuous_aggregates.add(view_name)
+                except Exception as e:
+                    logger.error(f"Failed to materialize {view_name}, using raw data until the next start: {e}")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", BACKFILL_LOCK_ID)
+
+
+def expected_continuous_aggregates() -> Set[str]:
+    return {
+        f"{table_name}_{suffix}"
+        for table_name in AGGREGATE_COLUMNS
+        for suffix in CONTINUOUS_AGGREGATE_INTERVALS.values()
+    }
+
+
+async def load_continuous_aggregates(view_names: Set[str]):
+    """
+    Record which of the expected continuous aggregates exist in the database.
+    """
+    continuous_aggregates.clear()
+    continuous_aggregates.update(expected_continuous_aggregates() & view_names)
 
 
-async def create_all_tables():
-    await create_battery_table()
-    await create_mission_table()
-    await create_mode_table()
-    await create_obstacle_table()
-    await create_position_table()
-    await create_thrusters_input_table()
-    await create_acceleration_table()
+async def create_continuous_aggregates():
+    """
+    Create a continuous aggregate with a refresh policy for every aggregated table
+    and standard bucket width. Views are real-time, so buckets that are not yet
+    materialized are computed from the raw hypertable at query time. New views
+    are queued for ``backfill_continuous_aggregates``.
+    """
+    async with conn_pool.acquire() as conn:
+        for table_name in AGGREGATE_COLUMNS:
+            for interval, suffix in CONTINUOUS_AGGREGATE_INTERVALS.items():
+                view_name = f"{table_name}_{suffix}"
+                try:
+                    if await create_continuous_aggregate(conn, table_name, interval, view_name):
+                        _backfills.append((view_name, interval))
+                    else:
+                        continuous_aggregates.add(view_name)
+                except Exception as e:
+                    logger.error(f"Continuous aggregate {view_name} unavailable, using raw data: {e}")
+
+    logger.info(f"Created or confirmed {len(continuous_aggregates)} continuous aggregates, {len(_backfills)} to backfill")
 
 
 # endregion
 
-# region insert
-async def insert_battery(payload):
-    try:
-        pool = await get_postgres()
-        async with pool.acquire() as conn:
-            timestamp = datetime.fromisoformat(payload['timestamp'])
-            await conn.execute("""
-                INSERT INTO battery (timestamp, left_battery_voltage, right_battery_voltage, central_battery_voltage)
-                VALUES ($1, $2, $3, $4)
-            """, timestamp, payload['left_battery_voltage'], payload['right_battery_voltage'], payload['central_battery_voltage'])
-    except Exception as e:
-        logger.error("Failed to insert battery payload")
-        raise
+# region storage policies
+async def configure_compression(conn, table_name: str):
+    await conn.execute(f"SELECT remove_compression_policy('{table_name}', if_exists => TRUE)")
+    if COMPRESS_AFTER is None:
+        return
+
+    enabled = await conn.fetchval(
+        "SELECT compression_enabled FROM timescaledb_information.hypertables WHERE hypertable_name = $1", table_name
+    )
+    if not enabled:
+        await conn.execute(f"""
+            ALTER TABLE {table_name} SET (
+                timescaledb.compress,
+                timescaledb.compress_segmentby = 'vessel_id',
+                timescaledb.compress_orderby = 'timestamp DESC'
+            )
+        """)
+    await conn.execute(f"SELECT add_compression_policy('{table_name}', INTERVAL '{COMPRESS_AFTER}')")
 
 
-async def insert_mission(payload):
-    try:
-        pool = await get_postgres()
-        async with pool.acquire() as conn:
-            timestamp = datetime.fromisoformat(payload['timestamp'])
-            await conn.execute("""
-                INSERT INTO mission (timestamp, description)
-                VALUES ($1, $2)
-            """, timestamp, payload['description'])
-    except Exception as e:
-        logger.error("Failed to insert mission payload")
-        raise
+async def configure_retention(conn, relation: str, drop_after: Optional[str]):
+    await conn.execute(f"SELECT remove_retention_policy('{relation}', if_exists => TRUE)")
+    if drop_after is not None:
+        await conn.execute(f"SELECT add_retention_policy('{relation}', INTERVAL '{drop_after}')")
 
 
-async def insert_mode(payload):
-    try:
-        pool = await get_postgres()
-        async with pool.acquire() as conn:
-            timestamp = datetime.fromisoformat(payload['timestamp'])
-            await conn.execute("""
-                INSERT INTO mode (timestamp, mode)
-                VALUES ($1, $2)
-            """, timestamp, payload['mode'])
-    except Exception as e:
-        logger.error("Failed to insert mode payload")
-        raise
+async def configure_storage_policies():
+    """
+    Apply the opt-in compression and retention settings.
 
+    TIMESCALE_COMPRESS_AFTER compresses raw chunks older than the interval,
+    segmented by vessel and ordered by timestamp. TIMESCALE_RAW_RETENTION drops raw chunks past the
+    interval while the continuous aggregates keep their rollups, which
+    TIMESCALE_ROLLUP_RETENTION can expire separately. Unset variables remove the
+    corresponding policy.
+    """
+    async with conn_pool.acquire() as conn:
+        if RAW_RETENTION is not None:
+            refresh_reaches_dropped_data = await conn.fetchval(
+                "SELECT $1::text::interval >= $2::text::interval", CAGG_REFRESH_WINDOW, RAW_RETENTION
+            )
+            if refresh_reaches_dropped_data:
+                logger.warning(
+                    f"CAGG_REFRESH_WINDOW ({CAGG_REFRESH_WINDOW}) should be shorter than "
+                    f"TIMESCALE_RAW_RETENTION ({RAW_RETENTION}), or refreshes will erase rollups of dropped data"
+                )
 
-async def insert_obstacle(payload):
-    try:
-        pool = await get_postgres()
-        async with pool.acquire() as conn:
-            timestamp = datetime.fromisoformat(payload['timestamp'])
-            await conn.execute("""
-                INSERT INTO obstacle (timestamp, latitude, longitude, distance)
-                VALUES ($1, $2, $3, $4)
-            """, timestamp, payload['latitude'], payload['longitude'], payload['distance'])
-    except Exception as e:
-        logger.error("Failed to insert obstacle payload")
-        raise
+        for table_name in HYPERTABLES:
+            try:
+                await configure_compression(conn, table_name)
+                await configure_retention(conn, table_name, RAW_RETENTION)
+            except Exception as e:
+                logger.error(f"Error configuring storage policies for {table_name}: {e}")
+                raise
 
+        for view_name in continuous_aggregates:
+            try:
+                await configure_retention(conn, view_name, ROLLUP_RETENTION)
+            except Exception as e:
+                logger.error(f"Error configuring retention for {view_name}: {e}")
+                raise
 
-async def insert_position(payload):
-    try:
-        pool = await get_postgres()
-        async with pool.acquire() as conn:
-            timestamp = datetime.fromisoformat(payload['timestamp'])
-            await conn.execute("""
-                INSERT INTO position (timestamp, latitude, longitude, velocity, heading)
-                VALUES ($1, $2, $3, $4, $5)
-            """, timestamp, payload['latitude'], payload['longitude'], payload['velocity'], payload['heading'])
-    except Exception as e:
-        logger.error("Failed to insert position payload")
-        raise
+    logger.info(
+        f"Storage policies: compress after {COMPRESS_AFTER or 'never'}, "
+        f"raw retention {RAW_RETENTION or 'forever'}, rollup retention {ROLLUP_RETENTION or 'forever'}"
+    )
 
 
-async def insert_thrusters_input(payload):
-    try:
-        pool = await get_postgres()
-        async with pool.acquire() as conn:
-            timestamp = datetime.fromisoformat(payload['timestamp'])
-            await conn.execute("""
-                INSERT INTO thrusters_input (timestamp, left_thruster, right_thruster)
-                VALUES ($1, $2, $3)
-            """, timestamp, payload['left_thruster'], payload['right_thruster'])
-    except Exception as e:
-        logger.error("Failed to insert thrusters_input payload")
-        raise
+# endregion
+
+# region migrations
+# Applied in order and recorded in schema_version. Steps must be idempotent:
+# databases created before versioning already have some of these objects.
+# Append a new step for every schema change, never edit an applied one.
+MIGRATIONS: List[Tuple[int, str, Callable[[], Awaitable[None]]]] = [
+    (1, "telemetry hypertables", create_telemetry_tables),
+    (2, "vessel_id columns and indexes", create_vessel_columns),
+    (3, "dead_letter table", create_dead_letter_table),
+    (4, "stream_metadata table", create_stream_metadata_table),
+    (5, "continuous aggregates", create_continuous_aggregates),
+]
+
+SCHEMA_STATE_QUERY = """
+    SELECT
+        (SELECT MAX(version) FROM schema_version) AS version,
+        (SELECT json_object_agg(name, value)::text FROM schema_settings) AS settings,
+        (
+            SELECT json_object_agg(cagg.view_name, (
+                SELECT string_agg(column_name::text, ',' ORDER BY ordinal_position)
+                FROM information_schema.columns WHERE table_name = cagg.view_name
+            ))::text
+            FROM timescaledb_information.continuous_aggregates AS cagg
+            WHERE EXISTS (
+                SELECT 1 FROM timescaledb_information.jobs AS job
+                WHERE job.hypertable_name = cagg.materialization_hypertable_name
+                    AND job.proc_name = 'policy_refresh_continuous_aggregate'
+            )
+        ) AS views
+"""
+
+
+def _stream_fingerprint(stream: Stream) -> str:
+    views = continuous_aggregate_expressions(stream.name) if stream.aggregates else {}
+    columns = ",".join(f"{column}={expression}" for column, expression in views.items())
+    return f"{stream.name}({','.join(stream.field_definitions())})[{columns}]"
 
 
-async def insert_acceleration(payload):
+def schema_settings() -> Dict[str, str]:
+    """
+    Inputs of the schema besides the migrations. When one of them changes the
+    matching idempotent steps run again on the next start.
+    """
+    return {
+        "storage_policies": f"compress_after={COMPRESS_AFTER};raw_retention={RAW_RETENTION};rollup_retention={ROLLUP_RETENTION}",
+        "streams": ";".join(_stream_fingerprint(stream) for stream in STREAMS.values()),
+    }
+
+
+async def read_schema_state(conn) -> Tuple[int, Dict[str, str], Set[str]]:
+    """
+    Schema version, applied schema settings and the continuous aggregates that are
+    ready, i.e. built for the current columns and with their refresh policy, in one
+    round trip. A database from before versioning is version 0.
+    """
     try:
-        pool = await get_postgres()
-        async with pool.acquire() as conn:
-            timestamp = datetime.fromisoformat(payload['timestamp'])
-            await conn.execute("""
-                INSERT INTO acceleration (timestamp, acceleration)
-                VALUES ($1, $2)
-            """, timestamp, payload['acceleration'])
-    except Exception as e:
-        logger.error("Failed to insert acceleration payload")
-        raise
+        row = await conn.fetchrow(SCHEMA_STATE_QUERY)
+    except asyncpg.UndefinedTableError:
+        return 0, {}, set()
+    expected = {
+        f"{table_name}_{suffix}": ",".join(continuous_aggregate_columns(table_name))
+        for table_name in AGGREGATE_COLUMNS
+        for suffix in CONTINUOUS_AGGREGATE_INTERVALS.values()
+    }
+    views = {name for name, columns in json.loads(row["views"] or "{}").items() if expected.get(name) == columns}
+    return row["version"] or 0, json.loads(row["settings"] or "{}"), views
+
+
+async def sync_streams():
+    """
+    Bring tables, columns and continuous aggregates in line with the stream registry.
+    """
+    await create_telemetry_tables()
+    await create_vessel_columns()
+    await create_continuous_aggregates()
+
+
+async def migrate():
+    """
+    Apply pending migrations, then re-sync the stream registry and the storage
+    policies if their settings changed. Continuous aggregates that failed to be
+    created or materialized on an earlier start are attempted again; new ones
+    are materialized in the background once the lock is released.
+
+    A database that is already current costs a single query and takes no lock.
+    Otherwise workers take turns through an advisory lock and re-read the state
+    once they hold it, so each step runs once.
+    """
+    global _backfill_task
+    latest = MIGRATIONS[-1][0]
+    settings = schema_settings()
+    async with conn_pool.acquire() as conn:
+        version, applied, views = await read_schema_state(conn)
+        if version == latest and applied == settings and expected_continuous_aggregates() <= views:
+            await load_continuous_aggregates(views)
+            return
 
+        await conn.execute("SELECT pg_advisory_lock($1)", SCHEMA_LOCK_ID)
+        try:
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_settings (
+                    name TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            version, applied, views = await read_schema_state(conn)
+            streams_changed = applied.get("streams") != settings["streams"]
+            pending = [migration for migration in MIGRATIONS if migration[0] > version]
+            # Creating a view can fail without failing its migration step
+            missing_views = not expected_continuous_aggregates() <= views \
+                and all(apply is not create_continuous_aggregates for _, _, apply in pending)
+            for number, description, apply in pending:
+                logger.info(f"Applying schema migration {number}: {description}")
+                await apply()
+                await conn.execute(
+                    "INSERT INTO schema_version (version, description) VALUES ($1, $2)", number, description
+                )
+            if streams_changed:
+                logger.info("Stream registry changed, syncing stream tables")
+                await sync_streams()
+            elif missing_views:
+                logger.info("Retrying missing continuous aggregates")
+                await create_continuous_aggregates()
+            _, _, views = await read_schema_state(conn)
+            await load_continuous_aggregates(views)
+
+            if pending or streams_changed or missing_views \
+                    or applied.get("storage_policies") != settings["storage_policies"]:
+                await configure_storage_policies()
+            await conn.executemany("""
+                INSERT INTO schema_settings (name, value) VALUES ($1, $2)
+                ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value
+            """, list(settings.items()))
+            logger.info(f"Schema is at version {latest}")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", SCHEMA_LOCK_ID)
+
+    if _backfills and _backfill_task is None:
+        _backfill_task = asyncio.create_task(backfill_continuous_aggregates(), name="cagg-backfill")
 
 
+# endregion
@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple, Union
+from utils.logger import get_logger
+from utils.metrics import Counter, Gauge
+from utils.timestamps import as_utc
+
+logger = get_logger()
+
+QUERY_CACHE_MAX_BYTES = int(float(os.getenv("QUERY_CACHE_MAX_MB", "256")) * 1024 * 1024)
+QUERY_CACHE_LIVE_TTL = float(os.getenv("QUERY_CACHE_LIVE_TTL", "5"))
+QUERY_CACHE_SETTLE = timedelta(seconds=float(os.getenv("QUERY_CACHE_SETTLE", "60")))
+
+
+def _estimate_size(rows: List[Any]) -> int:
+    if not rows:
+        return sys.getsizeof(rows)
+    row_size = sys.getsizeof(rows[0]) + sum(sys.getsizeof(value) for value in rows[0].values())
+    return sys.getsizeof(rows) + len(rows) * row_size
+
+
+class _Entry:
+    __slots__ = ("rows", "tables", "end_ts", "expires_at", "size")
+
+    def __init__(self, rows: List[Any], tables: Tuple[str, ...], end_ts: Optional[datetime], expires_at: Optional[float]):
+        self.rows = rows
+        self.tables = tables
+        self.end_ts = end_ts
+        self.expires_at = expires_at
+        self.size = _estimate_size(rows)
+
+
+class QueryCache:
+    """
+    In-process LRU cache for historic query results, bounded by an estimate of
+    their memory footprint.
+
+    Results whose range ends before ``now - QUERY_CACHE_SETTLE`` are kept until
+    evicted; results touching the live edge expire after ``QUERY_CACHE_LIVE_TTL``.
+    Ingestion calls ``invalidate`` so late rows never leave a stale entry behind.
+    Concurrent requests for the same key share a single database query.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = QUERY_CACHE_MAX_BYTES,
+        live_ttl: float = QUERY_CACHE_LIVE_TTL,
+        settle: timedelta = QUERY_CACHE_SETTLE,
+    ):
+        self.max_bytes = max_bytes
+        self.live_ttl = live_ttl
+        self.settle = settle
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._keys_by_table: Dict[str, Set[Hashable]] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._inflight_ends: Dict[Hashable, Optional[datetime]] = {}
+        self._stale_inflight: Set[Hashable] = set()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+    def _get(self, key: Hashable) -> Optional[List[Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry.rows
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+            for table in entry.tables:
+                self._keys_by_table.get(table, set()).discard(key)
+
+    def _put(self, key: Hashable, tables: Tuple[str, ...], end_ts: Optional[datetime], rows: List[Any]) -> None:
+        closed = end_ts is not None and as_utc(end_ts) < datetime.now(timezone.utc) - self.settle
+        entry = _Entry(rows, tables, end_ts, None if closed else time.monotonic() + self.live_ttl)
+        if entry.size > self.max_bytes:
+            return
+
+        self._remove(key)
+        self._entries[key] = entry
+        for table in tables:
+            self._keys_by_table.setdefault(table, set()).add(key)
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    async def fetch(
+        self,
+        table: Union[str, Tuple[str, ...]],
+        query: str,
+        args: Tuple,
+        end_ts: Optional[datetime],
+        run_query: Callable[[], Awaitable[List[Any]]],
+    ) -> List[Any]:
+        """
+        Return cached rows for ``query``/``args`` on ``table``, running ``run_query``
+        at most once for any number of concurrent identical requests. A query
+        joining several tables passes all of them and is invalidated by any one.
+        """
+        tables = (table,) if isinstance(table, str) else table
+        key = (tables, query, args)
+        while True:
+            rows = self._get(key)
+            if rows is not None:
+                self.hits += 1
+                return rows
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Only the request that ran the query was cancelled; take over from it
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._inflight_ends[key] = end_ts
+        try:
+            rows = await run_query()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved for the case where nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+            del self._inflight_ends[key]
+            # Rows ingested into the range while the query ran may be missing from the result
+            stale = key in self._stale_inflight
+            self._stale_inflight.discard(key)
+
+        future.set_result(rows)
+        if not stale:
+            self._put(key, tables, end_ts, rows)
+        return rows
+
+    def invalidate(self, table: str, since: datetime) -> None:
+        """
+        Drop cached results for ``table`` whose range reaches ``since`` or later.
+        """
+        since = as_utc(since)
+        for key in list(self._keys_by_table.get(table, ())):
+            entry = self._entries[key]
+            if entry.end_ts is None or as_utc(entry.end_ts) >= since:
+                self._remove(key)
+
+        for key, end_ts in self._inflight_ends.items():
+            if table in key[0] and (end_ts is None or as_utc(end_ts) >= since):
+                self._stale_inflight.add(key)
+
+
+query_cache = QueryCache()
+
+QUERY_CACHE_REQUESTS = Counter(
+    "query_cache_requests_total", "Historic query cache lookups by result", ["result"],
+    collect=lambda: {("hit",): query_cache.hits, ("miss",): query_cache.misses, ("coalesced",): query_cache.coalesced},
+)
+QUERY_CACHE_BYTES = Gauge("query_cache_bytes", "Estimated size of cached results", collect=lambda: {(): query_cache.size})
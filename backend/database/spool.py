@@ -0,0 +1,210 @@
+import os
+import time
+import fcntl
+import asyncio
+from typing import BinaryIO, List, Optional, Sequence
+from database.live_bus import WORKER_ID
+from utils.logger import get_logger
+
+logger = get_logger()
+
+SPOOL_SEGMENT_MAX_BYTES = int(float(os.getenv("SPOOL_SEGMENT_MAX_MB", "16")) * 1024 * 1024)
+# How often an idle spool looks for segments left by other workers
+SPOOL_SCAN_INTERVAL = 5
+
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".seg"
+ACK_SUFFIX = ".ack"
+
+
+def _try_lock(f) -> bool:
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+class _Replay:
+    __slots__ = ("path", "file", "lines", "position")
+
+    def __init__(self, path: str, file: BinaryIO, lines: List[bytes], position: int):
+        self.path = path
+        self.file = file
+        self.lines = lines
+        self.position = position
+
+
+class SegmentSpool:
+    """
+    Append-only on-disk spool of one table's rows, one line per row.
+
+    Rows are appended to this worker's open segment, which is flushed after every
+    append so that it survives a crash of the process, and synced to disk when it
+    is sealed. A segment is sealed once it reaches ``segment_max_bytes`` or when
+    replay starts. Sealed segments are replayed oldest first, a chunk at a time;
+    the number of lines already written to the database is kept in a sidecar file
+    so that a replay interrupted by a failure resumes where it stopped.
+
+    Workers may share ``directory``. Every segment is held under an flock by its
+    writer or its replayer, so a segment left open by a worker that died can be
+    told apart from a live one and is picked up by the others.
+    """
+
+    def __init__(self, directory: str, segment_max_bytes: int = SPOOL_SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.appended = 0
+        self.replayed = 0
+        self._active: Optional[BinaryIO] = None
+        self._active_path: Optional[str] = None
+        self._active_size = 0
+        self._replay: Optional[_Replay] = None
+        self._next_scan = 0.0
+
+    def stats(self) -> dict:
+        segments = size = 0
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith((OPEN_SUFFIX, SEALED_SUFFIX)):
+                        segments += 1
+                        size += entry.stat().st_size
+        except FileNotFoundError:
+            pass
+        replay = self._replay
+        return {
+            "segments": segments,
+            "bytes": size,
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "replaying": None if replay is None else {
+                "segment": os.path.basename(replay.path),
+                "position": replay.position,
+                "lines": len(replay.lines),
+            },
+        }
+
+    def append(self, lines: Sequence[bytes]) -> None:
+        """
+        Append encoded rows. Raises OSError if the disk write fails.
+        """
+        if self._active is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._active_path = os.path.join(self.directory, f"{time.time_ns():020d}-{WORKER_ID}{OPEN_SUFFIX}")
+            self._active = open(self._active_path, "ab")
+            fcntl.flock(self._active, fcntl.LOCK_EX)
+            self._active_size = 0
+
+        data = b"".join(line + b"\n" for line in lines)
+        self._active.write(data)
+        self._active.flush()
+        self._active_size += len(data)
+        self.appended += len(lines)
+        if self._active_size >= self.segment_max_bytes:
+            self.seal()
+
+    def seal(self) -> None:
+        """
+        Close the open segment and make it available for replay.
+        """
+        if self._active is None:
+            return
+        os.fsync(self._active.fileno())
+        os.replace(self._active_path, self._active_path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+        self._active.close()
+        self._active = self._active_path = None
+        self._active_size = 0
+
+    def _sealed_segments(self) -> List[str]:
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in names if name.endswith(SEALED_SUFFIX)]
+
+    def _seal_orphans(self) -> None:
+        """
+        Seal open segments whose writer no longer holds them.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if not name.endswith(OPEN_SUFFIX) or path == self._active_path:
+                continue
+            try:
+                with open(path, "rb") as f:
+                    if _try_lock(f):
+                        os.replace(path, path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+                        logger.info(f"Sealed orphaned spool segment {name}")
+            except FileNotFoundError:
+                pass
+
+    def _next_replay(self) -> Optional[_Replay]:
+        self._seal_orphans()
+        for path in self._sealed_segments():
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            if not _try_lock(f) or not os.path.exists(path):
+                # Another worker is replaying it, or has just finished
+                f.close()
+                continue
+            position = 0
+            try:
+                with open(path + ACK_SUFFIX) as ack:
+                    position = int(ack.read() or 0)
+            except FileNotFoundError:
+                pass
+            return _Replay(path, f, f.read().splitlines(), position)
+        return None
+
+    async def next_chunk(self, size: int) -> List[bytes]:
+        """
+        Up to ``size`` lines of the oldest segment that have not been replayed yet.
+        Call ``ack`` once they are in the database.
+        """
+        if self._replay is None:
+            if self._active is None and time.monotonic() < self._next_scan:
+                return []
+            self._next_scan = time.monotonic() + SPOOL_SCAN_INTERVAL
+            self.seal()
+            self._replay = await asyncio.to_thread(self._next_replay)
+            if self._replay is None:
+                return []
+        replay = self._replay
+        if replay.position >= len(replay.lines):
+            self.ack(0, 0)
+            return []
+        return replay.lines[replay.position:replay.position + size]
+
+    def ack(self, count: int, rows: int) -> None:
+        """
+        Record that the next ``count`` lines, holding ``rows`` valid rows, were replayed.
+        """
+        replay = self._replay
+        replay.position += count
+        self.replayed += rows
+        if replay.position < len(replay.lines):
+            with open(replay.path + ACK_SUFFIX, "w") as ack:
+                ack.write(str(replay.position))
+            return
+
+        os.remove(replay.path)
+        if os.path.exists(replay.path + ACK_SUFFIX):
+            os.remove(replay.path + ACK_SUFFIX)
+        replay.file.close()
+        self._replay = None
+        # Move on to the next segment without waiting for a scan
+        self._next_scan = 0.0
+        logger.info(f"Replayed spool segment {os.path.basename(replay.path)} ({len(replay.lines)} lines)")
+
+    def close(self) -> None:
+        self.seal()
+        if self._replay is not None:
+            self._replay.file.close()
+            self._replay = None
@@ -0,0 +1,169 @@
+import os
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from database.postgres import acquire, get_postgres
+from database.live_bus import live_bus
+from utils.logger import get_logger
+from utils.timestamps import as_utc
+
+logger = get_logger()
+
+STREAM_METADATA_FLUSH_INTERVAL = float(os.getenv("STREAM_METADATA_FLUSH_INTERVAL_MS", "5000")) / 1000
+
+UPSERT_QUERY = """
+    INSERT INTO stream_metadata (stream, vessel_id, first_ts, last_ts, row_count, last_seen)
+    VALUES ($1, $2, $3, $4, $5, $6)
+    ON CONFLICT (stream, vessel_id) DO UPDATE SET
+        first_ts = LEAST(stream_metadata.first_ts, EXCLUDED.first_ts),
+        last_ts = GREATEST(stream_metadata.last_ts, EXCLUDED.last_ts),
+        row_count = stream_metadata.row_count + EXCLUDED.row_count,
+        last_seen = GREATEST(stream_metadata.last_seen, EXCLUDED.last_seen)
+"""
+
+Key = Tuple[str, str]
+
+
+class StreamSummary:
+    __slots__ = ("first_ts", "last_ts", "rows", "last_seen")
+
+    def __init__(self, first_ts: datetime, last_ts: datetime, rows: int, last_seen: datetime):
+        self.first_ts = first_ts
+        self.last_ts = last_ts
+        self.rows = rows
+        self.last_seen = last_seen
+
+    def merge(self, other: "StreamSummary") -> None:
+        self.first_ts = min(self.first_ts, other.first_ts)
+        self.last_ts = max(self.last_ts, other.last_ts)
+        self.rows += other.rows
+        self.last_seen = max(self.last_seen, other.last_seen)
+
+    def as_dict(self) -> dict:
+        return {"first_ts": self.first_ts, "last_ts": self.last_ts, "rows": self.rows, "last_seen": self.last_seen}
+
+
+def _merge_into(summaries: Dict[Key, StreamSummary], key: Key, summary: StreamSummary) -> None:
+    current = summaries.get(key)
+    if current is None:
+        summaries[key] = StreamSummary(summary.first_ts, summary.last_ts, summary.rows, summary.last_seen)
+    else:
+        current.merge(summary)
+
+
+class StreamMetadata:
+    """
+    First and last timestamp, row count and last receipt time of every stream
+    and vessel, kept in memory so that reading them never scans a hypertable.
+
+    The MQTT handler notes when each message arrives through ``received``, so
+    that ``last_seen`` does not lag behind by the batching delay or a spool
+    replay. The batch writers report every COPY through ``record``. The summary is sent
+    over the live bus so every worker applies it, and the writing worker also
+    adds it to the deltas it upserts into ``stream_metadata`` every
+    ``flush_interval`` seconds. ``load`` reads the persisted state at startup.
+    Rows later dropped by a retention policy are still counted.
+    """
+
+    def __init__(self, flush_interval: float = STREAM_METADATA_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._summaries: Dict[Key, StreamSummary] = {}
+        self._pending: Dict[Key, StreamSummary] = {}
+        self._received: Dict[Key, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, vessel_id: str, streams: Sequence[str]) -> Dict[str, Optional[dict]]:
+        summaries = {stream: self._summaries.get((stream, vessel_id)) for stream in streams}
+        return {stream: summary.as_dict() if summary else None for stream, summary in summaries.items()}
+
+    def received(self, stream: str, vessel_id: str) -> None:
+        self._received[(stream, vessel_id)] = datetime.now(timezone.utc)
+
+    async def record(self, stream: str, records: List[Tuple]) -> None:
+        """
+        Account for rows just written; records hold the timestamp first and the vessel_id last.
+        Timestamps are kept as aware UTC, like the ones loaded from Postgres.
+        """
+        now = datetime.now(timezone.utc)
+        by_vessel: Dict[str, StreamSummary] = {}
+        for record in records:
+            timestamp, vessel_id = as_utc(record[0]), record[-1]
+            summary = by_vessel.get(vessel_id)
+            if summary is None:
+                last_seen = self._received.get((stream, vessel_id), now)
+                by_vessel[vessel_id] = StreamSummary(timestamp, timestamp, 1, last_seen)
+            else:
+                summary.first_ts = min(summary.first_ts, timestamp)
+                summary.last_ts = max(summary.last_ts, timestamp)
+                summary.rows += 1
+
+        for vessel_id, summary in by_vessel.items():
+            _merge_into(self._pending, (stream, vessel_id), summary)
+            await live_bus.publish("stream_metadata", {
+                "stream": stream,
+                "vessel_id": vessel_id,
+                "first_ts": summary.first_ts.isoformat(),
+                "last_ts": summary.last_ts.isoformat(),
+                "rows": summary.rows,
+                "last_seen": summary.last_seen.isoformat(),
+            })
+
+    async def apply(self, event: dict) -> None:
+        summary = StreamSummary(
+            as_utc(datetime.fromisoformat(event["first_ts"])),
+            as_utc(datetime.fromisoformat(event["last_ts"])),
+            event["rows"],
+            as_utc(datetime.fromisoformat(event["last_seen"])),
+        )
+        _merge_into(self._summaries, (event["stream"], event["vessel_id"]), summary)
+
+    async def load(self) -> None:
+        pool = await get_postgres()
+        async with acquire(pool) as conn:
+            rows = await conn.fetch("SELECT * FROM stream_metadata")
+        self._summaries = {
+            (row["stream"], row["vessel_id"]): StreamSummary(row["first_ts"], row["last_ts"], row["row_count"], row["last_seen"])
+            for row in rows
+        }
+        logger.info(f"Loaded stream metadata for {len(rows)} streams")
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            pool = await get_postgres()
+            async with acquire(pool) as conn:
+                await conn.executemany(UPSERT_QUERY, [
+                    (stream, vessel_id, summary.first_ts, summary.last_ts, summary.rows, summary.last_seen)
+                    for (stream, vessel_id), summary in pending.items()
+                ])
+        except Exception as e:
+            # Keep the deltas for the next attempt
+            for key, summary in pending.items():
+                _merge_into(self._pending, key, summary)
+            logger.error(f"Failed to persist stream metadata: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="stream-metadata")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+stream_metadata = StreamMetadata()
+
+live_bus.on("stream_metadata", stream_metadata.apply)
@@ -0,0 +1,95 @@
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional, Type
+from pydantic import BaseModel
+from models.battery_model import BatteryPayload
+from models.mission_model import MissionPayload
+from models.mode_model import ModePayload
+from models.obstacle_model import ObstaclePayload
+from models.position_model import PositionPayload
+from models.thrusters_input_model import ThrustersInputPayload
+from models.acceleration_model import AccelerationPayload
+
+SQL_TYPES = {datetime: "TIMESTAMPTZ", float: "FLOAT", int: "BIGINT", str: "TEXT"}
+
+
+def sql_type(annotation) -> str:
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        return "TEXT"
+    return SQL_TYPES[annotation]
+
+
+class Stream:
+    """
+    One telemetry stream, described by its payload model: the MQTT topic suffix,
+    the hypertable and the REST and WebSocket resources all share ``name``.
+
+    The table holds the model's fields, timestamp first, plus ``id``,
+    ``created_at`` and ``vessel_id``. Each field is aggregated per time bucket with
+    AVG if it is a float and with its last value otherwise, unless ``aggregates``
+    overrides it; streams with ``aggregated=False`` get no aggregates at all.
+
+    ``coupled`` streams have fields that only mean something together, such as
+    the latitude and longitude of one fix, so their downsamples keep whole rows.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model: Type[BaseModel],
+        aggregates: Optional[Dict[str, str]] = None,
+        aggregated: bool = True,
+        chunk_interval: str = "1 day",
+        coupled: bool = False,
+    ):
+        self.name = name
+        self.model = model
+        self.fields: List[str] = list(model.model_fields)
+        self.columns: List[str] = [*self.fields, "vessel_id"]
+        self.numeric_fields: List[str] = [
+            field for field, info in model.model_fields.items() if info.annotation is float
+        ]
+        self.enum_positions: List[int] = [
+            i for i, info in enumerate(model.model_fields.values())
+            if isinstance(info.annotation, type) and issubclass(info.annotation, Enum)
+        ]
+        self.chunk_interval = chunk_interval
+        self.coupled = coupled
+        self.aggregates: Dict[str, str] = {}
+        if aggregated:
+            for field in self.fields[1:]:
+                default = f"AVG({field})" if field in self.numeric_fields else f"last({field}, timestamp)"
+                self.aggregates[field] = (aggregates or {}).get(field, default)
+
+    def field_definitions(self) -> List[str]:
+        return [f"{field} {sql_type(info.annotation)}" for field, info in self.model.model_fields.items()]
+
+    def create_table_sql(self) -> str:
+        columns = ",\n".join(
+            ["id SERIAL", *(f"{definition} NOT NULL" for definition in self.field_definitions())]
+            + ["created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP", "PRIMARY KEY (id, timestamp)"]
+        )
+        return f"CREATE TABLE IF NOT EXISTS {self.name} (\n{columns}\n)"
+
+    def insert_sql(self) -> str:
+        placeholders = ", ".join(f"${i}" for i in range(1, len(self.columns) + 1))
+        return f"INSERT INTO {self.name} ({', '.join(self.columns)}) VALUES ({placeholders})"
+
+
+STREAMS: Dict[str, Stream] = {
+    stream.name: stream
+    for stream in (
+        Stream("battery", BatteryPayload),
+        Stream("mission", MissionPayload, aggregated=False),
+        Stream("mode", ModePayload),
+        # The closest obstacle of each bucket
+        Stream("obstacle", ObstaclePayload, aggregates={
+            "latitude": "first(latitude, distance)",
+            "longitude": "first(longitude, distance)",
+            "distance": "MIN(distance)",
+        }, coupled=True),
+        Stream("position", PositionPayload, coupled=True),
+        Stream("thrusters_input", ThrustersInputPayload),
+        Stream("acceleration", AccelerationPayload),
+    )
+}
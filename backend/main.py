@@ -1,26 +1,59 @@
 import os
+import asyncio
 from routes.routes import router
 from contextlib import asynccontextmanager
-from database.postgres import init_postgres, close_postgres
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from database.postgres import init_postgres, close_postgres, get_postgres, acquire
+from database.batch_writer import batch_writers, start_batch_writers, stop_batch_writers
+from database.dead_letter import dead_letters
+from database.live_bus import live_bus
+from database.stream_metadata import stream_metadata
+from database.streams import STREAMS
+from fastapi import FastAPI, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from mqtt.mqtt_handler import fast_mqtt, wait_for_mqtt_connection
+from mqtt.dispatcher import dispatcher
+from mqtt.mqtt_handler import fast_mqtt, mqtt_connected, wait_for_mqtt_connection
 from utils.logger import get_logger
-from typing import Dict
+from utils.metrics import MetricsMiddleware, render_metrics
+from typing import Optional
 from webrtc_signaling.client import Client
-from webrtc_signaling.signaling_utils import handle_signaling, send_message
-from websocket_manager.websocket_manager import websocket_managers, websocket_endpoint
+from webrtc_signaling.signaling_utils import (
+    handle_signaling, join_client, leave_client, start_signaling, stop_signaling
+)
+from websocket_manager.websocket_manager import websocket_managers, websocket_endpoint, telemetry_endpoint
 
 logger = get_logger()
 
-clients: Dict[str, Client] = {}
+READY_CHECK_TIMEOUT = 1
+
+# Set once startup has completed and cleared when shutdown begins
+started = False
+
+async def _start_database():
+    await init_postgres()
+    await stream_metadata.load()
+    await live_bus.start()
 
 @asynccontextmanager
 async def _lifespan(_app: FastAPI):
-    await init_postgres()
-    await wait_for_mqtt_connection()
+    global started
+    # Messages received while the database is still starting wait in the batch writers
+    dispatcher.start()
+    await asyncio.gather(_start_database(), wait_for_mqtt_connection())
+    start_batch_writers()
+    dead_letters.start()
+    stream_metadata.start()
+    start_signaling()
+    started = True
     yield
+    started = False
     await fast_mqtt.mqtt_shutdown()
+    await dispatcher.stop()
+    await stop_batch_writers()
+    await dead_letters.stop()
+    await stream_metadata.stop()
+    await stop_signaling()
+    await live_bus.stop()
     await close_postgres()
 
 app = FastAPI(lifespan=_lifespan)
@@ -36,6 +69,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(router, prefix="/api")
 
 @app.get("/")
@@ -46,28 +81,71 @@ async def func():
 async def health():
     return {
         "status": "healthy",
-        "mqtt_connected": fast_mqtt.client.is_connected if hasattr(fast_mqtt, 'client') else False
+        "mqtt_connected": mqtt_connected(),
+        "live_bus": live_bus.stats(),
     }
 
-@app.websocket("/ws/battery")
-async def websocket_battery_endpoint(websocket: WebSocket):
-    await websocket_endpoint(websocket, websocket_managers["battery"])
-
-@app.websocket("/ws/mission")
-async def websocket_mission_endpoint(websocket: WebSocket):
-    await websocket_endpoint(websocket, websocket_managers["mission"])
+async def _database_reachable() -> bool:
+    try:
+        async with acquire(await get_postgres()) as conn:
+            await asyncio.wait_for(conn.fetchval("SELECT 1"), READY_CHECK_TIMEOUT)
+        return True
+    except Exception:
+        return False
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until startup completes and while a dependency is unavailable"""
+    checks = {
+        "started": started,
+        "database": await _database_reachable(),
+        "mqtt": mqtt_connected(),
+    }
+    if live_bus.enabled:
+        checks["live_bus"] = live_bus.stats()["connected"]
+    status = "ready" if all(checks.values()) else "not ready"
+    return JSONResponse({"status": status, "checks": checks}, status_code=200 if status == "ready" else 503)
 
-@app.websocket("/ws/mode")
-async def websocket_mode_endpoint(websocket: WebSocket):
-    await websocket_endpoint(websocket, websocket_managers["mode"])
+@app.get("/metrics")
+async def metrics():
+    return render_metrics()
 
-@app.websocket("/ws/obstacle")
-async def websocket_obstacle_endpoint(websocket: WebSocket):
-    await websocket_endpoint(websocket, websocket_managers["obstacle"])
+@app.get("/ingestion")
+async def ingestion_status():
+    return {
+        **{name: writer.stats() for name, writer in batch_writers.items()},
+        "dead_letter": dead_letters.stats(),
+        "mqtt_workers": dispatcher.stats(),
+    }
 
-@app.websocket("/ws/position")
-async def websocket_position_endpoint(websocket: WebSocket):
-    await websocket_endpoint(websocket, websocket_managers["position"])
+def _stream_websocket_endpoint(stream: str):
+    async def endpoint(
+        websocket: WebSocket, max_hz: Optional[float] = Query(None, gt=0), vessel_id: Optional[str] = Query(None)
+    ):
+        await websocket_endpoint(websocket, websocket_managers[stream], max_hz, vessel_id)
+    return endpoint
+
+for stream_name in STREAMS:
+    app.add_api_websocket_route(
+        f"/ws/{stream_name}", _stream_websocket_endpoint(stream_name), name=f"websocket_{stream_name}_endpoint"
+    )
+
+@app.websocket("/ws/telemetry")
+async def websocket_telemetry_endpoint(
+    websocket: WebSocket,
+    streams: str = Query(""),
+    vessels: str = Query(""),
+    max_hz: Optional[float] = Query(None, gt=0),
+):
+    """
+    Multiplexed endpoint for all live streams over a single connection
+    """
+    await telemetry_endpoint(
+        websocket,
+        [stream for stream in streams.split(",") if stream],
+        max_hz,
+        [vessel for vessel in vessels.split(",") if vessel],
+    )
 
 @app.websocket("/ws/signaling")
 async def signaling_server_websocket_endpoint(websocket: WebSocket):
@@ -77,21 +155,16 @@ async def signaling_server_websocket_endpoint(websocket: WebSocket):
 
     await websocket.accept()
 
-    client = Client(websocket)
-    clients[client.id] = client
+    client = Client(websocket, worker_id=live_bus.worker_id)
+    await join_client(client)
 
     try:
         while True:
-            await handle_signaling(websocket, client, clients)
+            await handle_signaling(websocket, client)
 
     except WebSocketDisconnect:
-        logger.info(f"Client {client.id} disconnected")
+        pass
     except Exception as e:
         logger.error(f"Error in WebSocket connection for client {client.id}: {e}")
     finally:
-        if client.peer_id and client.peer_id in clients:
-            peer = clients[client.peer_id]
-            await send_message(peer, "peer-disconnected", {})
-            peer.peer_id = None
-
-        del clients[client.id]
\ No newline at end of file
+        await leave_client(client)
\ No newline at end of file
@@ -0,0 +1,158 @@
+import os
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from database.dead_letter import dead_letters
+from mqtt.message_handlers import handlers
+from utils.logger import get_logger
+from utils.metrics import Counter, Gauge
+
+logger = get_logger()
+
+MQTT_WORKERS_PER_STREAM = int(os.getenv("MQTT_WORKERS_PER_STREAM", "1"))
+MQTT_WORKER_QUEUE_SIZE = int(os.getenv("MQTT_WORKER_QUEUE_SIZE", "1000"))
+MQTT_DRAIN_TIMEOUT = float(os.getenv("MQTT_DRAIN_TIMEOUT", "10"))
+
+Handler = Callable[[BaseModel, str], Awaitable[None]]
+# topic, raw payload, validated message, vessel_id
+QueuedMessage = Tuple[str, bytes, BaseModel, str]
+
+MQTT_HANDLER_ERRORS = Counter("mqtt_handler_errors_total", "Valid MQTT messages whose handler raised", ["stream"])
+
+
+def workers_for(stream: str) -> int:
+    """
+    Worker count of ``stream``: MQTT_WORKERS_<STREAM> if set, else MQTT_WORKERS_PER_STREAM.
+    """
+    return max(1, int(os.getenv(f"MQTT_WORKERS_{stream.upper()}", MQTT_WORKERS_PER_STREAM)))
+
+
+class TopicWorker:
+    """
+    Runs the handler of one stream over its own queue, one message at a time.
+
+    ``put`` appends synchronously, so messages are handled in the order they were
+    put. When more than ``max_queue_size`` messages are waiting, ``put`` only
+    returns once the worker has caught up, which holds back the MQTT
+    acknowledgement and with it the broker.
+    """
+
+    def __init__(self, stream: str, index: int, handler: Handler, max_queue_size: int = MQTT_WORKER_QUEUE_SIZE):
+        self.stream = stream
+        self.index = index
+        self.handler = handler
+        self.max_queue_size = max_queue_size
+        self.processed = 0
+        self._queue: Deque[QueuedMessage] = deque()
+        self._ready = asyncio.Event()
+        self._space_available = asyncio.Event()
+        self._empty = asyncio.Event()
+        self._empty.set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    async def put(self, item: QueuedMessage) -> None:
+        self._queue.append(item)
+        self._empty.clear()
+        self._ready.set()
+        while len(self._queue) > self.max_queue_size:
+            self._space_available.clear()
+            await self._space_available.wait()
+
+    async def _handle(self, item: QueuedMessage) -> None:
+        topic, payload, message, vessel_id = item
+        try:
+            await self.handler(message, vessel_id)
+        except Exception as e:
+            MQTT_HANDLER_ERRORS.inc(self.stream)
+            logger.error(f"Failed to handle message on {topic}: {e}")
+            dead_letters.submit(topic, payload, f"{type(e).__name__}: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            if not self._queue:
+                self._empty.set()
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            # Stays queued while it is handled, so that draining waits for it
+            await self._handle(self._queue[0])
+            self._queue.popleft()
+            self.processed += 1
+            if len(self._queue) <= self.max_queue_size:
+                self._space_available.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"mqtt-{self.stream}-{self.index}")
+
+    async def stop(self, timeout: float) -> None:
+        """
+        Handle what is still queued, for at most ``timeout`` seconds, then stop the task.
+        """
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._empty.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[mqtt-{self.stream}-{self.index}] Dropping {len(self._queue)} queued messages at shutdown")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+class MessageDispatcher:
+    """
+    Routes validated MQTT messages to per-stream worker tasks, so that a slow
+    stream never holds up the others.
+
+    Each stream gets ``workers_for(stream)`` workers. All messages of one vessel
+    go to the same worker, which keeps the order within every topic while
+    vessels are handled concurrently.
+    """
+
+    def __init__(self, handlers: Dict[str, Handler], max_queue_size: int = MQTT_WORKER_QUEUE_SIZE):
+        self.workers: Dict[str, List[TopicWorker]] = {
+            stream: [TopicWorker(stream, i, handler, max_queue_size) for i in range(workers_for(stream))]
+            for stream, handler in handlers.items()
+        }
+
+    async def dispatch(self, stream: str, vessel_id: str, topic: str, payload: bytes, message: BaseModel) -> None:
+        """
+        Queue a message; returns once it is queued, or once its worker has room when it is backed up.
+        """
+        workers = self.workers[stream]
+        worker = workers[hash(vessel_id) % len(workers)] if len(workers) > 1 else workers[0]
+        await worker.put((topic, payload, message, vessel_id))
+
+    def stats(self) -> dict:
+        return {
+            stream: [{"depth": w.depth, "capacity": w.max_queue_size, "processed": w.processed} for w in workers]
+            for stream, workers in self.workers.items()
+        }
+
+    def start(self) -> None:
+        for workers in self.workers.values():
+            for worker in workers:
+                worker.start()
+
+    async def stop(self, timeout: float = MQTT_DRAIN_TIMEOUT) -> None:
+        await asyncio.gather(*(worker.stop(timeout) for workers in self.workers.values() for worker in workers))
+
+
+dispatcher = MessageDispatcher(handlers)
+
+MQTT_DISPATCH_QUEUE_DEPTH = Gauge(
+    "mqtt_dispatch_queue_depth", "MQTT messages waiting for their stream worker", ["stream", "worker"],
+    collect=lambda: {
+        (stream, str(worker.index)): worker.depth
+        for stream, workers in dispatcher.workers.items() for worker in workers
+    },
+)
@@ -1,50 +1,60 @@
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel
 from utils.logger import get_logger
-from database.postgres import insert_battery, insert_mission, insert_mode, insert_obstacle, insert_position, insert_thrusters_input, insert_acceleration
-from websocket_manager.websocket_manager import websocket_managers
-from models.battery_model import BatteryPayload
-from models.mission_model import MissionPayload
-from models.mode_model import ModePayload
-from models.obstacle_model import ObstaclePayload
-from models.position_model import PositionPayload
-from models.thrusters_input_model import ThrustersInputPayload
-from models.acceleration_model import AccelerationPayload
-from database.postgres import insert_acceleration
+from database.postgres import DEFAULT_VESSEL_ID
+from database.batch_writer import batch_writers
+from database.streams import STREAMS
+from websocket_manager.websocket_manager import publish_telemetry
 
 logger = get_logger()
 
+TOPIC_PREFIX = "boat"
 
-async def battery_message_handler(payload: BatteryPayload):
-    await insert_battery(payload)
-    await websocket_managers["battery"].broadcast(payload)
+# With a group name every worker joins the same MQTT shared subscription, so the
+# broker hands each message to exactly one of them
+MQTT_SHARED_GROUP = os.getenv("MQTT_SHARED_GROUP", "")
 
-async def mission_message_handler(payload: MissionPayload):
-    await insert_mission(payload)
-    await websocket_managers["mission"].broadcast(payload)
 
-async def mode_message_handler(payload: ModePayload):
-    await insert_mode(payload)
-    await websocket_managers["mode"].broadcast(payload)
+def stream_handler(stream: str) -> Callable[[BaseModel, str], Awaitable[None]]:
+    """
+    Handler for a validated payload of ``stream``: fan it out live, then queue it for the database.
+    """
+    writer = batch_writers[stream]
 
-async def obstacle_message_handler(payload: ObstaclePayload):
-    await insert_obstacle(payload)
-    await websocket_managers["obstacle"].broadcast(payload)
+    async def handle(payload: BaseModel, vessel_id: str):
+        await publish_telemetry(stream, vessel_id, payload)
+        await writer.submit(payload, vessel_id)
 
-async def position_message_handler(payload: PositionPayload):
-    await insert_position(payload)
-    await websocket_managers["position"].broadcast(payload)
+    return handle
 
-async def thrusters_input_message_handler(payload: ThrustersInputPayload):
-    await insert_thrusters_input(payload)
 
-async def acceleration_message_handler(payload: AccelerationPayload):
-    await insert_acceleration(payload)
+payload_models: Dict[str, Type[BaseModel]] = {name: stream.model for name, stream in STREAMS.items()}
 
-handlers = { 
-    "/boat/battery": battery_message_handler,
-    "/boat/mission": mission_message_handler,
-    "/boat/mode": mode_message_handler,
-    "/boat/obstacle": obstacle_message_handler,
-    "/boat/position": position_message_handler,
-    "/boat/thrusters_input": thrusters_input_message_handler,
-    "/boat/acceleration": acceleration_message_handler,
-}
\ No newline at end of file
+handlers = {name: stream_handler(name) for name in STREAMS}
+
+
+def subscription_topics() -> List[str]:
+    """
+    Per-vessel wildcard topics plus the legacy single-boat topics, as shared
+    subscriptions when MQTT_SHARED_GROUP is set.
+    """
+    share = f"$share/{MQTT_SHARED_GROUP}/" if MQTT_SHARED_GROUP else ""
+    topics = []
+    for stream in handlers:
+        topics.append(f"{share}/{TOPIC_PREFIX}/+/{stream}")
+        topics.append(f"{share}/{TOPIC_PREFIX}/{stream}")
+    return topics
+
+
+def parse_topic(topic: str) -> Optional[Tuple[str, str]]:
+    """
+    Split '/boat/{vessel_id}/{stream}' into (vessel_id, stream). The legacy
+    '/boat/{stream}' form maps to the default vessel.
+    """
+    parts = topic.strip("/").split("/")
+    if len(parts) == 2 and parts[0] == TOPIC_PREFIX:
+        return DEFAULT_VESSEL_ID, parts[1]
+    if len(parts) == 3 and parts[0] == TOPIC_PREFIX:
+        return parts[1], parts[2]
+    return None
@@ -1,10 +1,15 @@
-import asyncio
 import os
-import json
+from pydantic import ValidationError
 from fastapi_mqtt.config import MQTTConfig
 from fastapi_mqtt.fastmqtt import FastMQTT
+from gmqtt.mqtt.constants import PubRecReasonCode
 from utils.logger import get_logger
-from mqtt.message_handlers import handlers
+from utils.metrics import Counter
+from utils.retry import retry
+from database.dead_letter import dead_letters
+from database.stream_metadata import stream_metadata
+from mqtt.dispatcher import dispatcher
+from mqtt.message_handlers import handlers, parse_topic, payload_models, subscription_topics
 
 logger = get_logger()
 
@@ -13,6 +18,8 @@ mqtt_port = int(os.getenv("MQTT_PORT", "8883"))
 mqtt_username = os.getenv("MQTT_USERNAME", "")
 mqtt_password = os.getenv("MQTT_PASSWORD", "")
 mqtt_use_tls = os.getenv("MQTT_USE_TLS", "true").lower() == "true"
+# QoS 1 and 2 messages are acknowledged once they are queued for their stream worker
+mqtt_qos = int(os.getenv("MQTT_QOS", "1"))
 
 logger.info(f"Configuring MQTT connection to {mqtt_host}:{mqtt_port} (TLS: {mqtt_use_tls})")
 
@@ -25,45 +32,68 @@ mqtt_config = MQTTConfig(
     ssl=mqtt_use_tls
 )
 
-fast_mqtt = FastMQTT(config=mqtt_config)
+fast_mqtt = FastMQTT(config=mqtt_config, optimistic_acknowledgement=False)
+# fastapi_mqtt only stores the flag on the client, while gmqtt reads it from the
+# package handler. It is private, so gmqtt is pinned in requirements.txt and a
+# version that renames it fails here instead of acknowledging before queueing.
+if not hasattr(fast_mqtt.client._package_handler, "_optimistic_acknowledgement"):
+    raise RuntimeError("Installed gmqtt has no _optimistic_acknowledgement; check the pinned version")
+fast_mqtt.client._package_handler._optimistic_acknowledgement = False
+_deliver = fast_mqtt.client.on_message
+
+
+async def _deliver_and_acknowledge(client, topic, payload, qos, properties):
+    """
+    gmqtt sends the PUBACK/PUBREC with the reason code on_message returns, which
+    fastapi_mqtt's own callback does not provide. Only MQTT v5 acknowledgements
+    carry the code; under v3.1.1 gmqtt drops it and still waits for this to return.
+    """
+    await _deliver(topic, payload, qos, properties)
+    return PubRecReasonCode.SUCCESS.value
+
+
+fast_mqtt.client.on_message = _deliver_and_acknowledge
+
+MQTT_MESSAGES = Counter("mqtt_messages_total", "MQTT messages received", ["stream"])
+MQTT_DECODE_FAILURES = Counter("mqtt_decode_failures_total", "MQTT messages that failed to decode or validate", ["stream"])
+MQTT_UNROUTED = Counter("mqtt_unrouted_messages_total", "MQTT messages on topics without a handler")
 
 async def wait_for_mqtt_connection():
-    """Wait for MQTT broker to be ready"""
-    max_retries = 30
-    retry_delay = 2
-    
-    for attempt in range(max_retries):
-        try:
-            await fast_mqtt.mqtt_startup()
-            logger.info("Successfully connected to MQTT broker")
-            return
-        except Exception as e:
-            logger.warning(f"MQTT connection attempt {attempt + 1}/{max_retries} failed: {e}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(retry_delay)
-            else:
-                logger.error("Failed to connect to MQTT broker after all retries")
-                raise
+    """Wait for MQTT broker to be ready, backing off exponentially between attempts"""
+    await retry(fast_mqtt.mqtt_startup, "MQTT connection")
+    logger.info("Successfully connected to MQTT broker")
+
+
+def mqtt_connected() -> bool:
+    return fast_mqtt.client.is_connected if hasattr(fast_mqtt, 'client') else False
 
 @fast_mqtt.on_connect()
 def connect(client, flags, rc, properties):
-    for key in handlers.keys():
-        client.subscribe(key)
+    for topic in subscription_topics():
+        client.subscribe(topic, qos=mqtt_qos)
     logger.info(f"Connected: {client}, flags: {flags}, rc: {rc}, properties: {properties}")
 
 @fast_mqtt.on_message()
 async def message(client, topic, payload, qos, properties):
+    route = parse_topic(topic)
+    if route is None or route[1] not in handlers:
+        MQTT_UNROUTED.inc()
+        logger.warning(f"No handler for topic: {topic}")
+        return
+
+    vessel_id, stream = route
+    MQTT_MESSAGES.inc(stream)
     try:
-        payload = json.loads(payload.decode())
-    except Exception as e:
-        logger.error(f"Failed to decode JSON payload: {e}")
+        # Parses and validates straight from the raw bytes in one pass
+        message = payload_models[stream].model_validate_json(payload)
+    except ValidationError as e:
+        MQTT_DECODE_FAILURES.inc(stream)
+        dead_letters.submit(topic, payload, str(e))
         return
 
-    handler = handlers.get(topic)
-    if handler:
-        await handler(payload)
-    else:
-        logger.warning(f"No handler for topic: {topic}")
+    stream_metadata.received(stream, vessel_id)
+    # Handled by the stream's worker; returning acknowledges the message
+    await dispatcher.dispatch(stream, vessel_id, topic, payload, message)
 
 @fast_mqtt.subscribe("my/mqtt/topic/#")
 async def message_to_topic(client, topic, payload, qos, properties):
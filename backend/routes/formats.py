@@ -0,0 +1,120 @@
+import sys
+import json
+import struct
+from array import array
+from enum import Enum
+from typing import Any, List, Optional, Sequence, Type
+from fastapi import HTTPException, Query, Request, Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+FORMATS = ("json", "ndjson", "columnar", "binary")
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.telemetry.columnar+json"
+BINARY_MEDIA_TYPE = "application/vnd.telemetry.columnar+octet-stream"
+
+ACCEPT_FORMATS = {
+    "application/x-ndjson": "ndjson",
+    COLUMNAR_MEDIA_TYPE: "columnar",
+    BINARY_MEDIA_TYPE: "binary",
+    "application/octet-stream": "binary",
+}
+
+
+async def get_response_format(request: Request, response_format: Optional[str] = Query(None, alias="format")) -> str:
+    """
+    Pick the response encoding from ?format= or, failing that, the Accept header.
+    """
+    if response_format is not None:
+        if response_format not in FORMATS:
+            raise HTTPException(status_code=400, detail=f"Invalid format: {response_format}")
+        return response_format
+
+    for media_type in request.headers.get("accept", "").split(","):
+        response_format = ACCEPT_FORMATS.get(media_type.split(";")[0].strip())
+        if response_format:
+            return response_format
+    return "json"
+
+
+def _column_values(rows: Sequence[Any], name: str) -> list:
+    values = [row[name] for row in rows]
+    if name == "timestamp":
+        return [round(value.timestamp() * 1000) for value in values]
+    return [value.value if isinstance(value, Enum) else value for value in values]
+
+
+def _is_numeric(values: list) -> bool:
+    return all(value is None or isinstance(value, (int, float)) for value in values)
+
+
+def encode_columnar(rows: Sequence[Any], columns: List[str]) -> Response:
+    """
+    Encode rows as parallel arrays, with timestamps as epoch milliseconds.
+    """
+    body = {"rows": len(rows)}
+    for name in columns:
+        body[name] = _column_values(rows, name)
+    return Response(json.dumps(body, separators=(",", ":")), media_type=COLUMNAR_MEDIA_TYPE)
+
+
+def encode_binary(rows: Sequence[Any], columns: List[str]) -> Response:
+    """
+    Encode rows as packed little-endian float64 columns.
+
+    Layout: a uint32 header length, a JSON header describing the columns (string
+    columns are carried in the header itself), padding up to an 8-byte boundary,
+    then one float64 array of ``rows`` values per numeric column in header order.
+    Timestamps are epoch milliseconds and missing values are NaN.
+    """
+    header = {"rows": len(rows), "columns": [], "strings": {}}
+    buffers = []
+    for name in columns:
+        values = _column_values(rows, name)
+        if _is_numeric(values):
+            packed = array("d", (float("nan") if value is None else value for value in values))
+            if sys.byteorder != "little":
+                packed.byteswap()
+            header["columns"].append(name)
+            buffers.append(packed.tobytes())
+        else:
+            header["strings"][name] = values
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    header_bytes += b" " * (-(4 + len(header_bytes)) % 8)
+    body = struct.pack("<I", len(header_bytes)) + header_bytes + b"".join(buffers)
+    return Response(body, media_type=BINARY_MEDIA_TYPE)
+
+
+def encode_ndjson(rows: Sequence[Any], model: Type[BaseModel]) -> Response:
+    body = "".join(model(**dict(row)).model_dump_json() + "\n" for row in rows)
+    return Response(body, media_type="application/x-ndjson")
+
+
+def encode_rows(rows: Sequence[Any], model: Type[BaseModel], response_format: str):
+    """
+    Encode database rows in the requested format. Plain JSON returns models for
+    FastAPI to serialize; the other formats build the response directly.
+    """
+    columns = list(model.model_fields)
+    if response_format == "columnar":
+        return encode_columnar(rows, columns)
+    if response_format == "binary":
+        return encode_binary(rows, columns)
+    if response_format == "ndjson":
+        return encode_ndjson(rows, model)
+    return [model(**dict(row)) for row in rows]
+
+
+def encode_table(rows: Sequence[Any], columns: List[str], response_format: str) -> Response:
+    """
+    Encode rows that do not belong to a single model, such as a join of streams.
+    """
+    if response_format == "columnar":
+        return encode_columnar(rows, columns)
+    if response_format == "binary":
+        return encode_binary(rows, columns)
+    if response_format == "ndjson":
+        body = b"".join(to_json(dict(row)) + b"\n" for row in rows)
+        return Response(body, media_type="application/x-ndjson")
+    return Response(to_json([dict(row) for row in rows]), media_type="application/json")
@@ -1,45 +1,312 @@
+import math
+import base64
+import asyncio
 from asyncpg import Pool
-from fastapi import APIRouter, Depends, Query, HTTPException
-from typing import Optional, Type, List, Any
-from datetime import datetime
-from database.postgres import get_postgres
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional, Tuple, Type, List, Any, Union
+from datetime import datetime, timedelta, timezone
+from database.postgres import (
+    get_postgres, acquire, AGGREGATE_COLUMNS, AGGREGATE_EXPRESSIONS, DEFAULT_VESSEL_ID, continuous_aggregate_name,
+    continuous_aggregate_expressions, envelope_expressions, rollup_for,
+)
+from database.query_cache import query_cache
+from database.stream_metadata import stream_metadata
+from database.streams import STREAMS, Stream
+from routes.formats import encode_rows, encode_table, get_response_format
+from websocket_manager.recent_buffer import recent_buffers
 from pydantic import BaseModel
-from models.battery_model import BatteryPayload
-from models.mission_model import MissionPayload
-from models.mode_model import ModePayload
-from models.obstacle_model import ObstaclePayload
-from models.position_model import PositionPayload
-from models.thrusters_input_model import ThrustersInputPayload
-from models.acceleration_model import AccelerationPayload
+from pydantic_core import to_json
+from utils.timestamps import as_utc
 
 router = APIRouter()
 
-ALLOWED_TABLES = {
-    "battery", "mission", "mode", "obstacle", 
-    "position", "thrusters_input", "acceleration"
+ALLOWED_TABLES = set(STREAMS)
+
+INTERVAL_UNITS = {
+    "second": 1, "sec": 1,
+    "minute": 60, "min": 60,
+    "hour": 3600,
+    "day": 86400,
+    "week": 604800,
 }
 
+STREAM_MODELS = {name: stream.model for name, stream in STREAMS.items()}
+
+# Streams shown on the historic dashboard, returned by /history by default
+HISTORY_STREAMS = ("position", "battery", "thrusters_input", "acceleration", "mode", "obstacle")
+
+# How /resampled fills buckets without samples
+FILL_MODES = ("none", "locf", "interpolate")
+MAX_RESAMPLED_BUCKETS = 100000
+
+# Where time_bucket starts counting when no origin is given
+TIME_BUCKET_ORIGIN = datetime(2000, 1, 3, tzinfo=timezone.utc)
+
+DEFAULT_LIMIT = 10000
+STREAM_PREFETCH = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 # region utils
 
+def parse_interval(interval: str) -> timedelta:
+    """
+    Parse a bucket width such as '5 minutes' or '1 hour'.
+    """
+    parts = interval.strip().lower().split()
+    unit = parts[-1].rstrip("s") if parts else ""
+    if len(parts) != 2 or unit not in INTERVAL_UNITS:
+        raise HTTPException(status_code=400, detail=f"Invalid interval: {interval}")
+    try:
+        value = float(parts[0])
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid interval: {interval}")
+    if not math.isfinite(value) or value <= 0:
+        raise HTTPException(status_code=400, detail="interval must be positive")
+    return timedelta(seconds=value * INTERVAL_UNITS[unit])
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def fetch_cached(
+    db: Pool, table_name: Union[str, Tuple[str, ...]], query: str, args: List[Any], end_ts: Optional[datetime]
+) -> List[Any]:
+    """
+    Run a historic query through the shared result cache.
+    """
+    async def run_query():
+        async with acquire(db) as connection:
+            return await connection.fetch(query, *args)
+
+    try:
+        return await query_cache.fetch(table_name, query, tuple(args), end_ts, run_query)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+async def stream_ndjson(db: Pool, query: str, args: List[Any], model: Type[BaseModel]) -> AsyncIterator[str]:
+    """
+    Stream rows as NDJSON through a server-side cursor, one prefetch batch at a time.
+    """
+    async with acquire(db) as connection:
+        async with connection.transaction():
+            lines = []
+            async for row in connection.cursor(query, *args, prefetch=STREAM_PREFETCH):
+                lines.append(model(**dict(row)).model_dump_json())
+                if len(lines) >= STREAM_PREFETCH:
+                    yield "\n".join(lines) + "\n"
+                    lines = []
+            if lines:
+                yield "\n".join(lines) + "\n"
+
+
+def numeric_columns(model: Type[BaseModel]) -> List[str]:
+    return [name for name, field in model.model_fields.items() if field.annotation is float]
+
+
+def _ranks(orders: List[str]) -> str:
+    return ", ".join(
+        f"row_number() OVER (PARTITION BY bucket ORDER BY {order}) AS rank_{i}" for i, order in enumerate(orders)
+    )
+
+
+def downsample_query(table_name: str, model: Type[BaseModel], where: str, bucket_param: int) -> str:
+    """
+    Min/max-per-bucket downsampling (M4). From every bucket keep the first and
+    last row plus the rows holding the minimum and maximum of each numeric
+    column, so peaks survive while the result stays bounded. Buckets of width
+    ``$bucket_param`` start at ``$(bucket_param + 1)``.
+    """
+    columns = numeric_columns(model)
+    orders = ["timestamp ASC, id ASC", "timestamp DESC, id DESC"] + [
+        f"{column} {direction}" for column in columns for direction in ("ASC", "DESC")
+    ]
+    keep = " OR ".join(f"rank_{i} = 1" for i in range(len(orders)))
+    bucket = f"time_bucket(${bucket_param}, timestamp, origin => ${bucket_param + 1}::timestamptz)"
+    return f"""
+    WITH ranked AS (
+        SELECT *, {_ranks(orders)}
+        FROM (SELECT *, {bucket} AS bucket FROM {table_name}{where}) AS bucketed
+    )
+    SELECT * FROM ranked WHERE {keep}
+    ORDER BY timestamp ASC, id ASC"""
+
+
+def rollup_envelope_query(view_name: str, stream: Stream, where: str, bucket_param: int) -> Tuple[str, List[str]]:
+    """
+    Downsample read from a continuous aggregate: one row per bucket of width
+    ``$bucket_param`` starting at ``$(bucket_param + 1)``, holding the average of
+    the rollup's averages of every numeric column along with its ``{column}_min``
+    and ``{column}_max`` envelope, and the last value of the other columns.
+
+    The columns of a row come from different samples, so this is only used for
+    streams that are not ``coupled``. Returns the query and its column names.
+    """
+    aggregates = {}
+    for field in stream.fields[1:]:
+        if field in stream.numeric_fields:
+            aggregates[field] = f"AVG({field})"
+            aggregates[f"{field}_min"] = f"MIN({field}_min)"
+            aggregates[f"{field}_max"] = f"MAX({field}_max)"
+        else:
+            aggregates[field] = f"last({field}, timestamp)"
+    query = f"""
+    SELECT time_bucket(${bucket_param}, timestamp, origin => ${bucket_param + 1}::timestamptz) AS timestamp,
+        {", ".join(f"{expression} AS {column}" for column, expression in aggregates.items())}
+    FROM {view_name}{where}
+    GROUP BY 1
+    ORDER BY 1 ASC"""
+    return query, ["timestamp", *aggregates]
+
+
+def aligned_bucket(start_ts: datetime, end_ts: datetime, buckets: int) -> timedelta:
+    """
+    Narrowest bucket width that splits ``[start_ts, end_ts]`` into at most
+    ``buckets`` buckets starting at ``start_ts``. The range includes its end, so
+    it must be shorter than ``buckets`` widths: a sample at ``end_ts`` would
+    otherwise open a bucket of its own.
+    """
+    return (end_ts - start_ts) // buckets + timedelta(microseconds=1)
+
+
+def calendar_buckets(start_ts: datetime, end_ts: datetime, width: timedelta) -> int:
+    """
+    Number of buckets of ``time_bucket(width, ...)``, without origin, that ``[start_ts, end_ts]`` touches.
+    """
+    return (as_utc(end_ts) - TIME_BUCKET_ORIGIN) // width - (as_utc(start_ts) - TIME_BUCKET_ORIGIN) // width + 1
+
+
+def downsample_bucket(model: Type[BaseModel], start_ts: datetime, end_ts: datetime, max_points: int) -> timedelta:
+    """
+    Bucket width that keeps a min/max downsample of the range within max_points rows.
+    """
+    points_per_bucket = 2 + 2 * len(numeric_columns(model))
+    buckets = max_points // points_per_bucket
+    if buckets < 1:
+        raise HTTPException(
+            status_code=400, detail=f"max_points must be at least {points_per_bucket} for this stream"
+        )
+    return max(aligned_bucket(start_ts, end_ts, buckets), timedelta(milliseconds=1))
+
+
+def resample_query(streams: List[str], fill: str) -> Tuple[str, List[str]]:
+    """
+    Build one query putting every stream on the common grid of ``$1``-wide buckets
+    from ``$2`` to ``$3`` for vessel ``$4``; ``$5``, the end of the last bucket, is
+    only used when gap filling.
+
+    Each stream is aggregated with the same expressions as ``get_aggregated_data``.
+    Unless ``fill`` is 'none' empty buckets are gap-filled: 'locf' carries the last
+    value forward, seeded with the last sample before the window so that sparse
+    streams such as ``mode`` have a value from the first bucket; 'interpolate'
+    interpolates numeric columns linearly and carries the others forward.
+    Columns are named ``{stream}_{column}``.
+    """
+    ctes = [
+        "grid AS (SELECT generate_series(time_bucket($1::interval, $2::timestamptz), $3::timestamptz, $1::interval) AS timestamp)"
+    ]
+    select = ["grid.timestamp"]
+    joins = []
+    columns = ["timestamp"]
+
+    for stream in streams:
+        expressions = AGGREGATE_EXPRESSIONS[stream]
+        numeric = set(numeric_columns(STREAM_MODELS[stream]))
+        carried = [] if fill == "none" else [
+            column for column in expressions if fill == "locf" or column not in numeric
+        ]
+        if carried:
+            ctes.append(f"""previous_{stream} AS (
+            SELECT {", ".join(carried)} FROM {stream}
+            WHERE vessel_id = $4 AND timestamp < $2::timestamptz
+            ORDER BY timestamp DESC LIMIT 1
+        )""")
+
+        aggregates = []
+        for column, expression in expressions.items():
+            alias = f"{stream}_{column}"
+            previous = f"(SELECT {column} FROM previous_{stream})"
+            if column in carried:
+                aggregates.append(f"locf({expression}, prev => {previous}) AS {alias}")
+                # The stream may have no samples at all inside the window
+                select.append(f"COALESCE(s_{stream}.{alias}, {previous}) AS {alias}")
+            else:
+                aggregates.append(f"interpolate({expression}) AS {alias}" if fill == "interpolate" else f"{expression} AS {alias}")
+                select.append(f"s_{stream}.{alias}")
+            columns.append(alias)
+
+        bucket = "time_bucket($1::interval, timestamp)" if fill == "none" else \
+            "time_bucket_gapfill($1::interval, timestamp, $2::timestamptz, $5::timestamptz)"
+        ctes.append(f"""s_{stream} AS (
+            SELECT {bucket} AS timestamp, {", ".join(aggregates)}
+            FROM {stream}
+            WHERE vessel_id = $4 AND timestamp >= $2::timestamptz AND timestamp <= $3::timestamptz
+            GROUP BY 1
+        )""")
+        joins.append(f"LEFT JOIN s_{stream} ON s_{stream}.timestamp = grid.timestamp")
+
+    query = f"""
+    WITH {", ".join(ctes)}
+    SELECT {", ".join(select)}
+    FROM grid
+    {" ".join(joins)}
+    ORDER BY grid.timestamp ASC
+    """
+    return query, columns
+
+
 async def get_raw_data(
     db: Pool,
     table_name: str,
     model: Type[BaseModel],
     start_ts: Optional[datetime],
     end_ts: Optional[datetime],
-    limit: int,
-    offset: int
-) -> List[Any]:
+    limit: Optional[int],
+    offset: int,
+    after_ts: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    response_format: str = "json",
+    response: Optional[Response] = None,
+    max_points: Optional[int] = None,
+    vessel_id: str = DEFAULT_VESSEL_ID,
+) -> Union[List[Any], StreamingResponse]:
+    """
+    Fetch raw rows of one vessel ordered by (timestamp, id).
+
+    Pages can be walked with ``offset``, or with keyset pagination through
+    ``after_ts`` or the opaque ``cursor`` returned in the X-Next-Cursor header
+    whenever a page is full. With ``response_format='ndjson'`` rows are streamed
+    from a server-side cursor and ``limit`` is only applied if given; the
+    'columnar' and 'binary' formats are described in routes.formats.
+
+    ``max_points`` returns a shape-preserving downsample of at most that many rows:
+    the M4 samples of ``downsample_query``, or, once the range is long enough for a
+    continuous aggregate and the stream is not ``coupled``, the per-bucket averages
+    and min/max envelopes of ``rollup_envelope_query``.
+    """
     if table_name not in ALLOWED_TABLES:
         raise HTTPException(status_code=400, detail=f"Invalid table name: {table_name}")
     
     if start_ts and end_ts and start_ts > end_ts:
         raise HTTPException(status_code=400, detail="start_ts must be less than or equal to end_ts")
 
+    if max_points and not (start_ts and end_ts):
+        raise HTTPException(status_code=400, detail="start_ts and end_ts are required with max_points")
+
     query = f"SELECT * FROM {table_name}"
-    conditions = []
-    args = []
-    param_id = 1
+    conditions = ["vessel_id = $1"]
+    args = [vessel_id]
+    param_id = 2
 
     if start_ts:
         conditions.append(f"timestamp >= ${param_id}")
@@ -49,157 +316,315 @@ async def get_raw_data(
         conditions.append(f"timestamp <= ${param_id}")
         args.append(end_ts)
         param_id += 1
-
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
-
-    query += f" ORDER BY timestamp ASC LIMIT {limit} OFFSET {offset}"
-
-    try:
-        async with db.acquire() as connection:
-            rows = await connection.fetch(query, *args)
-            return [model(**dict(row)) for row in rows]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if after_ts:
+        conditions.append(f"timestamp > ${param_id}")
+        args.append(after_ts)
+        param_id += 1
+    if cursor:
+        cursor_ts, cursor_id = decode_cursor(cursor)
+        # Spelled out instead of a row comparison so the timestamp index is used
+        conditions.append(f"timestamp >= ${param_id} AND (timestamp > ${param_id} OR id > ${param_id + 1})")
+        args.extend([cursor_ts, cursor_id])
+        param_id += 2
+
+    where = " WHERE " + " AND ".join(conditions)
+    query += where
+
+    if max_points:
+        stream = STREAMS[table_name]
+        envelope_bucket = aligned_bucket(start_ts, end_ts, max_points)
+        # Rollup rows have no id to resume a cursor from
+        view_name = None if cursor or stream.coupled else rollup_for(table_name, envelope_bucket)
+        if view_name:
+            query, columns = rollup_envelope_query(view_name, stream, where, param_id)
+            query += f" LIMIT {min(limit or max_points, max_points)} OFFSET {offset}"
+            rows = await fetch_cached(db, table_name, query, [*args, envelope_bucket, start_ts], end_ts)
+            return encode_table(rows, columns, response_format)
+
+        query = downsample_query(table_name, model, where, param_id)
+        args.extend([downsample_bucket(model, start_ts, end_ts, max_points), start_ts])
+        param_id += 2
+        limit = min(limit, max_points) if limit is not None else max_points
+    else:
+        query += " ORDER BY timestamp ASC, id ASC"
+
+    if response_format == "ndjson":
+        if limit is not None:
+            query += f" LIMIT {limit}"
+        query += f" OFFSET {offset}"
+        return StreamingResponse(stream_ndjson(db, query, args, model), media_type="application/x-ndjson")
+
+    limit = limit if limit is not None else DEFAULT_LIMIT
+    query += f" LIMIT {limit} OFFSET {offset}"
+
+    rows = await fetch_cached(db, table_name, query, args, end_ts)
+
+    result = encode_rows(rows, model, response_format)
+    if rows and len(rows) == limit and not max_points:
+        # Headers on the injected response are dropped when a Response is returned directly
+        target = result if isinstance(result, Response) else response
+        if target is not None:
+            target.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+    return result
 
 
 async def get_aggregated_data(
     db: Pool,
     table_name: str,
     model: Type[BaseModel],
-    columns_logic: str,
     interval: str,
     start_ts: datetime,
-    end_ts: datetime
-) -> List[Any]:
+    end_ts: datetime,
+    response_format: str = "json",
+    max_points: Optional[int] = None,
+    vessel_id: str = DEFAULT_VESSEL_ID,
+) -> Union[List[Any], Response]:
+    """
+    Aggregate one vessel's rows into time buckets of ``interval``. With ``max_points`` the
+    bucket is widened as needed so that at most that many buckets are returned, counted
+    from ``start_ts`` unless a continuous aggregate's own buckets already fit, and
+    each row also carries the ``{column}_min`` and ``{column}_max`` of every numeric
+    column, so that spikes averaged away by a wide bucket still show.
+    """
     if not start_ts or not end_ts:
         raise HTTPException(status_code=400, detail="Start and End TS required for aggregation")
 
-    query = f"""
-    SELECT 
-        time_bucket($1, timestamp) AS timestamp,
-        {columns_logic}
-    FROM {table_name}
-    WHERE timestamp >= $2 AND timestamp <= $3
-    GROUP BY timestamp
-    ORDER BY timestamp ASC
-    """
-
-    try:
-        async with db.acquire() as connection:
-            rows = await connection.fetch(query, interval, start_ts, end_ts)
-            return [model(**dict(row)) for row in rows]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    bucket = parse_interval(interval)
+    if max_points:
+        bucket = max(bucket, aligned_bucket(start_ts, end_ts, max_points))
+    view_name = continuous_aggregate_name(table_name, bucket)
+    if view_name and max_points and calendar_buckets(start_ts, end_ts, bucket) > max_points:
+        # The view's buckets are not aligned to start_ts and would need one more
+        view_name = None
+    # With max_points buckets start at start_ts, so that the range needs no more than that many
+    origin = ", origin => $2::timestamptz" if max_points else ""
+    envelope = list(envelope_expressions(table_name)) if max_points else []
+    columns = [*AGGREGATE_EXPRESSIONS[table_name], *envelope]
+    expressions = continuous_aggregate_expressions(table_name)
+
+    if view_name:
+        # Real-time continuous aggregate: materialized buckets plus the raw tail
+        query = f"""
+        SELECT timestamp, {", ".join(columns)}
+        FROM {view_name}
+        WHERE vessel_id = $4 AND timestamp >= time_bucket($1, $2::timestamptz) AND timestamp <= $3
+        ORDER BY timestamp ASC
+        """
+    else:
+        query = f"""
+        SELECT 
+            time_bucket($1, timestamp{origin}) AS timestamp,
+            {", ".join(f"{expressions[column]} AS {column}" for column in columns)}
+        FROM {table_name}
+        WHERE vessel_id = $4 AND timestamp >= $2 AND timestamp <= $3
+        GROUP BY 1
+        ORDER BY 1 ASC
+        """
+
+    rows = await fetch_cached(db, table_name, query, [bucket, start_ts, end_ts, vessel_id], end_ts)
+    if envelope:
+        return encode_table(rows, ["timestamp", *columns], response_format)
+    return encode_rows(rows, model, response_format)
 
 
 # region dependencies
 
 async def common_params(
+    response: Response,
     start_ts: Optional[datetime] = Query(None),
     end_ts: Optional[datetime] = Query(None),
-    limit: int = Query(10000, le=100000),
-    offset: int = Query(0)
+    limit: Optional[int] = Query(None, ge=1, le=100000),
+    offset: int = Query(0, ge=0),
+    after_ts: Optional[datetime] = Query(None),
+    cursor: Optional[str] = Query(None),
+    max_points: Optional[int] = Query(None, ge=2, le=100000),
+    vessel_id: str = Query(DEFAULT_VESSEL_ID),
+    response_format: str = Depends(get_response_format),
 ):
-    return {"start_ts": start_ts, "end_ts": end_ts, "limit": limit, "offset": offset}
-
-
-# region routes
+    return {
+        "start_ts": start_ts, "end_ts": end_ts, "limit": limit, "offset": offset,
+        "after_ts": after_ts, "cursor": cursor, "max_points": max_points, "vessel_id": vessel_id,
+        "response_format": response_format, "response": response,
+    }
 
-@router.get("/battery", response_model=List[BatteryPayload])
-async def get_battery(params: dict = Depends(common_params), db: Pool = Depends(get_postgres)):
-    return await get_raw_data(db, "battery", BatteryPayload, **params)
 
-@router.get("/battery/aggregated", response_model=List[BatteryPayload])
-async def get_battery_aggregated(
-    start_ts: datetime, end_ts: datetime, interval: str = Query("5 minutes"), db: Pool = Depends(get_postgres)
+async def aggregated_params(
+    start_ts: datetime,
+    end_ts: datetime,
+    interval: str = Query("5 minutes"),
+    max_points: Optional[int] = Query(None, ge=1, le=100000),
+    vessel_id: str = Query(DEFAULT_VESSEL_ID),
+    response_format: str = Depends(get_response_format),
 ):
-    cols = """
-        AVG(left_battery_voltage) as left_battery_voltage,
-        AVG(right_battery_voltage) as right_battery_voltage,
-        AVG(central_battery_voltage) as central_battery_voltage
-    """
-    return await get_aggregated_data(db, "battery", BatteryPayload, cols, interval, start_ts, end_ts)
+    return {
+        "start_ts": start_ts, "end_ts": end_ts, "interval": interval, "max_points": max_points,
+        "vessel_id": vessel_id, "response_format": response_format,
+    }
 
 
-@router.get("/position", response_model=List[PositionPayload])
-async def get_position(params: dict = Depends(common_params), db: Pool = Depends(get_postgres)):
-    return await get_raw_data(db, "position", PositionPayload, **params)
+# region routes
 
-@router.get("/position/aggregated", response_model=List[PositionPayload])
-async def get_position_aggregated(
-    start_ts: datetime, end_ts: datetime, interval: str = Query("5 minutes"), db: Pool = Depends(get_postgres)
-):
-    cols = """
-        AVG(latitude) as latitude,
-        AVG(longitude) as longitude,
-        AVG(velocity) as velocity,
-        AVG(heading) as heading
+def add_stream_routes(stream: Stream) -> None:
     """
-    return await get_aggregated_data(db, "position", PositionPayload, cols, interval, start_ts, end_ts)
-
+    Register GET /{stream} for raw rows, GET /{stream}/recent for the in-memory
+    recent samples and, for aggregated streams, GET /{stream}/aggregated.
+    """
+    async def get_raw(params: dict = Depends(common_params), db: Pool = Depends(get_postgres)):
+        return await get_raw_data(db, stream.name, stream.model, **params)
 
-@router.get("/mode", response_model=List[ModePayload])
-async def get_mode(params: dict = Depends(common_params), db: Pool = Depends(get_postgres)):
-    return await get_raw_data(db, "mode", ModePayload, **params)
+    router.add_api_route(
+        f"/{stream.name}", get_raw, methods=["GET"], response_model=List[stream.model], name=f"get_{stream.name}"
+    )
 
-@router.get("/mode/aggregated", response_model=List[ModePayload])
-async def get_mode_aggregated(
-    start_ts: datetime, end_ts: datetime, interval: str = Query("5 minutes"), db: Pool = Depends(get_postgres)
-):
-    cols = "last(mode, timestamp) as mode"
-    return await get_aggregated_data(db, "mode", ModePayload, cols, interval, start_ts, end_ts)
+    async def get_recent(
+        seconds: Optional[float] = Query(None, gt=0),
+        limit: Optional[int] = Query(None, ge=1),
+        vessel_id: str = Query(DEFAULT_VESSEL_ID),
+        response_format: str = Depends(get_response_format),
+    ):
+        rows = recent_buffers[stream.name].samples(vessel_id, seconds, limit)
+        return encode_rows(rows, stream.model, response_format)
 
+    router.add_api_route(
+        f"/{stream.name}/recent", get_recent, methods=["GET"], response_model=List[stream.model],
+        name=f"get_{stream.name}_recent",
+    )
+    if not stream.aggregates:
+        return
 
-@router.get("/thrusters_input", response_model=List[ThrustersInputPayload])
-async def get_thrusters_input(params: dict = Depends(common_params), db: Pool = Depends(get_postgres)):
-    return await get_raw_data(db, "thrusters_input", ThrustersInputPayload, **params)
+    async def get_aggregated(params: dict = Depends(aggregated_params), db: Pool = Depends(get_postgres)):
+        return await get_aggregated_data(db, stream.name, stream.model, **params)
 
-@router.get("/thrusters_input/aggregated", response_model=List[ThrustersInputPayload])
-async def get_thrusters_input_aggregated(
-    start_ts: datetime, end_ts: datetime, interval: str = Query("5 minutes"), db: Pool = Depends(get_postgres)
-):
-    cols = """
-        AVG(left_thruster) as left_thruster,
-        AVG(right_thruster) as right_thruster
-    """
-    return await get_aggregated_data(db, "thrusters_input", ThrustersInputPayload, cols, interval, start_ts, end_ts)
+    router.add_api_route(
+        f"/{stream.name}/aggregated", get_aggregated, methods=["GET"], response_model=List[stream.model],
+        name=f"get_{stream.name}_aggregated",
+    )
 
 
-@router.get("/acceleration", response_model=List[AccelerationPayload])
-async def get_acceleration(params: dict = Depends(common_params), db: Pool = Depends(get_postgres)):
-    return await get_raw_data(db, "acceleration", AccelerationPayload, **params)
+for registered_stream in STREAMS.values():
+    add_stream_routes(registered_stream)
 
-@router.get("/acceleration/aggregated", response_model=List[AccelerationPayload])
-async def get_acceleration_aggregated(
-    start_ts: datetime, end_ts: datetime, interval: str = Query("5 minutes"), db: Pool = Depends(get_postgres)
-):
-    cols = "AVG(acceleration) as acceleration"
-    return await get_aggregated_data(db, "acceleration", AccelerationPayload, cols, interval, start_ts, end_ts)
 
+@router.get("/data-time-range")
+async def get_data_time_range(vessel_id: str = Query(DEFAULT_VESSEL_ID)):
+    position = stream_metadata.get(vessel_id, ["position"])["position"]
+    if position is None:
+        return {"start_time": None, "end_time": None}
+    return {"start_time": position["first_ts"], "end_time": position["last_ts"]}
 
-@router.get("/obstacle", response_model=List[ObstaclePayload])
-async def get_obstacle(params: dict = Depends(common_params), db: Pool = Depends(get_postgres)):
-    return await get_raw_data(db, "obstacle", ObstaclePayload, **params)
 
-@router.get("/obstacle/aggregated", response_model=List[ObstaclePayload])
-async def get_obstacle_aggregated(
-    start_ts: datetime, end_ts: datetime, interval: str = Query("5 minutes"), db: Pool = Depends(get_postgres)
+@router.get("/stream-metadata")
+async def get_stream_metadata(vessel_id: str = Query(DEFAULT_VESSEL_ID)):
+    """
+    First and last timestamp, row count and last receipt time of every stream,
+    or null for streams without data. Served from memory.
+    """
+    return stream_metadata.get(vessel_id, sorted(ALLOWED_TABLES))
+
+
+@router.get("/history")
+async def get_history(
+    streams: str = Query(",".join(HISTORY_STREAMS)),
+    start_ts: datetime = Query(...),
+    end_ts: datetime = Query(...),
+    interval: Optional[str] = Query(None),
+    max_points: Optional[int] = Query(None, ge=2, le=100000),
+    limit: Optional[int] = Query(None, ge=1, le=100000),
+    vessel_id: str = Query(DEFAULT_VESSEL_ID),
+    response_format: str = Depends(get_response_format),
+    db: Pool = Depends(get_postgres),
 ):
-    cols = """
-        first(latitude, distance) as latitude,
-        first(longitude, distance) as longitude,
-        MIN(distance) as distance
     """
-    return await get_aggregated_data(db, "obstacle", ObstaclePayload, cols, interval, start_ts, end_ts)
+    Fetch several streams over one time window in a single round trip.
 
+    The per-stream queries run concurrently, each through ``get_aggregated_data``
+    when an ``interval`` is given and through ``get_raw_data`` otherwise, and the
+    results are returned as one ``{stream: rows}`` object. Rows are JSON objects,
+    or parallel arrays with ``format=columnar``.
 
-@router.get("/data-time-range")
-async def get_data_time_range(db: Pool = Depends(get_postgres)):
-    query = "SELECT MIN(timestamp) AS start_time, MAX(timestamp) AS end_time FROM position"
-    try:
-        async with db.acquire() as connection:
-            row = await connection.fetchrow(query)
-            return row 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
\ No newline at end of file
+    Raw streams without ``max_points`` are paged like ``get_raw_data``; the body
+    then also holds ``next_cursors``, the cursor of every stream that filled its
+    page, from which ``/{stream}?cursor=`` carries on.
+    """
+    names = list(dict.fromkeys(stream for stream in streams.split(",") if stream))
+    unknown = [name for name in names if name not in STREAM_MODELS]
+    if not names or unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown streams: {unknown}" if unknown else "No streams requested")
+    if response_format not in ("json", "columnar"):
+        raise HTTPException(status_code=400, detail=f"Unsupported format for history: {response_format}")
+    if interval and any(name not in AGGREGATE_COLUMNS for name in names):
+        raise HTTPException(status_code=400, detail="Aggregation is not available for all requested streams")
+
+    if interval:
+        queries = [
+            get_aggregated_data(
+                db, name, STREAM_MODELS[name], interval, start_ts, end_ts, response_format, max_points, vessel_id
+            )
+            for name in names
+        ]
+    else:
+        pages = [Response() for _ in names]
+        queries = [
+            get_raw_data(
+                db, name, STREAM_MODELS[name], start_ts, end_ts, limit, 0,
+                response_format=response_format, response=page, max_points=max_points, vessel_id=vessel_id,
+            )
+            for name, page in zip(names, pages)
+        ]
+    results = await asyncio.gather(*queries)
+
+    # Each result is already encoded or a list of models; splice them into one body
+    parts = [
+        to_json(name) + b":" + (result.body if isinstance(result, Response) else to_json(result))
+        for name, result in zip(names, results)
+    ]
+    if not interval and not max_points:
+        next_cursors = {}
+        for name, result, page in zip(names, results, pages):
+            cursor = (result if isinstance(result, Response) else page).headers.get(NEXT_CURSOR_HEADER)
+            if cursor:
+                next_cursors[name] = cursor
+        parts.append(b'"next_cursors":' + to_json(next_cursors))
+    return Response(b"{" + b",".join(parts) + b"}", media_type="application/json")
+
+
+@router.get("/resampled")
+async def get_resampled(
+    streams: str = Query(...),
+    start_ts: datetime = Query(...),
+    end_ts: datetime = Query(...),
+    interval: str = Query("1 second"),
+    fill: str = Query("locf"),
+    max_points: Optional[int] = Query(None, ge=2, le=MAX_RESAMPLED_BUCKETS),
+    vessel_id: str = Query(DEFAULT_VESSEL_ID),
+    response_format: str = Depends(get_response_format),
+    db: Pool = Depends(get_postgres),
+):
+    """
+    Resample several streams onto one time grid and return a single aligned table,
+    one row per ``interval`` bucket, e.g. to correlate thruster input with
+    acceleration, velocity and battery voltage. See ``resample_query`` for ``fill``.
+    """
+    names = list(dict.fromkeys(stream for stream in streams.split(",") if stream))
+    unknown = [name for name in names if name not in AGGREGATE_EXPRESSIONS]
+    if not names or unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot resample streams: {unknown}" if unknown else "No streams requested")
+    if fill not in FILL_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid fill: {fill}")
+    if start_ts > end_ts:
+        raise HTTPException(status_code=400, detail="start_ts must be less than or equal to end_ts")
+
+    bucket = parse_interval(interval)
+    if max_points:
+        # The grid follows time_bucket's own alignment, which start_ts may fall in the middle of
+        bucket = max(bucket, aligned_bucket(start_ts, end_ts, max_points - 1))
+    if (end_ts - start_ts) / bucket > MAX_RESAMPLED_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"More than {MAX_RESAMPLED_BUCKETS} buckets, use a wider interval")
+
+    query, columns = resample_query(names, fill)
+    args = [bucket, start_ts, end_ts, vessel_id]
+    if fill != "none":
+        # Only gap filling needs the end of the last bucket
+        args.append(end_ts + bucket)
+    rows = await fetch_cached(db, tuple(names), query, args, end_ts)
+    return encode_table(rows, columns, response_format)
@@ -0,0 +1,218 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+import asyncpg
+import pytest
+from database import batch_writer as batch_writer_module
+from database.batch_writer import BatchWriter
+from database.stream_metadata import stream_metadata
+from database.streams import STREAMS
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeTable:
+    """
+    Stands in for the pool connection: keeps the rows written through either the
+    prepared INSERT or COPY, or raises ``error``.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.error = None
+
+    async def _write(self, records):
+        if self.error is not None:
+            raise self.error
+        self.rows.extend(records)
+
+    async def insert_statement(self, stream):
+        return self
+
+    async def executemany(self, records):
+        await self._write(records)
+
+    async def copy_records_to_table(self, table, records, columns):
+        await self._write(records)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeTable()
+
+    async def get_postgres():
+        return None
+
+    @asynccontextmanager
+    async def acquire(pool):
+        yield table
+
+    monkeypatch.setattr(batch_writer_module, "get_postgres", get_postgres)
+    monkeypatch.setattr(batch_writer_module, "acquire", acquire)
+    return table
+
+
+@pytest.fixture
+def writer(tmp_path, table):
+    writer = BatchWriter(STREAMS["mode"], spill_dir=str(tmp_path))
+    yield writer
+    writer.spool.close()
+
+
+def submit(writer: BatchWriter, count: int, vessel_id: str = "boat-1"):
+    for i in range(count):
+        payload = writer.model(timestamp=T0 + timedelta(seconds=i), mode="AUTO")
+        asyncio.run(writer.submit(payload, vessel_id))
+
+
+def replay_all(writer: BatchWriter):
+    writer._retry_at = 0
+    asyncio.run(writer.replay_spool())
+
+
+def test_failed_write_is_spooled_then_replayed_and_acked(writer, table):
+    submit(writer, 3)
+    table.error = ConnectionError("database is down")
+    asyncio.run(writer.flush())
+
+    assert table.rows == []
+    assert writer.spilled == 3
+
+    table.error = None
+    replay_all(writer)
+
+    assert table.rows == [(T0 + timedelta(seconds=i), "AUTO", "boat-1") for i in range(3)]
+    assert writer.spool.replayed == 3
+    assert writer.spool.stats()["segments"] == 0
+
+
+def test_replay_keeps_rows_spooled_while_the_database_is_down(writer, table):
+    submit(writer, 2)
+    table.error = ConnectionError("database is down")
+    asyncio.run(writer.flush())
+
+    replay_all(writer)
+    assert table.rows == []
+    assert writer.spool.replayed == 0
+
+    table.error = None
+    replay_all(writer)
+    assert len(table.rows) == 2
+
+
+def test_failure_after_commit_does_not_spool(writer, table, monkeypatch):
+    async def fail(stream, records):
+        raise TypeError("can't compare offset-naive and offset-aware datetimes")
+
+    monkeypatch.setattr(stream_metadata, "record", fail)
+    submit(writer, 3)
+    asyncio.run(writer.flush())
+
+    assert len(table.rows) == 3
+    assert writer.spilled == 0
+    assert writer.spool.stats()["segments"] == 0
+
+
+def test_failure_after_commit_during_replay_still_acks(writer, table, monkeypatch):
+    submit(writer, 3)
+    table.error = ConnectionError("database is down")
+    asyncio.run(writer.flush())
+
+    async def fail(stream, records):
+        raise TypeError("can't compare offset-naive and offset-aware datetimes")
+
+    monkeypatch.setattr(stream_metadata, "record", fail)
+    table.error = None
+    replay_all(writer)
+    replay_all(writer)
+
+    assert len(table.rows) == 3
+    assert writer.spool.stats()["segments"] == 0
+
+
+def test_rejected_rows_are_dead_lettered(writer, table, monkeypatch):
+    rejected = []
+    monkeypatch.setattr(batch_writer_module.dead_letters, "submit", lambda *args: rejected.append(args))
+    bad = T0 + timedelta(seconds=1)
+
+    async def write(records):
+        if any(record[0] == bad for record in records):
+            raise asyncpg.DataError("bad row")
+        table.rows.extend(records)
+
+    monkeypatch.setattr(table, "_write", write)
+    submit(writer, 3)
+    asyncio.run(writer.flush())
+
+    assert [row[0] for row in table.rows] == [T0, T0 + timedelta(seconds=2)]
+    assert len(rejected) == 1
+    assert writer.spilled == 0
+
+
+def test_records_carry_aware_utc_timestamps(writer):
+    naive = writer.model(timestamp=datetime(2026, 1, 1, 12), mode="OFF")
+    offset = writer.model(timestamp=datetime(2026, 1, 1, 14, tzinfo=timezone(timedelta(hours=2))), mode="OFF")
+
+    assert writer.to_record(naive, "boat-1")[0] == datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    assert writer.to_record(offset, "boat-1") == (datetime(2026, 1, 1, 12, tzinfo=timezone.utc), "OFF", "boat-1")
+
+
+def test_stop_lets_a_write_in_progress_finish(writer, table, monkeypatch):
+    async def slow_write(records):
+        await asyncio.sleep(0.05)
+        table.rows.extend(records)
+
+    monkeypatch.setattr(table, "_write", slow_write)
+
+    async def run():
+        writer.start()
+        await writer.submit(writer.model(timestamp=T0, mode="AUTO"), "boat-1")
+        writer._flush_requested.set()
+        # Let the loop take the batch out of the buffer and start writing it
+        await asyncio.sleep(0.01)
+        assert writer.depth == 0
+        await writer.stop()
+
+    asyncio.run(run())
+    assert len(table.rows) == 1
+
+
+def test_cancelled_flush_spools_its_batch(writer, table, monkeypatch):
+    async def hang(records):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(table, "_write", hang)
+
+    async def run():
+        await writer.submit(writer.model(timestamp=T0, mode="AUTO"), "boat-1")
+        flush = asyncio.create_task(writer.flush())
+        await asyncio.sleep(0.01)
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+
+    asyncio.run(run())
+    assert writer.spilled == 1
+
+
+def test_connection_lost_during_row_fallback_spools_only_the_rest(writer, table, monkeypatch):
+    monkeypatch.setattr(batch_writer_module.dead_letters, "submit", lambda *args: None)
+    bad, lost = T0 + timedelta(seconds=1), T0 + timedelta(seconds=2)
+
+    async def write(records):
+        if len(records) > 1 or records[0][0] == bad:
+            raise asyncpg.DataError("bad row")
+        if records[0][0] == lost:
+            raise ConnectionError("connection lost")
+        table.rows.extend(records)
+
+    monkeypatch.setattr(table, "_write", write)
+    submit(writer, 4)
+    asyncio.run(writer.flush())
+
+    assert [row[0] for row in table.rows] == [T0]
+    assert writer.spilled == 2
+
+    monkeypatch.delattr(table, "_write")
+    replay_all(writer)
+    assert [row[0] for row in table.rows] == [T0, lost, T0 + timedelta(seconds=3)]
@@ -0,0 +1,114 @@
+import asyncio
+import random
+from mqtt.dispatcher import MessageDispatcher
+
+
+class Recorder:
+    """
+    Handler that remembers, per vessel, the order it saw messages in, taking a
+    random short while on each one so that workers interleave.
+    """
+
+    def __init__(self):
+        self.seen = {}
+
+    async def __call__(self, message, vessel_id):
+        await asyncio.sleep(random.random() / 1000)
+        self.seen.setdefault(vessel_id, []).append(message)
+
+
+def dispatcher_for(monkeypatch, handler, workers: int, max_queue_size: int = 1000) -> MessageDispatcher:
+    monkeypatch.setenv("MQTT_WORKERS_TEST", str(workers))
+    return MessageDispatcher({"test": handler}, max_queue_size)
+
+
+def test_messages_of_each_vessel_keep_their_order_across_workers(monkeypatch):
+    recorder = Recorder()
+    vessels = [f"boat-{i}" for i in range(8)]
+
+    async def run():
+        dispatcher = dispatcher_for(monkeypatch, recorder, 4)
+        dispatcher.start()
+        for seq in range(50):
+            for vessel_id in vessels:
+                await dispatcher.dispatch("test", vessel_id, f"{vessel_id}/test", b"", seq)
+        await dispatcher.stop(timeout=5)
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert recorder.seen == {vessel_id: list(range(50)) for vessel_id in vessels}
+    assert sum(w["processed"] for w in dispatcher.stats()["test"]) == 400
+
+
+def test_each_vessel_is_handled_by_a_single_worker(monkeypatch):
+    workers_seen = {}
+
+    async def run():
+        dispatcher = dispatcher_for(monkeypatch, lambda message, vessel_id: asyncio.sleep(0), 4)
+        for vessel_id in [f"boat-{i}" for i in range(16)] * 3:
+            await dispatcher.dispatch("test", vessel_id, "topic", b"", None)
+        for worker in dispatcher.workers["test"]:
+            for _, _, _, vessel_id in worker._queue:
+                workers_seen.setdefault(vessel_id, set()).add(worker.index)
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert all(len(indexes) == 1 for indexes in workers_seen.values())
+    # 16 vessels over 4 workers leave none of them idle in practice
+    assert len({index for indexes in workers_seen.values() for index in indexes}) > 1
+    assert len(dispatcher.workers["test"]) == 4
+
+
+def test_dispatch_waits_while_the_worker_is_backed_up(monkeypatch):
+    release = asyncio.Event()
+
+    async def blocked(message, vessel_id):
+        await release.wait()
+
+    async def run():
+        dispatcher = dispatcher_for(monkeypatch, blocked, 1, max_queue_size=1)
+        dispatcher.start()
+        await dispatcher.dispatch("test", "boat-1", "topic", b"", 1)
+        await asyncio.sleep(0)
+        second = asyncio.create_task(dispatcher.dispatch("test", "boat-1", "topic", b"", 2))
+        await asyncio.sleep(0.01)
+        assert not second.done()
+
+        release.set()
+        await asyncio.wait_for(second, 1)
+        await dispatcher.stop(timeout=1)
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert dispatcher.stats()["test"] == [{"depth": 0, "capacity": 1, "processed": 2}]
+
+
+def test_stop_drains_queued_messages(monkeypatch):
+    recorder = Recorder()
+
+    async def run():
+        dispatcher = dispatcher_for(monkeypatch, recorder, 2)
+        for seq in range(20):
+            await dispatcher.dispatch("test", f"boat-{seq % 3}", "topic", b"", seq)
+        dispatcher.start()
+        await dispatcher.stop(timeout=5)
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert sorted(m for messages in recorder.seen.values() for m in messages) == list(range(20))
+    assert all(w["depth"] == 0 for w in dispatcher.stats()["test"])
+
+
+def test_stop_gives_up_after_the_timeout(monkeypatch):
+    async def hang(message, vessel_id):
+        await asyncio.sleep(10)
+
+    async def run():
+        dispatcher = dispatcher_for(monkeypatch, hang, 1)
+        dispatcher.start()
+        await dispatcher.dispatch("test", "boat-1", "topic", b"", 1)
+        await asyncio.wait_for(dispatcher.stop(timeout=0.05), 1)
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert dispatcher.stats()["test"][0]["processed"] == 0
@@ -0,0 +1,78 @@
+import json
+import math
+import struct
+from array import array
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from routes.formats import BINARY_MEDIA_TYPE, COLUMNAR_MEDIA_TYPE, encode_binary, encode_columnar
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+T0_MS = 1767225600000
+
+
+class Mode(Enum):
+    AUTO = "AUTO"
+
+
+ROWS = [
+    {"timestamp": T0, "voltage": 12.5, "cycles": 3, "mode": Mode.AUTO},
+    {"timestamp": T0 + timedelta(milliseconds=1500), "voltage": None, "cycles": 4, "mode": None},
+]
+COLUMNS = ["timestamp", "voltage", "cycles", "mode"]
+
+
+def decode_binary(body: bytes):
+    (header_length,) = struct.unpack_from("<I", body)
+    header = json.loads(body[4:4 + header_length])
+    offset = 4 + header_length
+    columns = {}
+    for name in header["columns"]:
+        values = array("d")
+        values.frombytes(body[offset:offset + 8 * header["rows"]])
+        columns[name] = list(values)
+        offset += 8 * header["rows"]
+    assert offset == len(body)
+    return header_length, header, columns
+
+
+def test_columnar_round_trip():
+    response = encode_columnar(ROWS, COLUMNS)
+
+    assert response.media_type == COLUMNAR_MEDIA_TYPE
+    assert json.loads(response.body) == {
+        "rows": 2,
+        "timestamp": [T0_MS, T0_MS + 1500],
+        "voltage": [12.5, None],
+        "cycles": [3, 4],
+        "mode": ["AUTO", None],
+    }
+
+
+def test_binary_round_trip():
+    response = encode_binary(ROWS, COLUMNS)
+    _, header, columns = decode_binary(response.body)
+
+    assert response.media_type == BINARY_MEDIA_TYPE
+    assert header["rows"] == 2
+    assert header["columns"] == ["timestamp", "voltage", "cycles"]
+    assert header["strings"] == {"mode": ["AUTO", None]}
+    assert columns["timestamp"] == [T0_MS, T0_MS + 1500]
+    assert columns["voltage"][0] == 12.5 and math.isnan(columns["voltage"][1])
+    assert columns["cycles"] == [3.0, 4.0]
+
+
+def test_binary_columns_start_on_an_8_byte_boundary():
+    for count in range(1, 9):
+        rows = [{"timestamp": T0, "name": "x" * count}] * count
+        header_length, header, _ = decode_binary(encode_binary(rows, ["timestamp", "name"]).body)
+
+        assert (4 + header_length) % 8 == 0
+        assert header["strings"]["name"] == ["x" * count] * count
+
+
+def test_empty_results_encode_to_empty_columns():
+    assert json.loads(encode_columnar([], COLUMNS).body) == {"rows": 0, **{name: [] for name in COLUMNS}}
+
+    _, header, columns = decode_binary(encode_binary([], COLUMNS).body)
+    assert header["rows"] == 0
+    assert all(values == [] for values in columns.values())
@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from database.query_cache import QueryCache, _estimate_size
+
+OLD = datetime(2026, 1, 1, tzinfo=timezone.utc)
+ROWS = [{"timestamp": OLD, "value": 1.0}]
+
+
+def fetch(cache: QueryCache, table, args, end_ts=OLD, rows=ROWS, calls=None):
+    async def run_query():
+        if calls is not None:
+            calls.append(args)
+        return rows
+
+    return asyncio.run(cache.fetch(table, "SELECT", args, end_ts, run_query))
+
+
+def test_least_recently_used_entries_are_evicted_past_the_byte_budget():
+    cache = QueryCache(max_bytes=2 * _estimate_size(ROWS))
+    calls = []
+    fetch(cache, "battery", (1,), calls=calls)
+    fetch(cache, "battery", (2,), calls=calls)
+    fetch(cache, "battery", (1,), calls=calls)
+    fetch(cache, "battery", (3,), calls=calls)
+
+    assert cache.size <= cache.max_bytes
+    fetch(cache, "battery", (1,), calls=calls)
+    fetch(cache, "battery", (2,), calls=calls)
+    assert calls == [(1,), (2,), (3,), (2,)]
+
+
+def test_results_larger_than_the_budget_are_not_cached():
+    cache = QueryCache(max_bytes=_estimate_size(ROWS) - 1)
+    fetch(cache, "battery", (1,))
+    assert cache.stats()["entries"] == 0
+
+
+def test_results_at_the_live_edge_expire():
+    cache = QueryCache(live_ttl=0)
+    calls = []
+    now = datetime.now(timezone.utc)
+    fetch(cache, "battery", (1,), end_ts=now, calls=calls)
+    fetch(cache, "battery", (1,), end_ts=now, calls=calls)
+    # Settled ranges are kept regardless of the TTL
+    fetch(cache, "battery", (2,), calls=calls)
+    fetch(cache, "battery", (2,), calls=calls)
+
+    assert calls == [(1,), (1,), (2,)]
+
+
+def test_invalidate_drops_entries_of_that_table_reaching_the_write():
+    cache = QueryCache()
+    fetch(cache, "battery", ("early",), end_ts=OLD)
+    fetch(cache, "battery", ("late",), end_ts=OLD + timedelta(hours=1))
+    fetch(cache, "battery", ("open",), end_ts=None)
+    fetch(cache, ("battery", "position"), ("joined",), end_ts=OLD + timedelta(hours=1))
+    fetch(cache, "position", ("other",), end_ts=OLD + timedelta(hours=1))
+
+    cache.invalidate("battery", OLD + timedelta(minutes=30))
+
+    assert {key[2][0] for key in cache._entries} == {"early", "other"}
+    cache.invalidate("position", OLD)
+    assert {key[2][0] for key in cache._entries} == {"early"}
+
+
+def test_result_is_not_cached_when_its_range_was_written_during_the_query():
+    cache = QueryCache()
+    calls = []
+
+    async def run_query():
+        calls.append(1)
+        cache.invalidate("battery", OLD - timedelta(minutes=1))
+        return ROWS
+
+    assert asyncio.run(cache.fetch("battery", "SELECT", (), OLD, run_query)) == ROWS
+    assert cache.stats()["entries"] == 0
+
+
+def test_concurrent_identical_requests_share_one_query():
+    cache = QueryCache()
+    calls = []
+
+    async def run_query():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ROWS
+
+    async def run():
+        return await asyncio.gather(*(cache.fetch("battery", "SELECT", (), OLD, run_query) for _ in range(3)))
+
+    assert asyncio.run(run()) == [ROWS] * 3
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 2
+
+
+def test_waiter_runs_the_query_itself_when_the_leader_is_cancelled():
+    cache = QueryCache()
+    calls = []
+
+    async def run_query():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ROWS
+
+    async def run():
+        leader = asyncio.create_task(cache.fetch("battery", "SELECT", (), OLD, run_query))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.fetch("battery", "SELECT", (), OLD, run_query))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(run()) == ROWS
+    assert len(calls) == 2
+
+
+def test_waiters_see_the_query_error():
+    cache = QueryCache()
+
+    async def run_query():
+        await asyncio.sleep(0.01)
+        raise ConnectionError("database is down")
+
+    async def run():
+        return await asyncio.gather(
+            *(cache.fetch("battery", "SELECT", (), OLD, run_query) for _ in range(2)), return_exceptions=True
+        )
+
+    assert [type(e) for e in asyncio.run(run())] == [ConnectionError, ConnectionError]
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,18 @@
+import json
+from datetime import datetime, timedelta, timezone
+from database.streams import STREAMS
+from websocket_manager.recent_buffer import RecentBuffer
+
+T0 = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+
+
+def test_naive_timestamps_are_read_as_utc():
+    buffer = RecentBuffer(STREAMS["mode"])
+    model = STREAMS["mode"].model
+    buffer.append_payload("boat-1", model(timestamp=datetime(2026, 1, 1, 12), mode="AUTO"))
+    buffer.append_payload("boat-1", model(timestamp=datetime(2026, 1, 1, 14, 0, 1, tzinfo=timezone(timedelta(hours=2))), mode="OFF"))
+    buffer.append_message("boat-1", json.dumps({"timestamp": "2026-01-01T12:00:02", "mode": "AUTO"}))
+
+    assert [sample["timestamp"] for sample in buffer.samples("boat-1")] == [
+        T0, T0 + timedelta(seconds=1), T0 + timedelta(seconds=2),
+    ]
@@ -0,0 +1,179 @@
+import asyncio
+import re
+from datetime import datetime, timedelta, timezone
+import pytest
+from database import postgres
+from routes import routes
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def placeholders(query: str) -> int:
+    return max((int(n) for n in re.findall(r"\$(\d+)", query)), default=0)
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    """
+    The (query, args) of every query the routes run, each answered with no rows.
+    """
+    calls = []
+
+    async def fetch_cached(db, tables, query, args, end_ts):
+        calls.append((query, args))
+        return []
+
+    monkeypatch.setattr(routes, "fetch_cached", fetch_cached)
+    return calls
+
+
+@pytest.mark.parametrize("interval, expected", [
+    ("5 minutes", timedelta(minutes=5)),
+    (" 1 Hour ", timedelta(hours=1)),
+    ("0.5 sec", timedelta(milliseconds=500)),
+    ("2 weeks", timedelta(weeks=2)),
+])
+def test_parse_interval(interval, expected):
+    assert routes.parse_interval(interval) == expected
+
+
+@pytest.mark.parametrize("interval", ["", "5", "5 fortnights", "five minutes", "0 seconds", "-1 hour", "nan hours", "inf days"])
+def test_parse_interval_rejects_invalid_widths(interval):
+    with pytest.raises(routes.HTTPException) as error:
+        routes.parse_interval(interval)
+    assert error.value.status_code == 400
+
+
+def test_cursor_round_trip():
+    timestamp = T0 + timedelta(microseconds=123)
+    assert routes.decode_cursor(routes.encode_cursor(timestamp, 42)) == (timestamp, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", routes.encode_cursor(T0, 1)[:-4], "MjAyNg=="])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(routes.HTTPException) as error:
+        routes.decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("fill", routes.FILL_MODES)
+def test_resampled_binds_every_placeholder(fetched, fill):
+    asyncio.run(routes.get_resampled(
+        streams="position,mode", start_ts=T0, end_ts=T0 + timedelta(minutes=5), interval="1 second",
+        fill=fill, max_points=None, vessel_id="boat-1", response_format="json", db=None,
+    ))
+
+    [(query, args)] = fetched
+    assert placeholders(query) == len(args)
+
+
+def origin_buckets(start_ts, end_ts, width):
+    """
+    Buckets of ``time_bucket(width, timestamp, origin => start_ts)`` that [start_ts, end_ts] touches.
+    """
+    return (end_ts - start_ts) // width + 1
+
+
+@pytest.mark.parametrize("span", [timedelta(hours=1), timedelta(days=3, seconds=7), timedelta(microseconds=999)])
+@pytest.mark.parametrize("buckets", [1, 7, 2000])
+def test_aligned_bucket_fits_the_range(span, buckets):
+    width = routes.aligned_bucket(T0, T0 + span, buckets)
+
+    assert origin_buckets(T0, T0 + span, width) <= buckets
+    # And it is not wider than it needs to be
+    narrower = width - timedelta(microseconds=1)
+    assert not narrower or origin_buckets(T0, T0 + span, narrower) > buckets
+
+
+def test_calendar_buckets_counts_default_aligned_buckets():
+    start = T0 + timedelta(seconds=30)
+
+    assert routes.calendar_buckets(start, start + timedelta(minutes=1), timedelta(minutes=1)) == 2
+    assert routes.calendar_buckets(T0, T0 + timedelta(seconds=59), timedelta(minutes=1)) == 1
+
+
+@pytest.mark.parametrize("max_points", [12, 100, 2000])
+def test_downsample_stays_within_max_points(max_points):
+    model = routes.STREAM_MODELS["position"]
+    points_per_bucket = 2 + 2 * len(routes.numeric_columns(model))
+    end = T0 + timedelta(days=1)
+    width = routes.downsample_bucket(model, T0, end, max_points)
+
+    assert origin_buckets(T0, end, width) * points_per_bucket <= max_points
+
+
+def test_downsample_rejects_too_few_points():
+    with pytest.raises(routes.HTTPException) as error:
+        routes.downsample_bucket(routes.STREAM_MODELS["position"], T0, T0 + timedelta(days=1), 9)
+    assert error.value.status_code == 400
+
+
+@pytest.fixture
+def rollups(monkeypatch):
+    views = {f"{name}_{suffix}" for name in routes.AGGREGATE_EXPRESSIONS for suffix in ("1m", "5m", "15m")}
+    monkeypatch.setattr(postgres, "continuous_aggregates", views)
+
+
+def raw_downsample(stream, span, max_points=2000):
+    return asyncio.run(routes.get_raw_data(
+        None, stream, routes.STREAM_MODELS[stream], T0, T0 + span, None, 0, max_points=max_points,
+    ))
+
+
+def test_long_ranges_of_coupled_streams_keep_raw_rows(fetched, rollups):
+    raw_downsample("position", timedelta(days=30))
+
+    [(query, args)] = fetched
+    assert "FROM position WHERE" in query and "_min" not in query
+    assert placeholders(query) == len(args)
+
+
+def test_long_ranges_read_envelopes_from_rollups(fetched, rollups):
+    raw_downsample("battery", timedelta(days=30))
+
+    [(query, args)] = fetched
+    assert "FROM battery_15m" in query
+    assert "MIN(left_battery_voltage_min) AS left_battery_voltage_min" in query
+    assert "CASE" not in query
+    assert placeholders(query) == len(args)
+    assert origin_buckets(T0, T0 + timedelta(days=30), args[-2]) <= 2000
+
+
+def test_short_ranges_use_raw_rows(fetched, rollups):
+    raw_downsample("battery", timedelta(hours=2))
+
+    [(query, _)] = fetched
+    assert "FROM battery WHERE" in query
+
+
+@pytest.mark.parametrize("interval, offset, span, view", [
+    ("1 minute", timedelta(seconds=30), timedelta(days=2, minutes=30), False),
+    ("15 minutes", timedelta(minutes=1), timedelta(hours=14), True),
+    # The view's buckets would need one more than max_points
+    ("15 minutes", timedelta(minutes=14), timedelta(hours=14, minutes=59), False),
+])
+def test_aggregated_stays_within_max_points(fetched, rollups, interval, offset, span, view):
+    asyncio.run(routes.get_aggregated_data(
+        None, "acceleration", routes.STREAM_MODELS["acceleration"], interval, T0 + offset, T0 + offset + span,
+        max_points=60,
+    ))
+
+    [(query, args)] = fetched
+    width, start, end = args[:3]
+    assert ("FROM acceleration_15m" in query) == view
+    if view:
+        assert routes.calendar_buckets(start, end, width) <= 60
+    else:
+        assert "origin =>" in query
+        assert origin_buckets(start, end, width) <= 60
+
+
+def test_resampled_stays_within_max_points(fetched):
+    start = T0 + timedelta(seconds=30)
+    asyncio.run(routes.get_resampled(
+        streams="acceleration", start_ts=start, end_ts=start + timedelta(hours=1), interval="1 second",
+        fill="none", max_points=10, vessel_id="boat-1", response_format="json", db=None,
+    ))
+
+    [(_, args)] = fetched
+    assert routes.calendar_buckets(start, start + timedelta(hours=1), args[0]) <= 10
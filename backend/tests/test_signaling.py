@@ -0,0 +1,135 @@
+import asyncio
+import json
+import pytest
+from webrtc_signaling import signaling_utils
+from webrtc_signaling.client import Client
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+    def events(self):
+        return [(message["event"], message["data"]) for message in self.sent]
+
+
+@pytest.fixture(autouse=True)
+def registry():
+    yield
+    signaling_utils.clients.clear()
+    signaling_utils.local_clients.clear()
+    signaling_utils.waiting.clear()
+
+
+def join(client_id: str) -> FakeWebSocket:
+    websocket = FakeWebSocket()
+    signaling_utils.local_clients[client_id] = Client(websocket, client_id, "worker-1")
+    apply({"op": "join", "id": client_id, "worker_id": "worker-1"})
+    return websocket
+
+
+def send(client_id: str, event: str, data: dict):
+    apply({"op": "message", "id": client_id, "message": {"event": event, "data": data}})
+
+
+def identify(client_id: str, client_type: str, **data) -> FakeWebSocket:
+    websocket = join(client_id)
+    send(client_id, "identify", {"type": client_type, **data})
+    return websocket
+
+
+def apply(event: dict):
+    asyncio.run(signaling_utils.apply_signaling_event(event))
+
+
+def peers(client_id: str):
+    return list(signaling_utils.clients[client_id].peers)
+
+
+def test_receiver_is_paired_with_the_longest_waiting_sender():
+    identify("s1", "sender")
+    identify("s2", "sender")
+    receiver = identify("r1", "receiver")
+
+    assert receiver.events() == [("paired", {"peerId": "s1", "role": "receiver"})]
+    assert peers("s1") == ["r1"]
+    assert peers("s2") == []
+    assert list(signaling_utils.waiting) == [("default", "sender")]
+
+
+def test_clients_are_only_paired_within_their_room():
+    identify("s1", "sender", room="camera-1")
+    identify("r1", "receiver", room="camera-2")
+    assert peers("s1") == [] and peers("r1") == []
+
+    identify("r2", "receiver", room="camera-1")
+    assert peers("s1") == ["r2"]
+
+
+def test_sender_serves_up_to_max_receivers_tagged_with_peer_ids():
+    sender = identify("s1", "sender", maxReceivers=2)
+    first = identify("r1", "receiver")
+    identify("r2", "receiver")
+    identify("r3", "receiver")
+
+    assert peers("s1") == ["r1", "r2"]
+    assert peers("r3") == []
+
+    send("r1", "answer", {"sdp": "a"})
+    send("s1", "offer", {"sdp": "o", "peerId": "r1"})
+    assert sender.events()[-1] == ("answer", {"sdp": "a", "peerId": "r1"})
+    # Messages to a receiver are passed on as the sender wrote them
+    assert first.events()[-1] == ("offer", {"sdp": "o", "peerId": "r1"})
+
+
+def test_max_receivers_is_capped(monkeypatch):
+    monkeypatch.setattr(signaling_utils, "SIGNALING_MAX_RECEIVERS", 3)
+    identify("s1", "sender", maxReceivers=100)
+    identify("s2", "sender", maxReceivers="many")
+
+    assert signaling_utils.clients["s1"].max_peers == 3
+    assert signaling_utils.clients["s2"].max_peers == 1
+
+
+def test_receiver_moves_to_another_sender_when_its_sender_leaves():
+    identify("s1", "sender")
+    receiver = identify("r1", "receiver")
+    identify("s2", "sender")
+
+    apply({"op": "leave", "id": "s1"})
+
+    assert receiver.events()[1:] == [
+        ("peer-disconnected", {}),
+        ("paired", {"peerId": "s2", "role": "receiver"}),
+    ]
+    assert peers("s2") == ["r1"]
+    assert "s1" not in signaling_utils.clients
+
+
+def test_reidentifying_releases_the_previous_peer():
+    identify("s1", "sender")
+    identify("r1", "receiver")
+
+    send("r1", "identify", {"type": "receiver", "room": "camera-2"})
+
+    assert peers("s1") == []
+    assert signaling_utils.find_unpaired_client("sender", "default") is signaling_utils.clients["s1"]
+    assert signaling_utils.find_unpaired_client("receiver", "camera-2") is signaling_utils.clients["r1"]
+
+
+def test_registry_snapshot_restores_pairs_and_queue_order():
+    identify("s1", "sender", maxReceivers=2)
+    identify("r1", "receiver")
+    identify("s2", "sender")
+    identify("s3", "sender")
+    snapshot = json.loads(json.dumps(signaling_utils.registry_snapshot()))
+
+    signaling_utils.local_clients.clear()
+    signaling_utils.restore_registry(snapshot)
+
+    assert signaling_utils.registry_snapshot() == snapshot
+    assert list(signaling_utils.waiting[("default", "sender")]) == ["s1", "s2", "s3"]
+    assert peers("r1") == ["s1"]
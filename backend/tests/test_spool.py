@@ -0,0 +1,40 @@
+import asyncio
+from database.spool import SegmentSpool
+
+
+def lines(spool: SegmentSpool, size: int = 100):
+    return asyncio.run(spool.next_chunk(size))
+
+
+def test_chunks_are_replayed_in_order_and_removed_once_acked(tmp_path):
+    spool = SegmentSpool(str(tmp_path))
+    spool.append([b"1", b"2", b"3"])
+
+    assert lines(spool, 2) == [b"1", b"2"]
+    spool.ack(2, 2)
+    assert lines(spool, 2) == [b"3"]
+    spool.ack(1, 1)
+
+    assert lines(spool) == []
+    assert spool.stats()["segments"] == 0
+    assert spool.replayed == 3
+
+
+def test_unacked_chunk_is_handed_out_again(tmp_path):
+    spool = SegmentSpool(str(tmp_path))
+    spool.append([b"1", b"2"])
+
+    assert lines(spool) == [b"1", b"2"]
+    # The write failed, so nothing is acked
+    assert lines(spool) == [b"1", b"2"]
+
+
+def test_replay_resumes_after_a_restart(tmp_path):
+    spool = SegmentSpool(str(tmp_path))
+    spool.append([b"1", b"2", b"3"])
+    assert lines(spool, 1) == [b"1"]
+    spool.ack(1, 1)
+    spool.close()
+
+    restarted = SegmentSpool(str(tmp_path))
+    assert lines(restarted) == [b"2", b"3"]
@@ -0,0 +1,44 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from database import stream_metadata as stream_metadata_module
+from database.stream_metadata import StreamMetadata
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def published(monkeypatch):
+    events = []
+
+    async def publish(channel, event):
+        events.append(event)
+
+    monkeypatch.setattr(stream_metadata_module.live_bus, "publish", publish)
+    return events
+
+
+def test_last_seen_is_the_receipt_time_not_the_write_time(published):
+    metadata = StreamMetadata()
+    metadata.received("mode", "boat-1")
+    received_at = metadata._received[("mode", "boat-1")]
+
+    async def write_later():
+        await asyncio.sleep(0.01)
+        await metadata.record("mode", [(T0, "AUTO", "boat-1"), (T0 + timedelta(seconds=1), "OFF", "boat-1")])
+
+    asyncio.run(write_later())
+    asyncio.run(metadata.apply(published[0]))
+
+    assert metadata.get("boat-1", ["mode"])["mode"] == {
+        "first_ts": T0, "last_ts": T0 + timedelta(seconds=1), "rows": 2, "last_seen": received_at,
+    }
+
+
+def test_last_seen_falls_back_to_the_write_time(published):
+    metadata = StreamMetadata()
+    before = datetime.now(timezone.utc)
+    asyncio.run(metadata.record("mode", [(T0, "AUTO", "boat-2")]))
+
+    assert published[0]["vessel_id"] == "boat-2"
+    assert datetime.fromisoformat(published[0]["last_seen"]) >= before
@@ -0,0 +1,51 @@
+import asyncio
+import json
+import pytest
+from websocket_manager.websocket_manager import ALL_VESSELS, Subscriber, handle_telemetry_message, websocket_managers
+
+
+@pytest.fixture
+def subscriber():
+    subscriber = Subscriber(object(), tagged=True)
+    yield subscriber
+    for manager, vessel_id in list(subscriber.rooms):
+        manager.remove(subscriber, vessel_id)
+
+
+def request(subscriber: Subscriber, event: str, **data) -> dict:
+    """
+    Handle one request and return the data of the 'subscribed' reply.
+    """
+    handle_telemetry_message(subscriber, {"event": event, "data": data})
+    frame = None
+    while not subscriber._queue.empty():
+        frame = subscriber._queue.get_nowait()
+    reply = json.loads(frame)
+    assert reply["event"] == "subscribed"
+    return reply["data"]
+
+
+def subscriptions(subscriber: Subscriber):
+    return sorted((manager.name, vessel_id) for manager, vessel_id in subscriber.rooms)
+
+
+def test_unsubscribe_without_vessels_leaves_every_room_of_the_stream(subscriber):
+    async def run():
+        request(subscriber, "subscribe", streams=["battery", "mode"], vessels=["boat-1", "boat-2"])
+        request(subscriber, "subscribe", streams=["battery"])
+        return request(subscriber, "unsubscribe", streams=["battery"])
+
+    reply = asyncio.run(run())
+    assert subscriptions(subscriber) == [("mode", "boat-1"), ("mode", "boat-2")]
+    assert reply["streams"] == ["mode"]
+    assert not websocket_managers["battery"].has_subscribers("boat-1")
+
+
+def test_unsubscribe_with_vessels_leaves_only_those_rooms(subscriber):
+    async def run():
+        request(subscriber, "subscribe", streams=["battery"], vessels=["boat-1", "boat-2"])
+        request(subscriber, "subscribe", streams=["battery"])
+        request(subscriber, "unsubscribe", streams=["battery"], vessels=["boat-1", ALL_VESSELS])
+
+    asyncio.run(run())
+    assert subscriptions(subscriber) == [("battery", "boat-2")]
@@ -0,0 +1,48 @@
+import os
+import random
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+from utils.logger import get_logger
+
+logger = get_logger()
+
+STARTUP_RETRY_ATTEMPTS = int(os.getenv("STARTUP_RETRY_ATTEMPTS", "12"))
+STARTUP_RETRY_INITIAL_DELAY = float(os.getenv("STARTUP_RETRY_INITIAL_DELAY", "0.25"))
+STARTUP_RETRY_MAX_DELAY = float(os.getenv("STARTUP_RETRY_MAX_DELAY", "10"))
+
+T = TypeVar("T")
+
+
+def backoff_delay(
+    attempt: int, initial_delay: float = STARTUP_RETRY_INITIAL_DELAY, max_delay: float = STARTUP_RETRY_MAX_DELAY
+) -> float:
+    """
+    Seconds to wait after the failed ``attempt`` (0-based): doubling from
+    ``initial_delay`` up to ``max_delay``, with jitter so that workers started
+    together do not retry in lockstep.
+    """
+    delay = min(max_delay, initial_delay * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+async def retry(
+    operation: Callable[[], Awaitable[T]],
+    description: str,
+    attempts: int = STARTUP_RETRY_ATTEMPTS,
+    initial_delay: float = STARTUP_RETRY_INITIAL_DELAY,
+    max_delay: float = STARTUP_RETRY_MAX_DELAY,
+) -> T:
+    """
+    Run ``operation`` until it succeeds, backing off exponentially between
+    attempts. The last failure is raised once ``attempts`` are used up.
+    """
+    for attempt in range(attempts):
+        try:
+            return await operation()
+        except Exception as e:
+            if attempt == attempts - 1:
+                logger.error(f"{description} failed after {attempts} attempts")
+                raise
+            delay = backoff_delay(attempt, initial_delay, max_delay)
+            logger.warning(f"{description} attempt {attempt + 1}/{attempts} failed, retrying in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
@@ -0,0 +1,8 @@
+from datetime import datetime, timezone
+
+
+def as_utc(ts: datetime) -> datetime:
+    """
+    ``ts`` as an aware UTC datetime; naive timestamps are taken to be UTC already.
+    """
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
@@ -1,9 +1,19 @@
+import uuid
 from fastapi import WebSocket
-from typing import Optional
+from typing import Dict, Optional
 
 class Client:
-    def __init__(self, websocket: WebSocket):
-        self.websocket = websocket
+    def __init__(self, websocket: Optional[WebSocket], client_id: Optional[str] = None, worker_id: Optional[str] = None):
+        self.websocket = websocket # None for clients connected to another worker
+        self.worker_id = worker_id
         self.type: Optional[str] = None # 'sender' or 'receiver'
-        self.peer_id: Optional[str] = None
-        self.id: str = str(id(websocket))
\ No newline at end of file
+        self.room: Optional[str] = None # e.g. one vessel camera, set by 'identify'
+        # The receivers of a sender, or the sender of a receiver. A dict rather than a
+        # set so that every worker walks it in the same order.
+        self.peers: Dict[str, None] = {}
+        self.max_peers = 1 # a sender may serve several receivers
+        self.id: str = client_id or uuid.uuid4().hex
+
+    @property
+    def available(self) -> bool:
+        return len(self.peers) < self.max_peers
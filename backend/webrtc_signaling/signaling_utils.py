@@ -1,30 +1,66 @@
+import os
 import json
-from typing import Dict, Optional
+import asyncio
+from typing import Dict, List, Optional, Tuple
 from webrtc_signaling.client import Client
 from fastapi import WebSocket, WebSocketDisconnect
+from database.live_bus import live_bus
 from utils.logger import get_logger
 
 logger = get_logger()
 
+SIGNALING_REAP_INTERVAL = float(os.getenv("SIGNALING_REAP_INTERVAL", "10"))
+# Upper bound on the 'maxReceivers' a sender may ask for in 'identify'
+SIGNALING_MAX_RECEIVERS = int(os.getenv("SIGNALING_MAX_RECEIVERS", "8"))
+# How long a starting worker waits for another worker to send it the registry
+SIGNALING_SYNC_TIMEOUT = float(os.getenv("SIGNALING_SYNC_TIMEOUT", "2"))
+DEFAULT_ROOM = "default"
 
-async def find_unpaired_client(client_type: str, exclude_id: str, clients: Dict[str, Client]) -> Optional[Client]:
+OPPOSITE_TYPES = {"sender": "receiver", "receiver": "sender"}
+
+# Signaling clients of every worker. Each worker applies the same sequence of
+# signaling events from the live bus, so all of them hold the same registry and
+# make the same pairing decisions; a worker only talks to the sockets it holds.
+clients: Dict[str, Client] = {}
+# Clients whose WebSocket is connected to this worker
+local_clients: Dict[str, Client] = {}
+# Identified clients that can still take a peer, oldest first, per (room, type)
+waiting: Dict[Tuple[str, str], Dict[str, Client]] = {}
+
+_reaper_task: Optional[asyncio.Task] = None
+_sync_task: Optional[asyncio.Task] = None
+# Set while this worker waits for the registry of the others
+_syncing = False
+# Events that follow this worker's sync request, to apply once the registry has arrived
+_backlog: Optional[List[dict]] = None
+
+
+def _enqueue(client: Client) -> None:
+    waiting.setdefault((client.room, client.type), {})[client.id] = client
+
+
+def _dequeue(client: Client) -> None:
+    key = (client.room, client.type)
+    queue = waiting.get(key)
+    if queue is not None and queue.pop(client.id, None) is not None and not queue:
+        del waiting[key]
+
+
+def find_unpaired_client(client_type: str, room: str) -> Optional[Client]:
     """
-    Find an unpaired client of the specified type ('sender' or 'receiver'),
-    excluding the client with the given ID.
+    The client of ``client_type`` that has waited longest for a peer in ``room``.
     """
-    opposite_type = 'receiver' if client_type == 'sender' else 'sender'
-    for client in clients.values():
-        if (client.type == opposite_type
-            and client.peer_id is None
-            and client.id != exclude_id):
-            return client
-    return None
+    queue = waiting.get((room, client_type))
+    return next(iter(queue.values())) if queue else None
 
 
 async def send_message(client: Client, event: str, data: dict):
     """
     Send a message to the specified client over its WebSocket connection.
+    Clients connected to another worker are served by that worker.
     """
+    if client.websocket is None:
+        return
     try:
         message = {
             "event": event,
@@ -35,39 +71,264 @@ async def send_message(client: Client, event: str, data: dict):
         logger.error(f"Error sending message to client {client.id}: {e}")
 
 
+async def pair_clients(sender: Client, receiver: Client):
+    sender.peers[receiver.id] = None
+    receiver.peers[sender.id] = None
+    _dequeue(receiver)
+    if not sender.available:
+        _dequeue(sender)
+
+    await send_message(sender, "paired", {"peerId": receiver.id, "role": sender.type})
+    await send_message(receiver, "paired", {"peerId": sender.id, "role": receiver.type})
+
+
+async def match_client(client: Client):
+    """
+    Pair an identified client with the longest waiting clients of the opposite
+    type in its room until it has no room for more peers, then queue it if it
+    can still take one.
+    """
+    opposite_type = OPPOSITE_TYPES[client.type]
+    while client.available:
+        peer = find_unpaired_client(opposite_type, client.room)
+        if peer is None:
+            break
+        if client.type == "sender":
+            await pair_clients(client, peer)
+        else:
+            await pair_clients(peer, client)
+
+    if client.available:
+        _enqueue(client)
+
+
+def _max_receivers(data: dict) -> int:
+    try:
+        return max(1, min(int(data.get("maxReceivers", 1)), SIGNALING_MAX_RECEIVERS))
+    except (TypeError, ValueError):
+        return 1
+
+
 async def handle_identify_event(client: Client, event: str, data: dict, clients: Dict[str, Client]):
     """
-    Handle the 'identify' event where a client specifies its type.
+    Handle the 'identify' event where a client specifies its type and, optionally,
+    its room. A sender that sets 'maxReceivers' is paired with up to that many
+    receivers and has their messages tagged with their 'peerId'.
     """
+    if client.type is not None:
+        await detach_client(client, clients)
+
     client.type = data.get("type")
+    if client.type not in OPPOSITE_TYPES:
+        return
+    client.room = str(data.get("room") or DEFAULT_ROOM)
+    client.max_peers = _max_receivers(data) if client.type == "sender" else 1
+    await match_client(client)
 
-    found_peer = await find_unpaired_client(client.type, client.id, clients)
-    if found_peer:
-        client.peer_id = found_peer.id
-        found_peer.peer_id = client.id
 
-        await send_message(client, "paired", {
-            "peerId": found_peer.id,
-            "role": client.type
-        })
-        await send_message(found_peer, "paired", {
-            "peerId": client.id,
-            "role": found_peer.type
-        })
+def message_target(client: Client, payload: dict, clients: Dict[str, Client]) -> Optional[Client]:
+    """
+    The peer a message is meant for: the one named by 'peerId', or the only peer.
+    """
+    peer_id = payload.get("peerId")
+    if peer_id is None and len(client.peers) == 1:
+        peer_id = next(iter(client.peers))
+    return clients.get(peer_id) if peer_id in client.peers else None
 
 
-async def handle_signaling(websocket: WebSocket, client: Client, clients: Dict[str, Client]):
+async def handle_signaling(websocket: WebSocket, client: Client):
     data = await websocket.receive_text()
     message = json.loads(data)
+    await live_bus.publish("signaling", {"op": "message", "id": client.id, "message": message})
+
+
+async def dispatch_signaling_message(client: Client, message: dict, clients: Dict[str, Client]):
     event = message.get("event")
     payload = message.get("data", {})
 
     if event == "identify":
-        client.type = payload.get("type")
-
         await handle_identify_event(client, event, payload, clients)
 
     elif event in ["offer", "answer", "ice-candidate"]:
-        if client.peer_id and client.peer_id in clients:
-            peer = clients[client.peer_id]
-            await send_message(peer, event, payload)
\ No newline at end of file
+        peer = message_target(client, payload, clients)
+        if peer:
+            if peer.max_peers > 1:
+                payload = {**payload, "peerId": client.id}
+            await send_message(peer, event, payload)
+
+
+async def join_client(client: Client):
+    local_clients[client.id] = client
+    await live_bus.publish("signaling", {"op": "join", "id": client.id, "worker_id": client.worker_id})
+
+
+async def leave_client(client: Client):
+    await live_bus.publish("signaling", {"op": "leave", "id": client.id})
+    local_clients.pop(client.id, None)
+
+
+async def detach_client(client: Client, clients: Dict[str, Client]):
+    """
+    Unpair a client from all its peers and take it out of the waiting queues.
+    Each peer is told and matched again.
+    """
+    _dequeue(client)
+    peer_ids, client.peers = client.peers, {}
+    for peer_id in peer_ids:
+        peer = clients.get(peer_id)
+        if peer is None:
+            continue
+        peer.peers.pop(client.id, None)
+        await send_message(peer, "peer-disconnected", {"peerId": client.id} if peer.max_peers > 1 else {})
+        await match_client(peer)
+
+
+async def remove_client(client_id: str, clients: Dict[str, Client]):
+    """
+    Drop a client from the registry and tell its peers, if it had any.
+    """
+    client = clients.pop(client_id, None)
+    if client is None:
+        return
+    logger.info(f"Client {client_id} disconnected")
+    await detach_client(client, clients)
+
+
+def registry_snapshot() -> dict:
+    """
+    The registry in a form another worker can adopt with ``restore_registry``.
+    """
+    return {
+        "clients": [
+            {
+                "id": client.id, "worker_id": client.worker_id, "type": client.type, "room": client.room,
+                "max_peers": client.max_peers, "peers": list(client.peers),
+            }
+            for client in clients.values()
+        ],
+        "waiting": [[room, client_type, list(queue)] for (room, client_type), queue in waiting.items()],
+    }
+
+
+def restore_registry(snapshot: dict) -> None:
+    clients.clear()
+    waiting.clear()
+    for state in snapshot["clients"]:
+        client = local_clients.get(state["id"]) or Client(None, state["id"], state["worker_id"])
+        client.type, client.room, client.max_peers = state["type"], state["room"], state["max_peers"]
+        client.peers = dict.fromkeys(state["peers"])
+        clients[client.id] = client
+    for room, client_type, ids in snapshot["waiting"]:
+        waiting[(room, client_type)] = {client_id: clients[client_id] for client_id in ids}
+
+
+async def _apply(event: dict):
+    op = event.get("op")
+    if op == "join":
+        client = local_clients.get(event["id"]) or Client(None, event["id"], event["worker_id"])
+        clients[client.id] = client
+    elif op == "message":
+        client = clients.get(event["id"])
+        if client:
+            await dispatch_signaling_message(client, event["message"], clients)
+    elif op == "leave":
+        await remove_client(event["id"], clients)
+    elif op == "worker-gone":
+        gone = [client for client in clients.values() if client.worker_id == event["worker_id"]]
+        # Unregister them all first, so that none of their peers is matched with another of them
+        for client in gone:
+            del clients[client.id]
+            _dequeue(client)
+        for client in gone:
+            await detach_client(client, clients)
+    elif op == "sync-request" and not _syncing:
+        # The registry as of the request, which is where the requester starts applying events
+        await live_bus.publish("signaling", {"op": "sync", "worker_id": event["worker_id"], "registry": registry_snapshot()})
+
+
+async def _finish_sync():
+    """
+    Apply the events held back while the registry was on its way, including any
+    that arrive meanwhile, then go back to applying events as they come.
+    """
+    global _syncing, _backlog
+    _syncing = False
+    while _backlog:
+        await _apply(_backlog.pop(0))
+    _backlog = None
+
+
+async def apply_signaling_event(event: dict):
+    """
+    Apply a join, message, leave or worker-gone event to the registry, or take
+    part in handing the registry to a worker that just started.
+    """
+    global _backlog
+    op = event.get("op")
+    if op == "sync":
+        if _syncing and _backlog is not None and event["worker_id"] == live_bus.worker_id:
+            restore_registry(event["registry"])
+            logger.info(f"Received the signaling registry with {len(clients)} clients")
+            await _finish_sync()
+    elif op == "sync-request" and event["worker_id"] == live_bus.worker_id:
+        if _syncing:
+            _backlog = []
+    elif _backlog is not None:
+        _backlog.append(event)
+    else:
+        await _apply(event)
+
+
+live_bus.on("signaling", apply_signaling_event)
+
+
+async def reap_dead_workers():
+    """
+    Periodically announce workers that died without sending 'leave' for their clients.
+    """
+    while True:
+        await asyncio.sleep(SIGNALING_REAP_INTERVAL)
+        workers = {client.worker_id for client in clients.values()} - {live_bus.worker_id}
+        if not workers:
+            continue
+        try:
+            alive = await live_bus.live_workers(workers)
+        except Exception as e:
+            logger.warning(f"Failed to check signaling workers: {e}")
+            continue
+        for worker_id in workers - alive:
+            logger.warning(f"Signaling worker {worker_id} is gone, dropping its clients")
+            await live_bus.publish("signaling", {"op": "worker-gone", "worker_id": worker_id})
+
+
+async def _sync_registry():
+    """
+    Ask the other workers for the registry, which this worker missed the
+    events of, and carry on without it if none answers in time.
+    """
+    global _syncing
+    _syncing = True
+    await live_bus.publish("signaling", {"op": "sync-request", "worker_id": live_bus.worker_id})
+    await asyncio.sleep(SIGNALING_SYNC_TIMEOUT)
+    if _syncing:
+        logger.info("No signaling registry received from other workers, starting empty")
+        await _finish_sync()
+
+
+def start_signaling() -> None:
+    global _reaper_task, _sync_task
+    if live_bus.enabled and _reaper_task is None:
+        _sync_task = asyncio.create_task(_sync_registry(), name="signaling-sync")
+        _reaper_task = asyncio.create_task(reap_dead_workers(), name="signaling-reaper")
+
+
+async def stop_signaling() -> None:
+    global _reaper_task, _sync_task
+    for task in (_sync_task, _reaper_task):
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    _reaper_task = _sync_task = None
@@ -0,0 +1,123 @@
+import os
+import json
+from array import array
+from datetime import datetime, timezone
+from operator import attrgetter
+from typing import Any, Dict, List, Optional, Sequence
+from pydantic import BaseModel
+from pydantic_core import to_json
+from database.streams import STREAMS, Stream
+from utils.timestamps import as_utc
+
+RECENT_BUFFER_SAMPLES = int(os.getenv("RECENT_BUFFER_SAMPLES", "600"))
+RECENT_BUFFER_SECONDS = float(os.getenv("RECENT_BUFFER_SECONDS", "60"))
+
+
+class _Ring:
+    """
+    Fixed-size circular columns: epoch-second timestamps and float fields in
+    ``array('d')``, other fields in plain lists.
+    """
+    __slots__ = ("capacity", "timestamps", "columns", "start", "count")
+
+    def __init__(self, capacity: int, numeric: Sequence[bool]):
+        self.capacity = capacity
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.columns = [array("d", bytes(8 * capacity)) if is_float else [None] * capacity for is_float in numeric]
+        self.start = 0
+        self.count = 0
+
+    def append(self, timestamp: float, values: Sequence[Any]) -> None:
+        i = (self.start + self.count) % self.capacity
+        if self.count == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.count += 1
+        self.timestamps[i] = timestamp
+        for column, value in zip(self.columns, values):
+            column[i] = value
+
+    def positions(self, since: float) -> List[int]:
+        """
+        Slots in insertion order whose timestamp is at least ``since``.
+        """
+        slots = [(self.start + n) % self.capacity for n in range(self.count)]
+        return [i for i in slots if self.timestamps[i] >= since]
+
+
+class RecentBuffer:
+    """
+    The last ``capacity`` samples of one stream per vessel, of which the ones at
+    most ``max_age`` seconds older than the newest are served, so that a viewer
+    that just connected can draw the recent window without touching the database.
+    """
+
+    def __init__(self, stream: Stream, capacity: int = RECENT_BUFFER_SAMPLES, max_age: float = RECENT_BUFFER_SECONDS):
+        self.stream = stream
+        self.capacity = capacity
+        self.max_age = max_age
+        self._fields = stream.fields[1:]
+        self._values = attrgetter(*self._fields)
+        self._numeric = [field in stream.numeric_fields for field in self._fields]
+        self._rings: Dict[str, _Ring] = {}
+
+    def _append(self, vessel_id: str, timestamp: float, values: Sequence[Any]) -> None:
+        if self.capacity <= 0:
+            return
+        ring = self._rings.get(vessel_id)
+        if ring is None:
+            ring = self._rings[vessel_id] = _Ring(self.capacity, self._numeric)
+        ring.append(timestamp, values)
+
+    def append_payload(self, vessel_id: str, payload: BaseModel) -> None:
+        values = self._values(payload)
+        if len(self._fields) == 1:
+            values = (values,)
+        self._append(vessel_id, as_utc(payload.timestamp).timestamp(), [getattr(value, "value", value) for value in values])
+
+    def append_message(self, vessel_id: str, message: str) -> None:
+        """
+        Record a sample from its live JSON frame.
+        """
+        sample = json.loads(message)
+        timestamp = as_utc(datetime.fromisoformat(sample["timestamp"].replace("Z", "+00:00"))).timestamp()
+        self._append(vessel_id, timestamp, [sample[field] for field in self._fields])
+
+    @property
+    def vessels(self) -> List[str]:
+        return list(self._rings)
+
+    def samples(self, vessel_id: str, seconds: Optional[float] = None, limit: Optional[int] = None) -> List[dict]:
+        """
+        Samples of one vessel, oldest first, as rows keyed by field name.
+        """
+        ring = self._rings.get(vessel_id)
+        if ring is None or not ring.count:
+            return []
+        newest = ring.timestamps[(ring.start + ring.count - 1) % ring.capacity]
+        window = self.max_age if seconds is None else min(seconds, self.max_age)
+        positions = ring.positions(newest - window)
+        if limit is not None:
+            positions = positions[-limit:]
+        return [
+            {
+                "timestamp": datetime.fromtimestamp(ring.timestamps[i], timezone.utc),
+                **{field: column[i] for field, column in zip(self._fields, ring.columns)},
+            }
+            for i in positions
+        ]
+
+    def messages(self, vessel_ids: Sequence[str]) -> List[str]:
+        """
+        Buffered samples encoded like live frames, one vessel after the other.
+        """
+        messages = []
+        for vessel_id in vessel_ids:
+            vessel_json = json.dumps(vessel_id)
+            messages.extend(
+                f'{to_json(sample).decode()[:-1]},"vessel_id":{vessel_json}}}' for sample in self.samples(vessel_id)
+            )
+        return messages
+
+
+recent_buffers: Dict[str, RecentBuffer] = {name: RecentBuffer(stream) for name, stream in STREAMS.items()}
@@ -1,56 +1,394 @@
-from typing import Set
+import os
+import json
+import time
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
+from database.live_bus import live_bus
+from database.streams import STREAMS
+from websocket_manager.recent_buffer import recent_buffers
 from utils.logger import get_logger
+from utils.metrics import Counter, Gauge, Histogram
 
 logger = get_logger()
 
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+SLOW_CONSUMER_CLOSE_CODE = 1008
+
+# Room for subscribers that follow every vessel
+ALL_VESSELS = "*"
+
+BROADCAST_DURATION = Histogram("ws_broadcast_duration_seconds", "Time to hand one message to all subscribers", ["stream"])
+SLOW_CONSUMER_EVICTIONS = Counter("ws_slow_consumer_evictions_total", "WebSocket subscribers evicted as slow consumers")
+
+
+def encode_message(message: dict) -> str:
+    return json.dumps(message, separators=(",", ":"), default=str)
+
+
+class Subscriber:
+    """
+    A single WebSocket connection with its own bounded send queue and writer task.
+
+    Frames are handed over already encoded, so a broadcast never waits on the
+    socket. If the queue fills up or a send takes longer than ``WS_SEND_TIMEOUT``
+    the connection is treated as a slow consumer and evicted.
+
+    With ``max_hz`` set, nothing is queued: only the latest frame per stream is
+    kept and the writer sends it at most ``max_hz`` times per second.
+
+    A ``tagged`` subscriber receives ``{"stream": ..., "data": ...}`` frames so
+    that several streams can share one connection.
+
+    ``rooms`` holds every (manager, vessel) pair the subscriber is attached to.
+
+    The recent samples replayed when it joins a room take up a single queue
+    slot, sent in one go ahead of anything queued later.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue_size: int = WS_SEND_QUEUE_SIZE,
+        max_hz: Optional[float] = None,
+        tagged: bool = False,
+    ):
+        self.websocket = websocket
+        self.max_hz = max_hz
+        self.tagged = tagged
+        self.rooms: Set[Tuple["WebSocketManager", str]] = set()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._latest: Dict[str, Union[str, List[str]]] = {}
+        self._latest_available = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._close_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    @property
+    def depth(self) -> int:
+        return len(self._latest) if self.max_hz else self._queue.qsize()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._writer())
+
+    def offer(self, frame: str, stream: str) -> bool:
+        """
+        Queue an encoded frame without waiting. Returns False if the queue is full.
+        """
+        if self.max_hz:
+            self._latest[stream] = frame
+            self._latest_available.set()
+            return True
+
+        try:
+            self._queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def offer_replay(self, frames: List[str], stream: str) -> bool:
+        """
+        Queue the frames of a replay as one item. Returns False if the queue is full.
+        """
+        if self.max_hz:
+            # Kept apart from the stream's latest frame, which would replace it
+            self._latest[f"replay:{stream}"] = frames
+            self._latest_available.set()
+            return True
+
+        try:
+            self._queue.put_nowait(frames)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _send(self, frames: Union[str, List[str]]) -> None:
+        if isinstance(frames, str):
+            frames = [frames]
+        for frame in frames:
+            await asyncio.wait_for(self.websocket.send_text(frame), timeout=WS_SEND_TIMEOUT)
+
+    async def _writer(self) -> None:
+        try:
+            if self.max_hz:
+                while True:
+                    await self._latest_available.wait()
+                    self._latest_available.clear()
+                    frames, self._latest = self._latest, {}
+                    for frame in frames.values():
+                        await self._send(frame)
+                    await asyncio.sleep(1 / self.max_hz)
+            else:
+                while True:
+                    await self._send(await self._queue.get())
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.close("send timed out")
+        except Exception as e:
+            logger.error(f"Error sending message: {e}")
+            self.close()
+
+    def close(self, reason: Optional[str] = None) -> None:
+        """
+        Detach from every manager and stop the writer. If a reason is given the
+        socket is closed as well, in the background so the caller never waits on it.
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        for manager, vessel_id in list(self.rooms):
+            manager.remove(self, vessel_id)
+
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+        if reason is not None:
+            SLOW_CONSUMER_EVICTIONS.inc()
+            logger.warning(f"Evicting slow WebSocket consumer: {reason}")
+            self._close_task = asyncio.create_task(self._close_socket(reason))
+
+    async def _close_socket(self, reason: str) -> None:
+        try:
+            await asyncio.wait_for(
+                self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason=reason),
+                timeout=WS_SEND_TIMEOUT,
+            )
+        except Exception:
+            pass
+
+
 class WebSocketManager:
+    """
+    Fans out one live stream. Subscribers join per-vessel rooms, or the
+    ``ALL_VESSELS`` room, so a broadcast only reaches viewers of that vessel.
+    """
+
     def __init__(self, name: str = "default"):
         self.name = name
-        self.active_connections: Set[WebSocket] = set()
+        self.rooms: Dict[str, Dict[WebSocket, Subscriber]] = {}
+
+    @property
+    def connection_count(self) -> int:
+        return len({websocket for room in self.rooms.values() for websocket in room})
+
+    def has_subscribers(self, vessel_id: str) -> bool:
+        return vessel_id in self.rooms or ALL_VESSELS in self.rooms
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(
+        self, websocket: WebSocket, max_hz: Optional[float] = None, vessel_id: str = ALL_VESSELS
+    ) -> Subscriber:
         await websocket.accept()
-        self.active_connections.add(websocket)
-        logger.info(f"[{self.name}] New WebSocket connection. Total: {len(self.active_connections)}")
+        subscriber = Subscriber(websocket, max_hz=max_hz)
+        self.add(subscriber, vessel_id)
+        subscriber.start()
+        return subscriber
+
+    def add(self, subscriber: Subscriber, vessel_id: str = ALL_VESSELS) -> None:
+        self.rooms.setdefault(vessel_id, {})[subscriber.websocket] = subscriber
+        subscriber.rooms.add((self, vessel_id))
+        logger.info(f"[{self.name}/{vessel_id}] New WebSocket connection. Total: {len(self.rooms[vessel_id])}")
+        self.replay(subscriber, vessel_id)
+
+    def replay(self, subscriber: Subscriber, vessel_id: str) -> None:
+        """
+        Send the room's buffered recent samples to a subscriber that just joined it.
+        Called in the same step as joining, so no live sample is missed or repeated.
+        """
+        buffer = recent_buffers.get(self.name)
+        if buffer is None:
+            return
+        messages = buffer.messages(buffer.vessels if vessel_id == ALL_VESSELS else [vessel_id])
+        if not messages:
+            return
+        if subscriber.tagged:
+            messages = [f'{{"stream":"{self.name}","data":{message}}}' for message in messages]
+        if not subscriber.offer_replay(messages, f"{self.name}/{vessel_id}"):
+            subscriber.close(f"[{self.name}] send queue full")
+
+    def remove(self, subscriber: Subscriber, vessel_id: Optional[str] = None) -> None:
+        """
+        Remove the subscriber from one room, or from all of them if no vessel is given.
+        """
+        for room_id in [vessel_id] if vessel_id is not None else list(self.rooms):
+            room = self.rooms.get(room_id)
+            if room is None or room.pop(subscriber.websocket, None) is None:
+                continue
+            subscriber.rooms.discard((self, room_id))
+            if not room:
+                del self.rooms[room_id]
+            logger.info(f"[{self.name}/{room_id}] WebSocket disconnected. Remaining: {len(room)}")
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        logger.info(f"[{self.name}] WebSocket disconnected. Remaining: {len(self.active_connections)}")
+        for room in list(self.rooms.values()):
+            subscriber = room.get(websocket)
+            if subscriber is not None:
+                subscriber.close()
+                return
 
-    async def broadcast(self, message: dict):
-        disconnected = set()
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"[{self.name}] Error sending message: {e}")
-                disconnected.add(connection)
-        
-        for connection in disconnected:
-            self.disconnect(connection)
+    async def broadcast(self, message: str, vessel_id: str):
+        """
+        Send an already JSON-encoded message to the vessel's room and the all-vessels room.
+        """
+        room = self.rooms.get(vessel_id)
+        watchers = self.rooms.get(ALL_VESSELS)
+        if not room and not watchers:
+            return
+        started = time.perf_counter()
+        recipients = {**room, **watchers} if room and watchers else room or watchers
 
+        key = f"{self.name}/{vessel_id}"
+        tagged_frame = None
+        slow = []
+        for subscriber in recipients.values():
+            if subscriber.tagged:
+                if tagged_frame is None:
+                    tagged_frame = f'{{"stream":"{self.name}","data":{message}}}'
+                delivered = subscriber.offer(tagged_frame, key)
+            else:
+                delivered = subscriber.offer(message, key)
+            if not delivered:
+                slow.append(subscriber)
 
-async def websocket_endpoint(websocket: WebSocket, manager: WebSocketManager):
-    await manager.connect(websocket)
+        for subscriber in slow:
+            subscriber.close(f"[{self.name}] send queue full")
+        BROADCAST_DURATION.observe(time.perf_counter() - started, self.name)
+
+
+async def websocket_endpoint(
+    websocket: WebSocket, manager: WebSocketManager, max_hz: Optional[float] = None, vessel_id: Optional[str] = None
+):
+    await manager.connect(websocket, max_hz, vessel_id or ALL_VESSELS)
     try:
         while True:
-            await websocket.receive_text()  
+            await websocket.receive_text()
     except WebSocketDisconnect:
-        manager.disconnect(websocket) 
+        pass
+    finally:
+        manager.disconnect(websocket)
+
+
+def send_event(subscriber: Subscriber, event: str, data: dict) -> None:
+    if not subscriber.offer(encode_message({"event": event, "data": data}), event):
+        subscriber.close("send queue full")
+
+
+def _is_str_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def handle_telemetry_message(subscriber: Subscriber, message: Any) -> None:
+    """
+    Handle a 'subscribe' or 'unsubscribe' request on the multiplexed endpoint.
+    Requests name ``streams`` and optionally ``vessels``. Without vessels, a
+    subscribe joins the all-vessels room and an unsubscribe leaves every room of
+    the stream.
+    """
+    data = message.get("data", {}) if isinstance(message, dict) else None
+    if not isinstance(data, dict):
+        send_event(subscriber, "error", {"message": "Expected an object with an object 'data'"})
+        return
+    event = message.get("event")
+    streams = data.get("streams", [])
+    vessels = data.get("vessels") or None
+    if not _is_str_list(streams) or (vessels is not None and not _is_str_list(vessels)):
+        send_event(subscriber, "error", {"message": "'streams' and 'vessels' must be lists of strings"})
+        return
+
+    unknown = [stream for stream in streams if stream not in websocket_managers]
+    if event not in ("subscribe", "unsubscribe") or unknown:
+        send_event(subscriber, "error", {
+            "message": f"Unknown streams: {unknown}" if unknown else f"Unknown event: {event}"
+        })
+        return
+
+    for stream in streams:
+        manager = websocket_managers[stream]
+        if event == "unsubscribe" and vessels is None:
+            manager.remove(subscriber)
+            continue
+        for vessel_id in vessels or [ALL_VESSELS]:
+            if event == "subscribe" and (manager, vessel_id) not in subscriber.rooms:
+                manager.add(subscriber, vessel_id)
+            elif event == "unsubscribe":
+                manager.remove(subscriber, vessel_id)
+
+    subscriptions = sorted((manager.name, vessel_id) for manager, vessel_id in subscriber.rooms)
+    send_event(subscriber, "subscribed", {
+        "streams": sorted({stream for stream, _ in subscriptions}),
+        "subscriptions": [{"stream": stream, "vessel_id": vessel_id} for stream, vessel_id in subscriptions],
+    })
+
+
+async def telemetry_endpoint(
+    websocket: WebSocket, streams: List[str], max_hz: Optional[float] = None, vessels: Optional[List[str]] = None
+):
+    """
+    Serve any set of live streams over one connection. Clients pick streams with
+    the initial ``streams`` list and later 'subscribe'/'unsubscribe' events.
+    """
+    await websocket.accept()
+    subscriber = Subscriber(websocket, max_hz=max_hz, tagged=True)
+    subscriber.start()
+    try:
+        if streams:
+            handle_telemetry_message(subscriber, {"event": "subscribe", "data": {"streams": streams, "vessels": vessels}})
+        while True:
+            data = await websocket.receive_text()
+            try:
+                message = json.loads(data)
+            except ValueError:
+                send_event(subscriber, "error", {"message": "Invalid JSON"})
+                continue
+            handle_telemetry_message(subscriber, message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscriber.close()
+
+
+websocket_managers: Dict[str, WebSocketManager] = {stream: WebSocketManager(stream) for stream in STREAMS}
+
+
+def _subscribers(manager: WebSocketManager) -> Set[Subscriber]:
+    return {subscriber for room in manager.rooms.values() for subscriber in room.values()}
+
+
+WS_CONNECTIONS = Gauge(
+    "ws_connections", "WebSocket subscribers per stream", ["stream"],
+    collect=lambda: {(name,): manager.connection_count for name, manager in websocket_managers.items()},
+)
+WS_SEND_QUEUE_DEPTH = Gauge(
+    "ws_send_queue_depth", "Frames waiting in the send queues of a stream's subscribers", ["stream"],
+    collect=lambda: {
+        (name,): sum(subscriber.depth for subscriber in _subscribers(manager))
+        for name, manager in websocket_managers.items()
+    },
+)
+
+
+async def publish_telemetry(stream: str, vessel_id: str, payload: BaseModel) -> None:
+    """
+    Broadcast a validated payload to the subscribers of every worker. With a
+    local bus nothing is encoded unless someone is watching.
+    """
+    if not live_bus.enabled:
+        recent_buffers[stream].append_payload(vessel_id, payload)
+        if not websocket_managers[stream].has_subscribers(vessel_id):
+            return
+    data = payload.model_dump_json()
+    message = f'{data[:-1]},"vessel_id":{json.dumps(vessel_id)}}}'
+    await live_bus.publish("telemetry", {"stream": stream, "vessel_id": vessel_id, "data": message})
 
 
-battery_manager = WebSocketManager("battery")
-mission_manager = WebSocketManager("mission")
-mode_manager = WebSocketManager("mode")
-obstacle_manager = WebSocketManager("obstacle")
-position_manager = WebSocketManager("position")
+async def _deliver_telemetry(event: dict) -> None:
+    if live_bus.enabled:
+        # Every worker keeps the recent samples of every vessel
+        recent_buffers[event["stream"]].append_message(event["vessel_id"], event["data"])
+    await websocket_managers[event["stream"]].broadcast(event["data"], event["vessel_id"])
 
 
-websocket_managers = {
-    "battery": battery_manager,
-    "mission": mission_manager,
-    "mode": mode_manager,
-    "obstacle": obstacle_manager,
-    "position": position_manager,
-}
\ No newline at end of file
+live_bus.on("telemetry", _deliver_telemetry)
@@ -2,13 +2,13 @@ import { useEffect, useRef, useState } from 'react';
 import useHistoricData from '../../hooks/useHistoricData';
 import useCanvasPlot from '../../hooks/useCanvasPlot';
 
-const API_URL = `${import.meta.env.VITE_API_URL}/acceleration`;
+const STREAM = 'acceleration';
 
 export default function AccelerationHistoric({ selectedStart, selectedEnd }) {
     const canvasRef = useRef(null);
     
     const { filteredData, isLoading, error, data: allData } = useHistoricData(
-        API_URL,
+        STREAM,
         selectedStart,
         selectedEnd,
         point => point.acceleration
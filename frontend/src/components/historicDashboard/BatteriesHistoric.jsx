@@ -1,13 +1,13 @@
 import { useEffect, useRef, useState } from 'react';
 import useHistoricData from '../../hooks/useHistoricData';
 
-const API_URL = `${import.meta.env.VITE_API_URL}/battery`;
+const STREAM = 'battery';
 
 function BatteriesHistoric({ selectedStart, selectedEnd }) {
     const canvasRef = useRef(null);
     
     const { filteredData, isLoading, error, data: allData } = useHistoricData(
-        API_URL,
+        STREAM,
         selectedStart,
         selectedEnd
     );
@@ -3,18 +3,18 @@ import { MapContainer, TileLayer, CircleMarker, Popup, Polyline } from 'react-le
 import useHistoricData from '../../hooks/useHistoricData';
 import 'leaflet/dist/leaflet.css';
 
-const POSITION_API_URL = `${import.meta.env.VITE_API_URL}/position`;
-const OBSTACLES_API_URL = `${import.meta.env.VITE_API_URL}/obstacle`;
+const POSITION_STREAM = 'position';
+const OBSTACLES_STREAM = 'obstacle';
 
 function MapHistoric({ selectedStart, selectedEnd }) {
     const { filteredData: positionData, isLoading: positionLoading, error: positionError } = useHistoricData(
-        POSITION_API_URL,
+        POSITION_STREAM,
         selectedStart,
         selectedEnd
     );
 
     const { filteredData: obstacleData, isLoading: obstacleLoading, error: obstacleError } = useHistoricData(
-        OBSTACLES_API_URL,
+        OBSTACLES_STREAM,
         selectedStart,
         selectedEnd
     );
@@ -1,7 +1,6 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
-import useWebSocket from '../../hooks/useWebSocket';
+import useTelemetryStream from '../../hooks/useTelemetryStream';
 
-const WS_URL = `${import.meta.env.VITE_WS_URL}/battery`;
 const TIME_WINDOW = 5 * 60 * 1000; 
 
 function BatteryPlot() {
@@ -51,7 +50,7 @@ function BatteryPlot() {
         setHasData(true);
     }, []);
 
-    useWebSocket(WS_URL, onWebSocketMessage);
+    useTelemetryStream('battery', onWebSocketMessage);
 
     useEffect(() => {
         if (batteryData.length === 0) {
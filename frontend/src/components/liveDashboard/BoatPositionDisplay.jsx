@@ -1,7 +1,5 @@
 import { useState, useCallback } from 'react';
-import useWebSocket from '../../hooks/useWebSocket';
-
-const WS_URL = `${import.meta.env.VITE_WS_URL}/position`;
+import useTelemetryStream from '../../hooks/useTelemetryStream';
 
 function BoatPositionDisplay() {
   const [latitude, setLatitude] = useState(null);
@@ -20,7 +18,7 @@ function BoatPositionDisplay() {
     setTimestamp(data.timestamp);
   }, []);
 
-  useWebSocket(WS_URL, onWebSocketMessage);
+  useTelemetryStream('position', onWebSocketMessage);
 
   const lastUpdatedTime = timestamp
     ? new Date(timestamp).toLocaleTimeString()
@@ -1,10 +1,8 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { MapContainer, TileLayer, CircleMarker, Popup, Polyline, useMap } from 'react-leaflet';
-import useWebSocket from '../../hooks/useWebSocket';
+import useTelemetryStream from '../../hooks/useTelemetryStream';
 import 'leaflet/dist/leaflet.css';
 
-const WS_URL = `${import.meta.env.VITE_WS_URL}/position`;
-const OBSTACLES_WS_URL = `${import.meta.env.VITE_WS_URL}/obstacle`;
 const TRAIL_LENGTH = 10;
 const OBSTACLES_LENGTH = 10;
 
@@ -30,7 +28,7 @@ export default function MapDisplay() {
     const [obstacleLongitude, setObstacleLongitude] = useState(null);
     const [obstacles, setObstacles] = useState([]);
 
-    useWebSocket(OBSTACLES_WS_URL, useCallback((data) => {
+    useTelemetryStream('obstacle', useCallback((data) => {
         setObstacleLatitude(data.latitude);
         setObstacleLongitude(data.longitude);
 
@@ -55,7 +53,7 @@ export default function MapDisplay() {
         }
     }, [isFirstPosition]);
 
-    useWebSocket(WS_URL, onWebSocketMessage);
+    useTelemetryStream('position', onWebSocketMessage);
 
     const boatCenter = boatLatitude && boatLongitude ? [boatLatitude, boatLongitude] : [50.0328, 19.9905]; // default to Bagry lake
 
@@ -1,7 +1,6 @@
 import React, { useState, useCallback } from 'react';
-import useWebSocket from '../../hooks/useWebSocket';
+import useTelemetryStream from '../../hooks/useTelemetryStream';
 
-const WS_URL = `${import.meta.env.VITE_WS_URL}/mission`;
 
 export default function MissionDescriptionDisplay(){
 
@@ -13,7 +12,7 @@ export default function MissionDescriptionDisplay(){
         setHasData(true);
     }, []);
 
-    useWebSocket(WS_URL, onWebSocketMessage);
+    useTelemetryStream('mission', onWebSocketMessage);
 
     if (!hasData) {
         return(
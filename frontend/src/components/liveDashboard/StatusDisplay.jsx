@@ -1,7 +1,6 @@
 import React, { useState, useCallback } from 'react';
-import useWebSocket from '../../hooks/useWebSocket';
+import useTelemetryStream from '../../hooks/useTelemetryStream';
 
-const WS_URL = `${import.meta.env.VITE_WS_URL}/mode`;
 
 export default function StatusDisplay(){
     
@@ -13,7 +12,7 @@ export default function StatusDisplay(){
         setHasData(true);
     }, []);
 
-    useWebSocket(WS_URL, onWebSocketMessage);
+    useTelemetryStream('mode', onWebSocketMessage);
     
     if (!hasData) {
         return(
@@ -1,60 +1,87 @@
-import { useMemo } from 'react';
-import useApi from './useApi';
+import { useEffect, useMemo, useState } from 'react';
+
+const HISTORY_URL = `${import.meta.env.VITE_API_URL}/history`;
+const HISTORY_STREAMS = ['position', 'battery', 'thrusters_input', 'acceleration', 'mode', 'obstacle'];
+const MAX_POINTS = 2000;
+const MAX_CACHED_WINDOWS = 4;
+
+/**
+ * One /history request per time window, shared by every chart on the page
+ */
+const requests = new Map();
+
+const fetchHistory = (url) => {
+    if (!requests.has(url)) {
+        const request = fetch(url).then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return response.json();
+        });
+        request.catch(() => requests.delete(url));
+        requests.set(url, request);
+
+        while (requests.size > MAX_CACHED_WINDOWS) {
+            requests.delete(requests.keys().next().value);
+        }
+    }
+    return requests.get(url);
+};
 
 /**
- * Hook to fetch and filter historic data based on time range
- * Automatically switches to aggregated endpoints for longer time ranges
- * @param {string} endpoint - API endpoint to fetch data from (e.g., '/position')
+ * Hook to fetch historic data of one stream for the selected time range
+ * Requests a bounded, shape-preserving series regardless of the range length
+ * @param {string} stream - Stream to read from the shared history response (e.g., 'position')
  * @param {number} selectedStart - Start timestamp in milliseconds
  * @param {number} selectedEnd - End timestamp in milliseconds
  * @param {function} valueExtractor - Function to extract the value from each data point (e.g., point => point.velocity)
  * @returns {object} { data, filteredData, isLoading, error }
  */
-const useHistoricData = (endpoint, selectedStart, selectedEnd, valueExtractor = null) => {
+const useHistoricData = (stream, selectedStart, selectedEnd, valueExtractor = null) => {
+    const [allData, setAllData] = useState(null);
+    const [isLoading, setIsLoading] = useState(true);
+    const [error, setError] = useState(null);
+
     const apiUrl = useMemo(() => {
-        if (!selectedStart || !selectedEnd) return endpoint;
-        
-        const durationHours = (selectedEnd - selectedStart) / (1000 * 60 * 60);
+        if (!selectedStart || !selectedEnd) return null;
+
         const startDate = new Date(selectedStart).toISOString();
         const endDate = new Date(selectedEnd).toISOString();
-        
-        let url = endpoint;
-        let params = `start_ts=${startDate}&end_ts=${endDate}`;
-        
-        if (durationHours > 6) {
-            // > 6 hours: aggregate to 15-minute intervals (~24-96 points)
-            url = `${endpoint}/aggregated`;
-            params += `&interval=15 minutes`;
-        } else if (durationHours > 2) {
-            // 2-6 hours: aggregate to 5-minute intervals (~24-72 points)
-            url = `${endpoint}/aggregated`;
-            params += `&interval=5 minutes`;
-        } else if (durationHours > 1.0) {
-            // 1-2 hours: aggregate to 1-minute intervals (~60-120 points)
-            url = `${endpoint}/aggregated`;
-            params += `&interval=1 minute`;
-        } else {
-            // < 1 hour: use raw data with high limit
-            params += `&limit=50000`;
-        }
-        
-        const separator = url.includes('?') ? '&' : '?';
-        return `${url}${separator}${params}`;
-    }, [endpoint, selectedStart, selectedEnd]);
 
-    const { data: allData, isLoading, error } = useApi(apiUrl, {
-        dependencies: [selectedStart, selectedEnd]
-    });
+        // The backend downsamples every stream to at most MAX_POINTS rows, keeping per-bucket min/max
+        return `${HISTORY_URL}?streams=${HISTORY_STREAMS.join(',')}&start_ts=${startDate}&end_ts=${endDate}&max_points=${MAX_POINTS}`;
+    }, [selectedStart, selectedEnd]);
+
+    useEffect(() => {
+        if (!apiUrl) return;
+
+        let cancelled = false;
+        setIsLoading(true);
+        fetchHistory(apiUrl)
+            .then(history => {
+                if (cancelled) return;
+                setAllData(history[stream] || []);
+                setError(null);
+            })
+            .catch(err => {
+                if (!cancelled) setError(err.message);
+            })
+            .finally(() => {
+                if (!cancelled) setIsLoading(false);
+            });
+
+        return () => { cancelled = true; };
+    }, [apiUrl, stream]);
 
     const filteredData = useMemo(() => {
         if (!allData) return [];
-        
+
         return allData;
     }, [allData]);
 
     const processedData = useMemo(() => {
         if (!filteredData.length || !valueExtractor) return filteredData;
-        
+
         return filteredData.map(point => ({
             timestamp: new Date(point.timestamp).getTime(),
             value: valueExtractor(point),
@@ -62,11 +89,11 @@ const useHistoricData = (endpoint, selectedStart, selectedEnd, valueExtractor =
         }));
     }, [filteredData, valueExtractor]);
 
-    return { 
+    return {
         data: allData,
         filteredData: valueExtractor ? processedData : filteredData,
-        isLoading, 
-        error 
+        isLoading,
+        error
     };
 };
 
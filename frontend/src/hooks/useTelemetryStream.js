@@ -0,0 +1,98 @@
+import { useState, useEffect } from 'react';
+
+const TELEMETRY_URL = `${import.meta.env.VITE_WS_URL}/telemetry`;
+
+/**
+ * One WebSocket to /ws/telemetry shared by every component on the page.
+ * Streams are subscribed while at least one listener needs them.
+ */
+const listeners = new Map();
+const statusListeners = new Set();
+let socket = null;
+
+const send = (event, streams) => {
+    if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ event, data: { streams } }));
+    }
+};
+
+const setConnected = (isConnected) => {
+    statusListeners.forEach(listener => listener(isConnected));
+};
+
+const openSocket = () => {
+    const ws = new WebSocket(TELEMETRY_URL);
+    socket = ws;
+
+    socket.onopen = () => {
+        setConnected(true);
+        send('subscribe', [...listeners.keys()]);
+    };
+
+    socket.onmessage = (event) => {
+        const frame = JSON.parse(event.data);
+        const streamListeners = frame.stream && listeners.get(frame.stream);
+        if (streamListeners) {
+            streamListeners.forEach(listener => listener(frame.data));
+        }
+    };
+
+    socket.onclose = () => {
+        if (socket === ws) {
+            setConnected(false);
+            socket = null;
+        }
+    };
+
+    socket.onerror = (error) => {
+        console.error("WebSocket error:", error);
+        ws.close();
+    };
+};
+
+const addListener = (stream, onMessage) => {
+    if (!listeners.has(stream)) {
+        listeners.set(stream, new Set());
+        send('subscribe', [stream]);
+    }
+    listeners.get(stream).add(onMessage);
+
+    if (!socket || socket.readyState >= WebSocket.CLOSING) {
+        openSocket();
+    }
+};
+
+const removeListener = (stream, onMessage) => {
+    const streamListeners = listeners.get(stream);
+    if (!streamListeners) return;
+
+    streamListeners.delete(onMessage);
+    if (streamListeners.size === 0) {
+        listeners.delete(stream);
+        send('unsubscribe', [stream]);
+    }
+
+    if (listeners.size === 0 && socket) {
+        socket.close();
+    }
+};
+
+const useTelemetryStream = (stream, onMessage) => {
+    const [isConnected, setIsConnected] = useState(
+        socket !== null && socket.readyState === WebSocket.OPEN
+    );
+
+    useEffect(() => {
+        statusListeners.add(setIsConnected);
+        addListener(stream, onMessage);
+
+        return () => {
+            removeListener(stream, onMessage);
+            statusListeners.delete(setIsConnected);
+        };
+    }, [stream, onMessage]);
+
+    return isConnected;
+};
+
+export default useTelemetryStream;